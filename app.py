@@ -1,5 +1,4 @@
 from flask import Flask, render_template, request, jsonify, session, request, redirect, url_for, render_template_string
-import requests
 import json
 from datetime import datetime, timedelta
 import re
@@ -8,14 +7,29 @@ import threading
 import html
 import secrets
 import os
-from poke_data import PokeData
-from battle_sim import BattleSimulator
+import time
+import logging
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Mapping
+from poke_data import RANK1_PATH_TEMPLATE, PokeData
+from battle_sim import BattleSimulator, ShieldAI, TypeChart
+from batch_sim import BatchSimulator
 from analytics import analytics
+from matrix_store import MatrixStoreRegistry
+from result_cache import BattleResultCache, battle_key
+from search_index import SearchIndex
+from data_snapshot import load_cached
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# LOG_LEVEL=DEBUG turns on simulator debug output, including per-battle decision traces
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 
 # Security: Generate a secret key for session management and CSRF protection
@@ -24,52 +38,53 @@ app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
 # Security: Disable debug mode in production
 app.config['DEBUG'] = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
 
-# Initialize local Pokémon data
-poke_data = PokeData()
-
 # Cache for Pokemon data to reduce API calls
 pokemon_cache = {}
-type_cache = {}  # Cache for type effectiveness data
 cache_duration = timedelta(hours=1)
 
 # --- PvPoke Rankings Data Loading ---
-pvp_rankings_by_species = {}
+
+def parse_pvp_rankings(rankings_path):
+    """Parse a PvPoke rankings file into the fields we serve, indexed by speciesId"""
+    with open(rankings_path, encoding='utf-8') as f:
+        rankings_data = json.load(f)
+    
+    rankings = {}
+    for pokemon in rankings_data:
+        species_id = pokemon['speciesId']
+        rankings[species_id] = {
+            'speciesName': pokemon['speciesName'],
+            'rating': pokemon.get('rating', 0),
+            'score': pokemon.get('score', 0),
+            'moves': pokemon.get('moves', {}),
+            'moveset': pokemon.get('moveset', []),
+            'stats': pokemon.get('stats', {}),
+            'matchups': pokemon.get('matchups', []),
+            'counters': pokemon.get('counters', [])
+        }
+    return rankings
 
 def load_pvp_rankings(cp_cap=1500):
-    """Load PvPoke rankings data for the specified CP cap"""
-    global pvp_rankings_by_species
+    """Load PvPoke rankings data for the specified CP cap, indexed by speciesId"""
     try:
-        # Use the rankings file for the specified CP cap
-        rankings_path = f'pvpoke/src/data/rankings/all/overall/rankings-{cp_cap}.json'
+        # Use the rankings file for the specified CP cap (10000 for Master League, as PokeData does)
+        rankings_path = RANK1_PATH_TEMPLATE.format(cp_cap or 10000)
         print(f"[DEBUG] Loading PvP rankings for CP cap {cp_cap} from {rankings_path}")
         
-        with open(rankings_path, encoding='utf-8') as f:
-            rankings_data = json.load(f)
-            
-        # Index by speciesId for fast lookup
-        for pokemon in rankings_data:
-            species_id = pokemon['speciesId']
-            pvp_rankings_by_species[species_id] = {
-                'speciesName': pokemon['speciesName'],
-                'rating': pokemon.get('rating', 0),
-                'score': pokemon.get('score', 0),
-                'moves': pokemon.get('moves', {}),
-                'moveset': pokemon.get('moveset', []),
-                'stats': pokemon.get('stats', {}),
-                'matchups': pokemon.get('matchups', []),
-                'counters': pokemon.get('counters', [])
-            }
+        # Served from a binary snapshot unless the rankings file changed
+        pvp_rankings_by_species = load_cached('rankings', rankings_path, parse_pvp_rankings)
             
         print(f"[DEBUG] Loaded {len(pvp_rankings_by_species)} Pokemon from PvPoke rankings for CP {cp_cap}")
+        return pvp_rankings_by_species
         
     except Exception as e:
         print(f"Error loading PvPoke rankings for CP {cp_cap}: {e}")
         # Fallback to CSV if PvPoke data is not available
-        load_pvp_csv_fallback()
+        return load_pvp_csv_fallback()
 
 def load_pvp_csv_fallback():
     """Fallback to CSV loading if PvPoke data is not available"""
-    global pvp_rankings_by_species
+    pvp_rankings_by_species = {}
     try:
         with open('cp1500_all_overall_rankings.csv', encoding='utf-8') as f:
             reader = csv.DictReader(f)
@@ -91,16 +106,67 @@ def load_pvp_csv_fallback():
         print(f"[DEBUG] Loaded {len(pvp_rankings_by_species)} Pokemon from CSV fallback")
     except Exception as e:
         print(f"Error loading PvP CSV fallback: {e}")
+    return pvp_rankings_by_species
+
+# --- Resident leagues ---
+# Every league is built once at startup and never mutated, so requests for
+# different leagues can run concurrently without reloading anything
+DEFAULT_CP_CAP = 1500
+SUPPORTED_CP_CAPS = (500, 1500, 2500, 0)
+INVALID_CP_CAP_ERROR = 'Invalid CP cap. Supported values: 0 (Master League), 500, 1500, 2500'
 
-# Call at startup - load Great League (1500 CP) by default
-load_pvp_rankings(1500)
+@dataclass(frozen=True)
+class League:
+    """Read-only per-league view: species data, rankings, simulator and search index"""
+    cp_cap: int
+    poke_data: PokeData
+    rankings: Mapping[str, Dict[str, Any]]
+    battle_simulator: BattleSimulator
+    search_index: SearchIndex
 
-def reload_pvp_rankings_for_cap(cp_cap):
-    """Reload PvP rankings for a different CP cap"""
-    global pvp_rankings_by_species
-    pvp_rankings_by_species.clear()  # Clear existing data
-    load_pvp_rankings(cp_cap)
-    print(f"[DEBUG] Reloaded PvP rankings for CP cap {cp_cap}")
+    @property
+    def name(self):
+        return f"CP{self.cp_cap}" if self.cp_cap > 0 else "Master League"
+
+def build_league(base_poke_data, cp_cap):
+    """Build a league's view on top of the shared gamemaster/moves data"""
+    poke_data = base_poke_data.for_league(cp_cap)
+    rankings = MappingProxyType(load_pvp_rankings(cp_cap))
+    return League(
+        cp_cap=cp_cap,
+        poke_data=poke_data,
+        rankings=rankings,
+        battle_simulator=BattleSimulator(poke_data),
+        # Autocomplete index, ranked by this league's PvPoke scores
+        search_index=SearchIndex(poke_data.pokemon, rankings)
+    )
+
+base_poke_data = PokeData(cp_cap=DEFAULT_CP_CAP)
+leagues = {cp_cap: build_league(base_poke_data, cp_cap) for cp_cap in SUPPORTED_CP_CAPS}
+
+def parse_cp_cap(value):
+    """CP cap as a supported int, or None"""
+    if isinstance(value, bool):
+        return None
+    try:
+        cp_cap = int(value)
+    except (TypeError, ValueError):
+        return None
+    return cp_cap if cp_cap in leagues else None
+
+def get_request_league(data=None):
+    """
+    League for the current request: cp_cap from the JSON body or query string,
+    else the one chosen for this session via /api/league, else Great League.
+    Returns None for an unsupported cp_cap.
+    """
+    cp_cap = data.get('cp_cap') if isinstance(data, dict) else None
+    if cp_cap is None:
+        cp_cap = request.args.get('cp_cap')
+    if cp_cap is None:
+        cp_cap = session.get('cp_cap', DEFAULT_CP_CAP)
+    cp_cap = parse_cp_cap(cp_cap)
+    return leagues[cp_cap] if cp_cap is not None else None
 
 # Security: Input validation and sanitization functions
 def sanitize_input(input_str):
@@ -169,17 +235,20 @@ def index():
         # Still serve the page even if analytics fails
         return render_template('index.html')
 
-def get_move_effectiveness(move_type, defender_types):
-    # Use get_type_effectiveness to get the effectiveness dict for the defender
-    eff = get_type_effectiveness(defender_types)
-    multiplier = eff['effectiveness'].get(move_type, 1.0)
+def effectiveness_label(multiplier):
+    """Display label for a type effectiveness multiplier"""
     if multiplier > 1:
-        label = 'Super Effective'
+        return 'Super Effective'
     elif multiplier < 1:
-        label = 'Not Very Effective'
-    else:
-        label = 'Neutral'
-    print(f"[DEBUG] get_move_effectiveness: move_type={move_type}, defender_types={defender_types}, multiplier={multiplier}, label={label}")
+        return 'Not Very Effective'
+    return 'Neutral'
+
+def get_move_effectiveness(move_type, defender_types):
+    # Look the multiplier up in the shared type matrix, rounded for display
+    multiplier = round(TypeChart.get_effectiveness(move_type, defender_types), 3)
+    label = effectiveness_label(multiplier)
+    logger.debug("get_move_effectiveness: move_type=%s, defender_types=%s, multiplier=%s, label=%s",
+                 move_type, defender_types, multiplier, label)
     return multiplier, label
 
 @app.route('/api/pokemon/<name>')
@@ -193,6 +262,10 @@ def get_pokemon(name):
         
         sanitized_name = sanitize_pokemon_name(name)
         print(f"DEBUG: Looking for Pokemon: {sanitized_name}")
+        league = get_request_league()
+        if league is None:
+            return jsonify({'error': INVALID_CP_CAP_ERROR}), 400
+        poke_data = league.poke_data
         
         # Try to match by speciesId first, then by name
         p = poke_data.get_by_species_id(sanitized_name)
@@ -210,9 +283,9 @@ def get_pokemon(name):
         if not types:
             print(f"[WARN] Missing types for {p.get('speciesId')}")
 
-        # Defensive: Get type effectiveness using static chart
+        # Defensive: Get type effectiveness from the precomputed table
         try:
-            effectiveness = get_fallback_effectiveness(types)
+            effectiveness = get_type_effectiveness(types)
         except Exception as e:
             print(f"[WARN] Error in get_fallback_effectiveness for {p.get('speciesId')}: {e}")
             effectiveness = {}
@@ -263,7 +336,7 @@ def get_pokemon(name):
 
         # Defensive: Get PvPoke rankings data for this Pokémon
         species_id = p.get('speciesId', '').lower()
-        pvpoke_data = pvp_rankings_by_species.get(species_id, {})
+        pvpoke_data = league.rankings.get(species_id, {})
         if not pvpoke_data:
             print(f"[WARN] No PvPoke data for {species_id}")
         
@@ -285,7 +358,7 @@ def get_pokemon(name):
 
         # Cache the data
         try:
-            cache_pokemon(sanitized_name.lower(), formatted_data)
+            cache_pokemon(f"{league.cp_cap}:{sanitized_name.lower()}", formatted_data)
         except Exception as e:
             print(f"[WARN] Error caching data for {sanitized_name}: {e}")
 
@@ -314,36 +387,13 @@ def search_pokemon(query):
             return jsonify({'error': 'Invalid search query'}), 400
         
         sanitized_query = sanitize_pokemon_name(query)
+        league = get_request_league()
+        if league is None:
+            return jsonify({'error': INVALID_CP_CAP_ERROR}), 400
         
-        # Use local data for all Pokémon
-        all_pokemon = poke_data.pokemon
-
-        normalized_query = sanitized_query.lower().replace(' ', '').replace('-', '')
-        def norm(s):
-            return s.lower().replace(' ', '').replace('-', '')
-        
-        matching_pokemon = [
-            {
-                'name': p['speciesId'],
-                'readable_name': p['speciesName'],
-                'sprite': f"/static/sprites/{p['speciesId']}.png",
-                'types': p.get('types', [])
-            }
-            for p in all_pokemon
-            if normalized_query in norm(p.get('speciesName', '')) or normalized_query in norm(p.get('speciesId', ''))
-        ]
-        
-        if not matching_pokemon and all_pokemon:
-            # fallback: return the closest match
-            best = min(all_pokemon, key=lambda p: abs(len(norm(p.get('speciesName', ''))) - len(normalized_query)))
-            matching_pokemon = [{
-                'name': best['speciesId'],
-                'readable_name': best['speciesName'],
-                'sprite': f"/static/sprites/{best['speciesId']}.png",
-                'types': best.get('types', [])
-            }]
-        
-        matching_pokemon = matching_pokemon[:10]  # Limit to 10 results
+        # Ranked prefix/substring matches from the prebuilt index (limited to 10 results),
+        # falling back to the closest names by edit distance when nothing matches
+        matching_pokemon = league.search_index.search(sanitized_query, limit=10)
         
         # Track search if we found results
         if matching_pokemon:
@@ -360,125 +410,30 @@ def search_pokemon(query):
         else:
             return jsonify({'error': 'Internal server error'}), 500
 
-def get_type_effectiveness(types):
-    """Calculate type effectiveness for given Pokemon types using PvP multipliers (no immunities in Go PvP)"""
-    try:
-        # Check if we have cached type data
-        type_key = '-'.join(sorted(types))
-        if type_key in type_cache:
-            cached_data, timestamp = type_cache[type_key]
-            if datetime.now() - timestamp < cache_duration:
-                return cached_data
-        print(f"DEBUG: Processing types: {types}")
-        # PvP multipliers
-        PVP_WEAK = 1.6
-        PVP_RESIST = 0.625
-        PVP_DOUBLE_RESIST = 0.391
-        # Get type effectiveness from PokeAPI for each type
-        combined_effectiveness = {}
-        all_types = ['normal', 'fire', 'water', 'electric', 'grass', 'ice', 'fighting', 
-                     'poison', 'ground', 'flying', 'psychic', 'bug', 'rock', 'ghost', 
-                     'dragon', 'dark', 'steel', 'fairy']
-        # Initialize all types with 1.0 multiplier
-        for attacking_type in all_types:
-            combined_effectiveness[attacking_type] = 1.0
-        # Get effectiveness data for each defending type
-        for defending_type in types:
-            print(f"DEBUG: Processing defending type: {defending_type}")
-            # Check if type data is cached
-            if defending_type in type_cache:
-                type_data = type_cache[defending_type][0]
-                print(f"DEBUG: Using cached data for {defending_type}")
-            else:
-                response = requests.get(f'https://pokeapi.co/api/v2/type/{defending_type}')
-                if response.status_code == 200:
-                    type_data = response.json()
-                    # Cache the type data
-                    type_cache[defending_type] = (type_data, datetime.now())
-                    print(f"DEBUG: Fetched fresh data for {defending_type}")
-                else:
-                    print(f"DEBUG: Failed to fetch data for {defending_type}")
-                    continue
-            # Process damage relations
-            if 'damage_relations' in type_data:
-                print(f"DEBUG: Damage relations for {defending_type}: {type_data['damage_relations']}")
-                for relation_name, type_list in type_data['damage_relations'].items():
-                    print(f"DEBUG: Processing {relation_name} for {defending_type}")
-                    if relation_name == 'double_damage_from':
-                        for attacking_type_info in type_list:
-                            attacking_type_name = attacking_type_info['name']
-                            if attacking_type_name in combined_effectiveness:
-                                old_value = combined_effectiveness[attacking_type_name]
-                                combined_effectiveness[attacking_type_name] *= PVP_WEAK
-                                print(f"DEBUG: {attacking_type_name} vs {defending_type}: {old_value} -> {combined_effectiveness[attacking_type_name]} (WEAK)")
-                    elif relation_name == 'half_damage_from':
-                        for attacking_type_info in type_list:
-                            attacking_type_name = attacking_type_info['name']
-                            if attacking_type_name in combined_effectiveness:
-                                old_value = combined_effectiveness[attacking_type_name]
-                                combined_effectiveness[attacking_type_name] *= PVP_RESIST
-                                print(f"DEBUG: {attacking_type_name} vs {defending_type}: {old_value} -> {combined_effectiveness[attacking_type_name]} (RESIST)")
-                    # Do NOT process 'no_damage_from' as immunity in Go PvP
-            else:
-                print(f"ERROR: No 'damage_relations' found for type {defending_type}. type_data: {type_data}")
-                continue
-        # After processing all types, adjust for double resistance
-        for atk_type in all_types:
-            # If multiplier is exactly PVP_RESIST * PVP_RESIST, set to PVP_DOUBLE_RESIST
-            if abs(combined_effectiveness[atk_type] - (PVP_RESIST * PVP_RESIST)) < 0.01:
-                combined_effectiveness[atk_type] = PVP_DOUBLE_RESIST
-        print(f"DEBUG: Final effectiveness: {combined_effectiveness}")
-        result = {
-            'effectiveness': combined_effectiveness,
-            'weaknesses': [(type_name, mult) for type_name, mult in combined_effectiveness.items() if mult > 1],
-            'resistances': [(type_name, mult) for type_name, mult in combined_effectiveness.items() if mult < 1 and mult > PVP_DOUBLE_RESIST],
-            'double_resistances': [(type_name, mult) for type_name, mult in combined_effectiveness.items() if mult <= PVP_DOUBLE_RESIST]
-        }
-        type_cache[type_key] = (result, datetime.now())
-        return result
-    except Exception as e:
-        print(f"Error getting type effectiveness: {e}")
-        import traceback
-        traceback.print_exc()
-        return get_fallback_effectiveness(types)
-
-def get_fallback_effectiveness(types):
-    """Fallback effectiveness calculation if API fails (PvP multipliers, no immunities)"""
-    # PvP multipliers
-    PVP_WEAK = 1.6
-    PVP_NEUTRAL = 1.0
-    PVP_RESIST = 0.625
-    PVP_DOUBLE_RESIST = 0.391
-    PVP_TRIPLE_RESIST = 0.244
-    all_types = ['normal', 'fire', 'water', 'electric', 'grass', 'ice', 'fighting', 'poison', 'ground', 'flying', 'psychic', 'bug', 'rock', 'ghost', 'dragon', 'dark', 'steel', 'fairy']
-    # Type chart: attacking_type -> defending_type -> multiplier
-    effectiveness_chart = {
-        'normal': {'rock': PVP_RESIST, 'ghost': PVP_RESIST, 'steel': PVP_RESIST},
-        'fire': {'fire': PVP_RESIST, 'water': PVP_RESIST, 'grass': PVP_WEAK, 'ice': PVP_WEAK, 'bug': PVP_WEAK, 'rock': PVP_RESIST, 'dragon': PVP_RESIST, 'steel': PVP_WEAK},
-        'water': {'fire': PVP_WEAK, 'water': PVP_RESIST, 'grass': PVP_RESIST, 'ground': PVP_WEAK, 'rock': PVP_WEAK, 'dragon': PVP_RESIST},
-        'electric': {'water': PVP_WEAK, 'electric': PVP_RESIST, 'grass': PVP_RESIST, 'ground': PVP_RESIST, 'flying': PVP_WEAK, 'dragon': PVP_RESIST},
-        'grass': {'fire': PVP_RESIST, 'water': PVP_WEAK, 'grass': PVP_RESIST, 'poison': PVP_RESIST, 'ground': PVP_WEAK, 'flying': PVP_RESIST, 'bug': PVP_RESIST, 'rock': PVP_WEAK, 'dragon': PVP_RESIST, 'steel': PVP_RESIST},
-        'ice': {'fire': PVP_RESIST, 'water': PVP_RESIST, 'grass': PVP_WEAK, 'ice': PVP_RESIST, 'ground': PVP_WEAK, 'flying': PVP_WEAK, 'dragon': PVP_WEAK, 'steel': PVP_RESIST},
-        'fighting': {'normal': PVP_WEAK, 'ice': PVP_WEAK, 'rock': PVP_WEAK, 'dark': PVP_WEAK, 'steel': PVP_WEAK, 'poison': PVP_RESIST, 'flying': PVP_RESIST, 'psychic': PVP_RESIST, 'bug': PVP_RESIST, 'fairy': PVP_RESIST},
-        'poison': {'grass': PVP_WEAK, 'fairy': PVP_WEAK, 'poison': PVP_RESIST, 'ground': PVP_RESIST, 'rock': PVP_RESIST, 'ghost': PVP_RESIST, 'steel': PVP_RESIST},
-        'ground': {'fire': PVP_WEAK, 'electric': PVP_WEAK, 'poison': PVP_WEAK, 'rock': PVP_WEAK, 'steel': PVP_WEAK, 'grass': PVP_RESIST, 'ice': PVP_RESIST, 'bug': PVP_RESIST},
-        'flying': {'electric': PVP_RESIST, 'grass': PVP_WEAK, 'fighting': PVP_WEAK, 'bug': PVP_WEAK, 'rock': PVP_RESIST, 'steel': PVP_RESIST},
-        'psychic': {'fighting': PVP_WEAK, 'poison': PVP_WEAK, 'psychic': PVP_RESIST, 'steel': PVP_RESIST, 'dark': PVP_RESIST},
-        'bug': {'fire': PVP_RESIST, 'grass': PVP_WEAK, 'fighting': PVP_RESIST, 'poison': PVP_RESIST, 'flying': PVP_RESIST, 'psychic': PVP_WEAK, 'ghost': PVP_RESIST, 'dark': PVP_WEAK, 'steel': PVP_RESIST, 'fairy': PVP_RESIST},
-        'rock': {'fire': PVP_WEAK, 'ice': PVP_WEAK, 'fighting': PVP_RESIST, 'ground': PVP_RESIST, 'flying': PVP_WEAK, 'bug': PVP_WEAK, 'steel': PVP_RESIST},
-        'ghost': {'normal': PVP_RESIST, 'psychic': PVP_WEAK, 'ghost': PVP_WEAK, 'dark': PVP_RESIST},
-        'dragon': {'dragon': PVP_WEAK, 'steel': PVP_RESIST, 'fairy': PVP_RESIST},
-        'dark': {'fighting': PVP_RESIST, 'psychic': PVP_WEAK, 'ghost': PVP_WEAK, 'dark': PVP_RESIST, 'fairy': PVP_RESIST},
-        'steel': {'fire': PVP_RESIST, 'water': PVP_RESIST, 'electric': PVP_RESIST, 'ice': PVP_WEAK, 'rock': PVP_WEAK, 'fairy': PVP_WEAK, 'steel': PVP_RESIST},
-        'fairy': {'fire': PVP_RESIST, 'fighting': PVP_WEAK, 'poison': PVP_RESIST, 'dragon': PVP_WEAK, 'dark': PVP_WEAK, 'steel': PVP_RESIST},
-    }
-    # Start with 1.0 for all types
-    combined_effectiveness = {t: 1.0 for t in all_types}
-    for defending_type in types:
-        for attacking_type in all_types:
-            mult = effectiveness_chart.get(attacking_type, {}).get(defending_type, 1.0)
-            combined_effectiveness[attacking_type] *= mult
-    # Categorize by closest PvP multiplier
+# PvP multipliers used to label each attacking type against a typing
+PVP_WEAK = 1.6
+PVP_NEUTRAL = 1.0
+PVP_RESIST = 0.625
+PVP_DOUBLE_RESIST = 0.391
+PVP_TRIPLE_RESIST = 0.244
+
+def _closest_category(mult):
+    """Bucket a multiplier by the closest PvP multiplier"""
+    # Order: triple, double, single, neutral, weakness
+    pvp_vals = [
+        (PVP_TRIPLE_RESIST, 'triple_resistances'),
+        (PVP_DOUBLE_RESIST, 'double_resistances'),
+        (PVP_RESIST, 'resistances'),
+        (PVP_NEUTRAL, 'neutral'),
+        (PVP_WEAK, 'weaknesses')
+    ]
+    return min(pvp_vals, key=lambda x: abs(mult - x[0]))[1]
+
+def _build_type_effectiveness(typing):
+    """Defensive type chart for one interned typing (PvP multipliers, no immunities)"""
+    # One matrix column holds every attacking type against this typing
+    profile = TypeChart.TYPING_MATRIX[:, typing]
+    combined_effectiveness = {t: round(float(mult), 3) for t, mult in zip(TypeChart.TYPES, profile)}
     categories = {
         'weaknesses': [],
         'triple_resistances': [],
@@ -486,21 +441,8 @@ def get_fallback_effectiveness(types):
         'resistances': [],
         'neutral': []
     }
-    def closest_category(mult):
-        # Order: triple, double, single, neutral, weakness
-        pvp_vals = [
-            (PVP_TRIPLE_RESIST, 'triple_resistances'),
-            (PVP_DOUBLE_RESIST, 'double_resistances'),
-            (PVP_RESIST, 'resistances'),
-            (PVP_NEUTRAL, 'neutral'),
-            (PVP_WEAK, 'weaknesses')
-        ]
-        closest = min(pvp_vals, key=lambda x: abs(mult - x[0]))
-        return closest[1], closest[0]
     for t, mult in combined_effectiveness.items():
-        cat, val = closest_category(mult)
-        categories[cat].append((t, mult))
-    print(f"[DEBUG] get_fallback_effectiveness: types={types}\n  combined_effectiveness={combined_effectiveness}\n  weaknesses={categories['weaknesses']}\n  resistances={categories['resistances']}\n  double_resistances={categories['double_resistances']}\n  triple_resistances={categories['triple_resistances']}")
+        categories[_closest_category(mult)].append([t, mult])
     return {
         'effectiveness': combined_effectiveness,
         'weaknesses': categories['weaknesses'],
@@ -509,6 +451,20 @@ def get_fallback_effectiveness(types):
         'triple_resistances': categories['triple_resistances']
     }
 
+def build_type_effectiveness_table():
+    """Precompute the defensive chart of every single and dual typing from the local type matrix"""
+    return {typing: _build_type_effectiveness(typing) for typing in range(TypeChart.UNKNOWN_TYPING + 1)}
+
+# Every typing's weaknesses and resistances, built once at startup with no network access
+type_effectiveness_table = build_type_effectiveness_table()
+
+def get_type_effectiveness(types):
+    """Weaknesses and resistances for given Pokemon types using PvP multipliers (no immunities in Go PvP).
+
+    Returns a shared, ready-to-serialize dict from the precomputed table; callers must not modify it.
+    """
+    return type_effectiveness_table[TypeChart.typing_id(types)]
+
 @app.route('/api/matchup', methods=['POST'])
 def matchup():
     """API endpoint to get matchup analysis between opponent and team"""
@@ -519,6 +475,10 @@ def matchup():
         
         if not opponent_name or not team:
             return jsonify({'error': 'Missing opponent or team data'}), 400
+        league = get_request_league(data)
+        if league is None:
+            return jsonify({'error': INVALID_CP_CAP_ERROR}), 400
+        poke_data = league.poke_data
         
         print(f"DEBUG: Matchup request - opponent: {opponent_name}, team: {team}")
         
@@ -536,7 +496,7 @@ def matchup():
         
         # Get opponent moves
         opponent_moves = poke_data.get_pokemon_moves(opponent_data['speciesId'])
-        pvpoke_moveset = pvp_rankings_by_species.get(opponent_data['speciesId'].lower(), {}).get('moveset', [])
+        pvpoke_moveset = league.rankings.get(opponent_data['speciesId'].lower(), {}).get('moveset', [])
         # Normalize PvPoke moveset for matching (upper, lower, underscores, spaces)
         def normalize_move_name(name):
             return name.lower().replace('_', '').replace(' ', '')
@@ -559,7 +519,7 @@ def matchup():
         print(f"DEBUG: Opponent moves: {len(opponent_moves.get('fast_moves', []))} fast, {len(opponent_moves.get('charged_moves', []))} charged")
 
         # Get opponent effectiveness (full type chart)
-        opponent_effectiveness = get_fallback_effectiveness(opponent_types)
+        opponent_effectiveness = get_type_effectiveness(opponent_types)
         
         # Get team info directly from poke_data
         team_infos = []
@@ -583,7 +543,7 @@ def matchup():
                         'energyGain': move.get('energyGain')
                     })
                 # Add full effectiveness for each team member
-                team_effectiveness = get_fallback_effectiveness(team_data.get('types', []))
+                team_effectiveness = get_type_effectiveness(team_data.get('types', []))
                 team_infos.append({
                     'name': team_data['speciesName'],
                     'types': team_data.get('types', []),
@@ -595,30 +555,25 @@ def matchup():
                     'name': name,
                     'types': [],
                     'pvp_moves': [],
-                    'effectiveness': get_fallback_effectiveness([])
+                    'effectiveness': get_type_effectiveness([])
                 })
 
         # For each opponent move, calculate effectiveness vs each team member
+        team_typings = TypeChart.typing_ids([t.get('types', []) for t in team_infos])
         opponent_moves_vs_team = []
         for move in opponent_pvp_moves:
             move_row = {
                 'move': move,
                 'vs_team': []
             }
-            for t in team_infos:
-                t_types = t.get('types', [])
-                try:
-                    multiplier, label = get_move_effectiveness(move['type'], t_types)
-                    move_row['vs_team'].append({
-                        'pokemon': t['name'], 
-                        'effectiveness': {'multiplier': multiplier, 'label': label}
-                    })
-                except Exception as move_error:
-                    print(f"DEBUG: Error calculating move effectiveness for {move['type']} vs {t_types}: {move_error}")
-                    move_row['vs_team'].append({
-                        'pokemon': t['name'], 
-                        'effectiveness': {'multiplier': 1.0, 'label': 'Neutral'}
-                    })
+            # One vectorized lookup covers the whole team
+            multipliers = TypeChart.effectiveness_against(move['type'], team_typings)
+            for t, multiplier in zip(team_infos, multipliers):
+                multiplier = round(float(multiplier), 3)
+                move_row['vs_team'].append({
+                    'pokemon': t['name'], 
+                    'effectiveness': {'multiplier': multiplier, 'label': effectiveness_label(multiplier)}
+                })
             opponent_moves_vs_team.append(move_row)
 
         # For each team member, get their PvP moves and effectiveness vs opponent
@@ -660,8 +615,6 @@ def matchup():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
-battle_simulator = BattleSimulator(poke_data)
-
 @app.route('/api/battle', methods=['POST'])
 def api_battle():
     """Simulate a battle between two Pokémon with movesets and shields."""
@@ -676,15 +629,18 @@ def api_battle():
         p1_shield_ai = data.get('p1_shield_ai', 'smart_30')  # Default shield AI strategy
         p2_shield_ai = data.get('p2_shield_ai', 'smart_30')  # Default shield AI strategy
         settings = data.get('settings', {})
-        cp_cap = data.get('cp_cap', 1500)  # Default to Great League
         
         # Validate input
         if not p1_id or not p2_id or not p1_moves or not p2_moves:
             return jsonify({'error': 'Missing required parameters'}), 400
+        if not _is_shield_count(p1_shields) or not _is_shield_count(p2_shields):
+            return jsonify({'error': 'Invalid shields. Supported values: 0-2'}), 400
         
-        # Validate CP cap
-        if cp_cap not in [0, 500, 1500, 2500]:
-            return jsonify({'error': 'Invalid CP cap. Supported values: 0 (Master League), 500, 1500, 2500'}), 400
+        # Validate CP cap (defaults to Great League)
+        league = get_request_league(data)
+        if league is None:
+            return jsonify({'error': INVALID_CP_CAP_ERROR}), 400
+        poke_data = league.poke_data
         
         # Validate shield AI strategies
         valid_shield_strategies = ['never', 'always', 'smart_20', 'smart_30', 'smart_50', 'conservative', 'aggressive', 'balanced']
@@ -704,40 +660,28 @@ def api_battle():
         p1_available_moves = poke_data.get_pokemon_moves(p1_id)
         p2_available_moves = poke_data.get_pokemon_moves(p2_id)
         
-        print(f"[DEBUG] P1 available moves: {p1_available_moves}")
-        print(f"[DEBUG] P2 available moves: {p2_available_moves}")
-        print(f"[DEBUG] P1 moves received: {p1_moves}")
-        print(f"[DEBUG] P2 moves received: {p2_moves}")
-        
         # Check if selected moves are valid
         if not _validate_moveset(p1_moves, p1_available_moves):
-            print(f"[DEBUG] P1 moveset validation failed: {p1_moves}")
-            print(f"[DEBUG] P1 available move IDs: {[m['id'] for m in p1_available_moves.get('fast_moves', []) + p1_available_moves.get('charged_moves', [])]}")
+            logger.debug("P1 moveset validation failed: %s (available: %s)", p1_moves, p1_available_moves)
             return jsonify({'error': f'Invalid moveset for {p1_id}'}), 400
         if not _validate_moveset(p2_moves, p2_available_moves):
-            print(f"[DEBUG] P2 moveset validation failed: {p2_moves}")
-            print(f"[DEBUG] P2 available move IDs: {[m['id'] for m in p2_available_moves.get('fast_moves', []) + p2_available_moves.get('charged_moves', [])]}")
+            logger.debug("P2 moveset validation failed: %s (available: %s)", p2_moves, p2_available_moves)
             return jsonify({'error': f'Invalid moveset for {p2_id}'}), 400
         
-        # Update settings with shield AI strategies
-        battle_settings = settings.copy()
-        battle_settings['p1_shield_ai'] = p1_shield_ai
-        battle_settings['p2_shield_ai'] = p2_shield_ai
+        # Validate settings and add shield AI strategies
+        battle_settings, error = _build_battle_settings(settings, p1_shield_ai, p2_shield_ai)
+        if error:
+            return jsonify({'error': error}), 400
         
         # Run battle simulation
-        print(f"[DEBUG] Running battle simulation for CP cap: {cp_cap}")
-        print(f"[DEBUG] P1 shield AI: {p1_shield_ai}, P2 shield AI: {p2_shield_ai}")
-        print(f"[DEBUG] P1 moves received: {p1_moves}")
-        print(f"[DEBUG] P2 moves received: {p2_moves}")
-        result = battle_simulator.simulate(
-            p1_data=p1,
-            p2_data=p2,
-            p1_moves=p1_moves,
-            p2_moves=p2_moves,
-            p1_shields=p1_shields,
-            p2_shields=p2_shields,
-            settings=battle_settings
-        )
+        logger.debug("Battle %s (%s, %s) vs %s (%s, %s) for CP cap %s",
+                     p1_id, p1_moves, p1_shield_ai, p2_id, p2_moves, p2_shield_ai, league.cp_cap)
+        try:
+            result = _simulate_battles(league, [(p1, p2, p1_moves, p2_moves, p1_shields, p2_shields)],
+                                       battle_settings)[0]
+        except ValueError as e:
+            # Settings are validated above, so this is a matchup that could never end
+            return jsonify({'error': str(e)}), 400
         
         # Track unique battle (full team vs opponent, including moves and league)
         team_ids = data.get('team_ids') or [p1_id]  # Try to get full team from frontend, fallback to just p1_id
@@ -749,7 +693,7 @@ def api_battle():
             team_moves=team_moves,
             opponent=p2_id,
             opponent_moves=opponent_moves,
-            league=f"CP{cp_cap}" if cp_cap > 0 else "Master League",
+            league=league.name,
             ip=request.remote_addr
         )
         
@@ -758,7 +702,7 @@ def api_battle():
         result['p2_name'] = p2['speciesName']
         result['p1_species_id'] = p1['speciesId']
         result['p2_species_id'] = p2['speciesId']
-        result['cp_cap'] = cp_cap
+        result['cp_cap'] = league.cp_cap
         result['p1_shield_ai'] = p1_shield_ai
         result['p2_shield_ai'] = p2_shield_ai
         
@@ -767,6 +711,276 @@ def api_battle():
     except Exception as e:
         return jsonify({'error': f'Battle simulation failed: {str(e)}'}), 500
 
+# Upper bound on pairings a single batch request may ask for
+MAX_BATCH_BATTLES = 150
+# Optimal play searches take up to a second or more each, so a batch may hold only a few
+MAX_BATCH_OPTIMAL_BATTLES = 4
+
+# Wall-clock budget of one battle request, however many battles or Monte Carlo runs it holds
+REQUEST_TIME_BUDGET = 10.0
+
+# Monte Carlo runs per battle. Runs stay in the request's process: forking a
+# threaded web worker is unsafe, and a pool per request multiplies processes
+MAX_MONTE_CARLO_RUNS = 5000
+
+def _build_battle_settings(settings, p1_shield_ai, p2_shield_ai):
+    """Validate client battle settings and add the shield AI strategies.
+
+    Returns (battle_settings, error) where error is a message string or None.
+    """
+    if not isinstance(settings, dict):
+        return None, 'Invalid settings'
+    battle_settings = settings.copy()
+    # Worker processes, search budgets and battle limits are a server decision, never a client one
+    for key in ('processes', 'node_budget', 'time_budget', 'max_turns', 'deadline'):
+        battle_settings.pop(key, None)
+    runs = battle_settings.get('runs', 1)
+    if not isinstance(runs, int) or isinstance(runs, bool) or not 1 <= runs <= MAX_MONTE_CARLO_RUNS:
+        return None, f'Invalid runs. Supported values: 1-{MAX_MONTE_CARLO_RUNS}'
+    seed = battle_settings.get('seed')
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)):
+        return None, 'Invalid seed. Must be an integer'
+    mode = battle_settings.get('mode', 'battle')
+    if mode not in BattleSimulator.MODES:
+        return None, f'Invalid mode. Supported values: {", ".join(BattleSimulator.MODES)}'
+    for key in ('p1_play', 'p2_play'):
+        if battle_settings.get(key, 'optimal') not in BattleSimulator.PLAY_STYLES:
+            return None, f'Invalid {key}. Supported values: {", ".join(BattleSimulator.PLAY_STYLES)}'
+    if battle_settings.get('detail', 'full') not in BattleSimulator.DETAIL_LEVELS:
+        return None, f'Invalid detail. Supported values: {", ".join(BattleSimulator.DETAIL_LEVELS)}'
+    if not isinstance(battle_settings.get('trace', False), bool):
+        return None, 'Invalid trace. Must be a boolean'
+    battle_settings['p1_shield_ai'] = p1_shield_ai
+    battle_settings['p2_shield_ai'] = p2_shield_ai
+    return battle_settings, None
+
+# Battle results shared by every worker process, keyed by the full battle request
+battle_cache = BattleResultCache()
+
+def _is_reproducible(league, battle, battle_settings):
+    """Whether a battle's result is fully determined by its request, so it can be cached"""
+    if battle_settings.get('seed') is not None or battle_settings.get('mode') == 'expected':
+        return True
+    p1, p2, p1_moves, p2_moves = battle[:4]
+    profiles = league.battle_simulator.profiles
+    return not (profiles.get(p1, p1_moves, league.poke_data).has_random_buffs()
+                or profiles.get(p2, p2_moves, league.poke_data).has_random_buffs())
+
+def _simulate_battles(league, battles, battle_settings):
+    """Simulate (p1, p2, p1_moves, p2_moves, p1_shields, p2_shields) battles, through the result cache.
+
+    Misses that only need the outcome run together in the batch engine.
+    The whole call gets REQUEST_TIME_BUDGET: every simulation stops at that
+    deadline, and battles not started by then come back aborted with
+    'time_budget' without running. Results that depend on timing (an
+    exhausted time budget) are not cached.
+    """
+    deadline = time.monotonic() + REQUEST_TIME_BUDGET
+    poke_data = league.poke_data
+    keys = []
+    results = []
+    for battle in battles:
+        key = None
+        if _is_reproducible(league, battle, battle_settings):
+            p1, p2, p1_moves, p2_moves, p1_shields, p2_shields = battle
+            key = battle_key(league.cp_cap, poke_data.data_version, p1['speciesId'], p2['speciesId'],
+                             p1_moves, p2_moves, p1_shields, p2_shields, battle_settings)
+        keys.append(key)
+        results.append(battle_cache.get(league.cp_cap, poke_data.data_version, key) if key else None)
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if not missing:
+        return results
+    pending = [battles[i] for i in missing]
+    # Keys are computed without the deadline, which only bounds this call
+    run_settings = dict(battle_settings, deadline=deadline)
+    if len(pending) > 1 and BatchSimulator.supports(battle_settings):
+        fresh = BatchSimulator(league.battle_simulator).simulate_many(pending, run_settings)
+    else:
+        fresh = []
+        for battle in pending:
+            if fresh and time.monotonic() > deadline:
+                fresh.append({'winner': None, 'battle_rating': 0.5, 'aborted': 'time_budget'})
+            else:
+                fresh.append(league.battle_simulator.simulate(*battle, settings=run_settings))
+    for i, result in zip(missing, fresh):
+        if keys[i] and result.get('aborted') != 'time_budget' and result.get('complete', True):
+            battle_cache.put(league.cp_cap, poke_data.data_version, keys[i], result)
+        results[i] = result
+    return results
+
+def _resolve_battle_entry(poke_data, entry):
+    """Resolve a {'id': ..., 'moves': {...}} batch entry once.
+
+    Returns (pokemon, moves, error) where error is a message string or None.
+    """
+    if not isinstance(entry, dict):
+        return None, None, 'Invalid battle entry'
+    species_id = entry.get('id')
+    moves = entry.get('moves')
+    if not species_id or not isinstance(moves, dict) or not moves:
+        return None, None, 'Missing id or moves in battle entry'
+    pokemon = poke_data.get_by_species_id(species_id)
+    if not pokemon:
+        return None, None, f'Pokemon not found: {species_id}'
+    if not _validate_moveset(moves, poke_data.get_pokemon_moves(species_id)):
+        return None, None, f'Invalid moveset for {species_id}'
+    return pokemon, moves, None
+
+def _is_shield_count(value):
+    """Whether value is a shield count (0-2); JSON true/false decode as ints but are not counts"""
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= 2
+
+def _parse_shield_scenarios(scenarios):
+    """Normalize shield scenarios to a list of (p1_shields, p2_shields) tuples.
+
+    Each scenario may be an int (same shields for both sides) or a two-item list.
+    Booleans are not shield counts, though JSON true/false decode as ints.
+    """
+    if not isinstance(scenarios, list):
+        return None
+    parsed = []
+    for scenario in scenarios:
+        if isinstance(scenario, bool):
+            return None
+        if isinstance(scenario, int):
+            pair = (scenario, scenario)
+        elif isinstance(scenario, (list, tuple)) and len(scenario) == 2:
+            pair = (scenario[0], scenario[1])
+        else:
+            return None
+        if not all(_is_shield_count(s) for s in pair):
+            return None
+        parsed.append(pair)
+    return parsed
+
+@app.route('/api/battle/batch', methods=['POST'])
+def api_battle_batch():
+    """Simulate every team member against one or more opponents in a single request."""
+    try:
+        data = request.get_json() or {}
+        team = data.get('team', [])
+        opponents = data.get('opponents', [])
+        p1_shield_ai = data.get('p1_shield_ai', 'smart_30')
+        p2_shield_ai = data.get('p2_shield_ai', 'smart_30')
+        settings = data.get('settings', {})
+
+        # Validate input
+        if not team or not opponents or not isinstance(team, list) or not isinstance(opponents, list):
+            return jsonify({'error': 'Missing required parameters'}), 400
+
+        league = get_request_league(data)
+        if league is None:
+            return jsonify({'error': INVALID_CP_CAP_ERROR}), 400
+
+        valid_shield_strategies = list(ShieldAI.STRATEGIES.keys())
+        if p1_shield_ai not in valid_shield_strategies:
+            return jsonify({'error': f'Invalid p1_shield_ai strategy. Supported values: {valid_shield_strategies}'}), 400
+        if p2_shield_ai not in valid_shield_strategies:
+            return jsonify({'error': f'Invalid p2_shield_ai strategy. Supported values: {valid_shield_strategies}'}), 400
+
+        shield_scenarios = _parse_shield_scenarios(data.get('shield_scenarios', [[2, 2]]))
+        if not shield_scenarios:
+            return jsonify({'error': 'Invalid shield_scenarios. Use 0-2 or [p1_shields, p2_shields] pairs'}), 400
+
+        if len(team) * len(opponents) * len(shield_scenarios) > MAX_BATCH_BATTLES:
+            return jsonify({'error': f'Too many battles requested (max {MAX_BATCH_BATTLES})'}), 400
+
+        # Resolve every species and moveset once up front
+        resolved_team = []
+        for entry in team:
+            pokemon, moves, error = _resolve_battle_entry(league.poke_data, entry)
+            if error:
+                return jsonify({'error': error}), 400
+            resolved_team.append((pokemon, moves))
+        resolved_opponents = []
+        for entry in opponents:
+            pokemon, moves, error = _resolve_battle_entry(league.poke_data, entry)
+            if error:
+                return jsonify({'error': error}), 400
+            resolved_opponents.append((pokemon, moves))
+
+        battle_settings, error = _build_battle_settings(settings, p1_shield_ai, p2_shield_ai)
+        if error:
+            return jsonify({'error': error}), 400
+        battle_count = len(team) * len(opponents) * len(shield_scenarios)
+        if battle_count * battle_settings.get('runs', 1) > max(MAX_BATCH_BATTLES, MAX_MONTE_CARLO_RUNS):
+            return jsonify({'error': 'Too many Monte Carlo runs requested for one batch'}), 400
+        if battle_settings.get('mode') == 'optimal' and battle_count > MAX_BATCH_OPTIMAL_BATTLES:
+            return jsonify({'error': f'Too many optimal battles requested (max {MAX_BATCH_OPTIMAL_BATTLES})'}), 400
+
+        battles = [(member, opponent, member_moves, opponent_moves, p1_shields, p2_shields)
+                   for opponent, opponent_moves in resolved_opponents
+                   for p1_shields, p2_shields in shield_scenarios
+                   for member, member_moves in resolved_team]
+        # Outcome-only batches run in lockstep; anything else needs simulate's extra output
+        try:
+            results = _simulate_battles(league, battles, battle_settings)
+        except ValueError as e:
+            # Settings are validated above, so this is a matchup that could never end
+            return jsonify({'error': str(e)}), 400
+        for i, (result, (member, opponent, _, _, p1_shields, p2_shields)) in enumerate(zip(results, battles)):
+            result['team_index'] = i % len(resolved_team)
+            result['p1_name'] = member['speciesName']
+            result['p2_name'] = opponent['speciesName']
+            result['p1_species_id'] = member['speciesId']
+            result['p2_species_id'] = opponent['speciesId']
+            result['p1_shields'] = p1_shields
+            result['p2_shields'] = p2_shields
+
+        for opponent, opponent_moves in resolved_opponents:
+            # Track unique battle once per opponent, as the single endpoint does per request
+            team_ids = data.get('team_ids') or [member['speciesId'] for member, _ in resolved_team]
+            team_moves = data.get('team_moves') or {member['speciesId']: moves for member, moves in resolved_team}
+            analytics.track_unique_battle(
+                team=team_ids,
+                team_moves=team_moves,
+                opponent=opponent['speciesId'],
+                opponent_moves=opponent_moves,
+                league=league.name,
+                ip=request.remote_addr
+            )
+
+        return jsonify({
+            'results': results,
+            'cp_cap': league.cp_cap,
+            'p1_shield_ai': p1_shield_ai,
+            'p2_shield_ai': p2_shield_ai
+        })
+
+    except Exception as e:
+        return jsonify({'error': f'Battle simulation failed: {str(e)}'}), 500
+
+@app.route('/api/battle/cache')
+def api_battle_cache():
+    """Hit/miss counters of this worker's battle result cache"""
+    return jsonify(battle_cache.stats())
+
+@app.route('/api/battle/breakpoints', methods=['POST'])
+def api_battle_breakpoints():
+    """Damage of every move in a matchup across buff stages, with its breakpoints and bulkpoints."""
+    try:
+        data = request.get_json() or {}
+        league = get_request_league(data)
+        if league is None:
+            return jsonify({'error': INVALID_CP_CAP_ERROR}), 400
+
+        p1, p1_moves, error = _resolve_battle_entry(league.poke_data, data.get('p1'))
+        if error:
+            return jsonify({'error': error}), 400
+        p2, p2_moves, error = _resolve_battle_entry(league.poke_data, data.get('p2'))
+        if error:
+            return jsonify({'error': error}), 400
+
+        readout = league.battle_simulator.damage_readout(p1, p2, p1_moves, p2_moves)
+        readout['p1_species_id'] = p1['speciesId']
+        readout['p2_species_id'] = p2['speciesId']
+        readout['cp_cap'] = league.cp_cap
+        return jsonify(readout)
+
+    except Exception as e:
+        return jsonify({'error': f'Breakpoint calculation failed: {str(e)}'}), 500
+
 def _validate_moveset(moveset, available_moves):
     """Validate that a moveset only uses available moves"""
     if 'fast' not in moveset:
@@ -795,6 +1009,10 @@ def get_pokemon_moves(name):
             return jsonify({'error': 'Invalid Pokemon name'}), 400
         
         sanitized_name = sanitize_pokemon_name(name)
+        league = get_request_league()
+        if league is None:
+            return jsonify({'error': INVALID_CP_CAP_ERROR}), 400
+        poke_data = league.poke_data
         
         # Try to match by speciesId first, then by name
         p = poke_data.get_by_species_id(sanitized_name)
@@ -807,7 +1025,7 @@ def get_pokemon_moves(name):
         moves_data = poke_data.get_pokemon_moves(p['speciesId'])
         
         # Get best moveset from PvPoke rankings
-        pvpoke_data = pvp_rankings_by_species.get(p['speciesId'].lower(), {})
+        pvpoke_data = league.rankings.get(p['speciesId'].lower(), {})
         best_moveset = pvpoke_data.get('moveset', [])
         
         # Convert PvPoke moveset to the expected format
@@ -860,6 +1078,50 @@ def get_shield_strategies():
         'default': 'smart_30'
     })
 
+# Memory-mapped matchup matrices, built offline with `python matrix_store.py`
+matrix_stores = MatrixStoreRegistry()
+
+@app.route('/api/matchup-rating/<p1_id>/<p2_id>')
+def get_matchup_rating(p1_id, p2_id):
+    """Look up precomputed battle ratings (0-1000, P1's perspective) without running a sim"""
+    try:
+        # Security: Validate input
+        if not validate_pokemon_name(p1_id) or not validate_pokemon_name(p2_id):
+            return jsonify({'error': 'Invalid Pokemon name'}), 400
+        try:
+            p1_shields = int(request.args.get('p1_shields', 1))
+            p2_shields = int(request.args.get('p2_shields', 1))
+        except ValueError:
+            return jsonify({'error': 'Invalid shield count'}), 400
+
+        league = get_request_league()
+        if league is None:
+            return jsonify({'error': INVALID_CP_CAP_ERROR}), 400
+        poke_data = league.poke_data
+        store = matrix_stores.get(poke_data.cp_cap, poke_data.data_version)
+        if store is None:
+            return jsonify({'error': 'Matchup matrix not available for this league'}), 503
+
+        p1_key = sanitize_pokemon_name(p1_id).lower()
+        p2_key = sanitize_pokemon_name(p2_id).lower()
+        rating = store.rating(p1_key, p2_key, (p1_shields, p2_shields))
+        if rating is None:
+            return jsonify({'error': 'Matchup not found in matrix'}), 404
+
+        return jsonify({
+            'p1_species_id': p1_key,
+            'p2_species_id': p2_key,
+            'p1_shields': p1_shields,
+            'p2_shields': p2_shields,
+            'rating': rating,
+            'all_scenarios': store.ratings_for(p1_key, p2_key),
+            'cp_cap': poke_data.cp_cap
+        })
+
+    except Exception as e:
+        print(f"[ERROR] Exception in get_matchup_rating: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @app.route('/api/pokemon/<name>/update-moves', methods=['POST'])
 def update_pokemon_moves(name):
     """Update moves for a Pokémon and return updated data"""
@@ -876,6 +1138,10 @@ def update_pokemon_moves(name):
         pokemon_type = data.get('type', 'team')  # 'team' or 'opponent'
         
         sanitized_name = sanitize_pokemon_name(name)
+        league = get_request_league(data)
+        if league is None:
+            return jsonify({'error': INVALID_CP_CAP_ERROR}), 400
+        poke_data = league.poke_data
         
         # Get Pokémon data
         p = poke_data.get_by_species_id(sanitized_name)
@@ -895,7 +1161,7 @@ def update_pokemon_moves(name):
         types = [t for t in p.get('types', []) if t and t != 'none']
         
         # Get type effectiveness
-        effectiveness = get_fallback_effectiveness(types)
+        effectiveness = get_type_effectiveness(types)
         
         # Get PvP moves with the new moveset
         pvp_moves = []
@@ -918,7 +1184,7 @@ def update_pokemon_moves(name):
                 move['effectiveness'] = {'multiplier': 1.0, 'label': 'Neutral'}
         
         # Get PvPoke rankings data
-        pvpoke_data = pvp_rankings_by_species.get(p.get('speciesId', '').lower(), {})
+        pvpoke_data = league.rankings.get(p.get('speciesId', '').lower(), {})
         
         # Format the response
         formatted_data = {
@@ -947,25 +1213,15 @@ def update_pokemon_moves(name):
 
 @app.route('/api/league/<cp_cap>', methods=['POST'])
 def change_league(cp_cap):
-    """API endpoint to change the CP cap/league and reload PvP data"""
+    """API endpoint to choose this session's default league (requests may still pass cp_cap)"""
     try:
         # Validate CP cap
-        try:
-            cp_cap_int = int(cp_cap)
-            if cp_cap_int not in [0, 500, 1500, 2500]:
-                return jsonify({'error': 'Invalid CP cap. Supported values: 0 (Master League), 500, 1500, 2500'}), 400
-        except ValueError:
-            return jsonify({'error': 'Invalid CP cap format'}), 400
-        
-        # Reload PvP rankings for the new CP cap
-        reload_pvp_rankings_for_cap(cp_cap_int)
-        
-        # Also reload PokeData with the new CP cap
-        global poke_data, battle_simulator
-        poke_data = PokeData(cp_cap=cp_cap_int)
+        cp_cap_int = parse_cp_cap(cp_cap)
+        if cp_cap_int is None:
+            return jsonify({'error': INVALID_CP_CAP_ERROR}), 400
         
-        # Update the battle simulator with the new PokeData
-        battle_simulator = BattleSimulator(poke_data)
+        # Every league is already resident, so switching only affects this user's session
+        session['cp_cap'] = cp_cap_int
         
         return jsonify({
             'success': True,
@@ -0,0 +1,278 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from battle_sim import MAX_BATTLE_TURNS, MAX_ENERGY, BattlePokemon, BattleProfile, BattleSimulator, ShieldAI
+
+# Energy cost of an empty charged move slot: never affordable
+NO_MOVE_ENERGY = 1 << 30
+
+# ShieldAI strategies as integer codes for the array version of ShieldAI.should_shield
+STRATEGY_CODES = {name: code for code, name in enumerate(ShieldAI.STRATEGIES)}
+
+class _SideArrays:
+    """Move data of one side (P1 or P2 attacking) for a set of matchups, one array row each"""
+    def __init__(self, n: int):
+        self.has_fast = np.zeros(n, dtype=bool)
+        self.fast_table = np.zeros((n, 81), dtype=np.int64)
+        self.fast_gain = np.zeros(n, dtype=np.int64)
+        self.fast_buff = np.zeros(n, dtype=bool)
+        self.fast_buff_atk = np.zeros(n, dtype=np.int64)
+        self.fast_buff_def = np.zeros(n, dtype=np.int64)
+        self.charged_energy = np.full((n, 2), NO_MOVE_ENERGY, dtype=np.int64)
+        self.charged_table = np.zeros((n, 2, 81), dtype=np.int64)
+        self.decision_table = np.full((n, (MAX_ENERGY + 1) * 4), -1, dtype=np.int64)
+        self.super_effective = np.zeros((n, 2), dtype=bool)
+        self.charged_buff = np.zeros((n, 2), dtype=bool)
+        self.charged_buff_self = np.zeros((n, 2), dtype=bool)
+        self.charged_buff_atk = np.zeros((n, 2), dtype=np.int64)
+        self.charged_buff_def = np.zeros((n, 2), dtype=np.int64)
+
+    def load(self, i: int, attacker: BattleProfile, defender: BattleProfile):
+        """Fill row i from the attacker's profile against the defender's"""
+        tables = attacker.damage_table(defender)
+        move = attacker.fast_move
+        if move:
+            self.has_fast[i] = True
+            self.fast_table[i] = tables[move["moveId"]]
+            self.fast_gain[i] = move["energyGain"]
+            if move.get("buffs") and move.get("buffTarget") == "self" and _certain(move):
+                self.fast_buff[i] = True
+                self.fast_buff_atk[i], self.fast_buff_def[i] = move["buffs"][0], move["buffs"][1]
+        if not attacker.charged_moves:
+            return
+        self.decision_table[i] = attacker.decision_table(defender)
+        effectiveness = attacker.get_effectiveness(defender.typing)
+        for k, move in enumerate(attacker.charged_moves[:2]):
+            self.charged_energy[i, k] = move["energy"]
+            self.charged_table[i, k] = tables[move["moveId"]]
+            self.super_effective[i, k] = effectiveness[move["moveId"]] > 1.0
+            if move.get("buffs") and _certain(move):
+                self.charged_buff[i, k] = True
+                self.charged_buff_self[i, k] = move.get("buffTarget") == "self"
+                self.charged_buff_atk[i, k], self.charged_buff_def[i, k] = move["buffs"][0], move["buffs"][1]
+
+    def take(self, index: np.ndarray) -> '_SideArrays':
+        """Per-battle copy of the arrays, where battle i gets row index[i] (damage tables stay per matchup)"""
+        taken = _SideArrays(0)
+        for name, values in vars(self).items():
+            setattr(taken, name, values if name.endswith('_table') else values[index])
+        return taken
+
+def _certain(move: Dict[str, Any]) -> bool:
+    """Whether a move's buff roll always succeeds (the engine never batches partial chances)"""
+    return float(move.get("buffApplyChance", "0")) >= 1
+
+class BatchSimulator:
+    """
+    Runs many independent battles in lockstep with NumPy.
+
+    HP, energy, shields and buff stages of every battle live in (2, N)
+    arrays (row 0 is P1), and each turn is a few masked array updates with
+    the turn order and ShieldAI rules of BattleSimulator.simulate. Damage and
+    charged move choices are read from the same per-matchup damage and
+    decision tables. The result of each battle matches simulate with detail
+    'none'.
+
+    Battles with a buff chance strictly between 0 and 1 depend on their
+    rolls, so they are handed to simulate one at a time instead.
+    """
+    def __init__(self, simulator: BattleSimulator):
+        self.sim = simulator
+
+    @staticmethod
+    def supports(settings: Optional[Dict[str, Any]]) -> bool:
+        """Whether simulate_many can stand in for simulate with these settings"""
+        settings = settings or {}
+        return (settings.get('mode', 'battle') == 'battle' and settings.get('runs', 1) <= 1
+                and settings.get('detail', 'full') == 'none' and not settings.get('trace'))
+
+    def simulate_many(self, battles: Sequence[Tuple], settings: Optional[Dict[str, Any]] = None,
+                      seeds: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Simulate (p1_data, p2_data, p1_moves, p2_moves, p1_shields, p2_shields) battles.
+
+        settings['p1_shield_ai'] / settings['p2_shield_ai'] apply to every
+        battle. Battle i is seeded with seeds[i] if given, else settings['seed'];
+        only battles that fall back to simulate actually roll with it.
+        settings['max_turns'] caps every battle as in simulate. The lockstep
+        loop is bounded by that cap alone; settings['time_budget'] and
+        settings['deadline'] only apply to battles that fall back to simulate.
+
+        Returns:
+            One result per battle, in order, as simulate returns it with detail 'none'
+
+        Raises:
+            ValueError: if any matchup could never end (see BattleSimulator.check_matchup)
+        """
+        settings = settings or {}
+        seed = settings.get('seed')
+        shield_codes = [STRATEGY_CODES[ShieldAI(settings.get(key, 'smart_30')).strategy]
+                        for key in ('p1_shield_ai', 'p2_shield_ai')]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(battles)
+        # Battles differing only in shields share a matchup, whose arrays are loaded once
+        profiles: Dict[Tuple, Tuple[BattleProfile, bool]] = {}
+        matchups: Dict[Tuple[int, int], int] = {}
+        matchup_profiles: List[Tuple[BattleProfile, BattleProfile]] = []
+        lockstep, matchup_of, shields = [], [], []
+        for i, (p1_data, p2_data, p1_moves, p2_moves, p1_shields, p2_shields) in enumerate(battles):
+            p1_profile, p1_random = self._profile(profiles, p1_data, p1_moves)
+            p2_profile, p2_random = self._profile(profiles, p2_data, p2_moves)
+            self.sim.check_matchup(p1_profile, p2_profile)
+            if p1_random or p2_random:
+                battle_seed = seeds[i] if seeds is not None else seed
+                results[i] = self.sim.simulate(p1_data, p2_data, p1_moves, p2_moves, p1_shields, p2_shields,
+                                               settings=dict(settings, seed=battle_seed, detail='none'))
+                continue
+            key = (id(p1_profile), id(p2_profile))
+            if key not in matchups:
+                matchups[key] = len(matchup_profiles)
+                matchup_profiles.append((p1_profile, p2_profile))
+            lockstep.append(i)
+            matchup_of.append(matchups[key])
+            shields.append((p1_shields, p2_shields))
+        if lockstep:
+            lockstep_results = self._run_lockstep(matchup_profiles, np.array(matchup_of, dtype=np.int64),
+                                                  np.array(shields, dtype=np.int64).T.copy(), shield_codes,
+                                                  settings.get('max_turns', MAX_BATTLE_TURNS))
+            for i, result in zip(lockstep, lockstep_results):
+                result["seed"] = seeds[i] if seeds is not None else seed
+                results[i] = result
+        return results
+
+    def _profile(self, profiles: Dict[Tuple, Tuple[BattleProfile, bool]], data: Dict[str, Any],
+                 moves: Dict[str, str]) -> Tuple[BattleProfile, bool]:
+        """(profile, has_random_buffs) of a species + moveset, looked up once per simulate_many call"""
+        key = (id(data), moves.get('fast'), moves.get('charged1'), moves.get('charged2'))
+        entry = profiles.get(key)
+        if entry is None:
+            profile = self.sim.profiles.get(data, moves, self.sim.poke_data)
+            entry = profiles[key] = (profile, profile.has_random_buffs())
+        return entry
+
+    def _run_lockstep(self, matchups: List[Tuple[BattleProfile, BattleProfile]], matchup_of: np.ndarray,
+                      shields: np.ndarray, shield_codes: List[int], max_turns: int) -> List[Dict[str, Any]]:
+        """Run battle i of matchups[matchup_of[i]] with shields[:, i] to the end (or max_turns), all at once"""
+        n = len(matchup_of)
+        sides = (_SideArrays(len(matchups)), _SideArrays(len(matchups)))
+        matchup_hp = np.zeros((2, len(matchups)), dtype=np.int64)
+        for m, (p1, p2) in enumerate(matchups):
+            sides[0].load(m, p1, p2)
+            sides[1].load(m, p2, p1)
+            matchup_hp[:, m] = p1.max_hp, p2.max_hp
+        sides = (sides[0].take(matchup_of), sides[1].take(matchup_of))
+        max_hp = matchup_hp[:, matchup_of]
+        hp = max_hp.copy()
+        energy = np.zeros((2, n), dtype=np.int64)
+        # Buff stages offset by 4, so they index damage tables directly
+        atk = np.full((2, n), 4, dtype=np.int64)
+        dfn = np.full((2, n), 4, dtype=np.int64)
+        strategy = np.array(shield_codes, dtype=np.int64)[:, None].repeat(n, axis=1)
+        low_hp_threshold = max_hp * 0.3
+        rows = np.arange(n)
+        turns = np.zeros(n, dtype=np.int64)
+
+        def fast(s: int, active: np.ndarray):
+            o = 1 - s
+            side = sides[s]
+            hit = active & side.has_fast
+            damage = side.fast_table[matchup_of, atk[s] * 9 + dfn[o]]
+            hp[o] = np.where(hit, np.maximum(0, hp[o] - damage), hp[o])
+            energy[s] = np.where(hit, np.minimum(BattlePokemon.max_energy, energy[s] + side.fast_gain), energy[s])
+            buffed = hit & side.fast_buff
+            atk[s] = np.where(buffed, np.clip(atk[s] + side.fast_buff_atk, 0, 8), atk[s])
+            dfn[s] = np.where(buffed, np.clip(dfn[s] + side.fast_buff_def, 0, 8), dfn[s])
+
+        def charged(s: int, active: np.ndarray):
+            o = 1 - s
+            side = sides[s]
+            # The same lookup as BattleSimulator._choose_charged_move
+            low_hp = hp < low_hp_threshold
+            choice = side.decision_table[matchup_of, energy[s] * 4 + low_hp[o] * 2 + low_hp[s]]
+            throw = active & (choice >= 0)
+            if not throw.any():
+                return
+            choice = np.maximum(choice, 0)
+            damage = side.charged_table[matchup_of, choice, atk[s] * 9 + dfn[o]]
+            shielded = throw & (shields[o] > 0) & self._should_shield(
+                strategy[o], damage, hp[o], max_hp[o], side.super_effective[rows, choice])
+            hp[o] = np.where(throw & ~shielded, np.maximum(0, hp[o] - damage), hp[o])
+            shields[o] -= shielded
+            energy[s] = np.where(throw, np.maximum(0, energy[s] - side.charged_energy[rows, choice]), energy[s])
+            buffed = throw & side.charged_buff[rows, choice]
+            on_self = side.charged_buff_self[rows, choice]
+            atk_change = side.charged_buff_atk[rows, choice]
+            def_change = side.charged_buff_def[rows, choice]
+            for target, mask in ((s, buffed & on_self), (o, buffed & ~on_self)):
+                atk[target] = np.where(mask, np.clip(atk[target] + atk_change, 0, 8), atk[target])
+                dfn[target] = np.where(mask, np.clip(dfn[target] + def_change, 0, 8), dfn[target])
+
+        active = (hp > 0).all(axis=0)
+        turn = 0
+        while active.any() and turn < max_turns:
+            turn += 1
+            turns += active
+            fast(0, active)
+            fast(1, active)
+            active &= (hp > 0).all(axis=0)
+            if active.any():
+                charged(0, active)
+                charged(1, active)
+            active &= (hp > 0).all(axis=0)
+
+        return [self._result(*matchups[m], *state)
+                for m, state in zip(matchup_of.tolist(), zip(*(a.tolist() for a in (
+                    hp[0], hp[1], max_hp[0], max_hp[1], energy[0], energy[1], shields[0], shields[1],
+                    turns, atk[0], dfn[0], atk[1], dfn[1], active))))]
+
+    @staticmethod
+    def _should_shield(strategy: np.ndarray, damage: np.ndarray, hp: np.ndarray, max_hp: np.ndarray,
+                       super_effective: np.ndarray) -> np.ndarray:
+        """ShieldAI.should_shield over arrays (shields left is checked by the caller)"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            damage_percent = np.where(hp > 0, (damage / hp) * 100, 0.0)
+            hp_percent = np.where(max_hp > 0, (hp / max_hp) * 100, 0.0)
+        codes = STRATEGY_CODES
+        return np.select(
+            [strategy == codes['never'], strategy == codes['always'],
+             strategy == codes['smart_20'], strategy == codes['smart_50'],
+             strategy == codes['conservative'], strategy == codes['aggressive'], strategy == codes['balanced']],
+            [False, True,
+             damage_percent > 20, damage_percent > 50,
+             (damage_percent > 40) | ((hp_percent < 30) & (damage_percent > 20)),
+             (damage_percent > 25) | (super_effective & (damage_percent > 15)),
+             (damage_percent > 35) | (super_effective & (damage_percent > 20))],
+            default=damage_percent > 30
+        )
+
+    @staticmethod
+    def _result(p1: BattleProfile, p2: BattleProfile, p1_hp, p2_hp, p1_max_hp, p2_max_hp, p1_energy, p2_energy,
+                p1_shields, p2_shields, turns, p1_atk, p1_def, p2_atk, p2_def, aborted) -> Dict[str, Any]:
+        """A simulate-shaped result (see BattleSimulator._determine_winner)"""
+        if aborted:
+            winner, battle_rating = None, 0.5
+        elif p1_hp <= 0 and p2_hp <= 0:
+            winner, battle_rating = "tie", 0.5
+        elif p1_hp <= 0:
+            winner, battle_rating = p2.data["speciesId"], min(1.0, p2_hp / p2_max_hp)
+        else:
+            winner, battle_rating = p1.data["speciesId"], min(1.0, p1_hp / p1_max_hp)
+        result = {
+            "winner": winner,
+            "p1_final_hp": p1_hp,
+            "p2_final_hp": p2_hp,
+            "p1_max_hp": p1_max_hp,
+            "p2_max_hp": p2_max_hp,
+            "p1_final_energy": p1_energy,
+            "p2_final_energy": p2_energy,
+            "p1_final_shields": p1_shields,
+            "p2_final_shields": p2_shields,
+            "turns": turns,
+            "battle_rating": battle_rating,
+            "p1_final_buffs": {"atk": p1_atk - 4, "def": p1_def - 4},
+            "p2_final_buffs": {"atk": p2_atk - 4, "def": p2_def - 4},
+            "seed": None
+        }
+        if aborted:
+            result["aborted"] = "turn_limit"
+        return result
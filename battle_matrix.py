@@ -0,0 +1,225 @@
+import argparse
+import multiprocessing
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from batch_sim import BatchSimulator
+from battle_sim import BattleSimulator, ShieldAI, matchup_rating
+from poke_data import PokeData
+
+# Shield scenarios used for rankings: (p1 shields, p2 shields)
+SHIELD_SCENARIOS = [(0, 0), (1, 1), (2, 2)]
+
+# Per-process state, set up once by _init_worker
+_worker = {}
+
+class MatchupMatrix:
+    """Dense all-vs-all battle rating matrix for one league"""
+    def __init__(self, cp_cap: int, species_ids: List[str], scenarios: List[Tuple[int, int]],
+                 ratings: List[List[List[int]]], data_version: Optional[str] = None):
+        self.cp_cap = cp_cap
+        self.species_ids = species_ids
+        self.scenarios = scenarios
+        # ratings[scenario][row][col] = rating of species_ids[row] vs species_ids[col]
+        self.ratings = ratings
+        self.data_version = data_version
+        self.index = {sid: i for i, sid in enumerate(species_ids)}
+
+    def rating(self, p1_id: str, p2_id: str, shields: Tuple[int, int] = (1, 1)) -> Optional[int]:
+        """Look up the rating of p1 vs p2 for a shield scenario"""
+        row = self.index.get(p1_id)
+        col = self.index.get(p2_id)
+        if row is None or col is None or shields not in self.scenarios:
+            return None
+        return self.ratings[self.scenarios.index(shields)][row][col]
+
+    def rankings(self) -> List[Tuple[str, float]]:
+        """Average rating per species across all opponents and scenarios, best first"""
+        totals = []
+        cells = len(self.scenarios) * len(self.species_ids)
+        for row, sid in enumerate(self.species_ids):
+            total = sum(sum(scenario[row]) for scenario in self.ratings)
+            totals.append((sid, total / cells if cells else 0.0))
+        return sorted(totals, key=lambda item: item[1], reverse=True)
+
+def _meta_movesets(poke_data: PokeData, species_ids: Optional[List[str]]) -> Dict[str, Dict[str, str]]:
+    """Resolve the ranked moveset for each meta species, skipping ones that can't battle"""
+    if species_ids is None:
+        species_ids = [p['speciesId'] for p in poke_data.pokemon]
+    movesets = {}
+    for sid in species_ids:
+        moveset = poke_data.get_default_moveset(sid)
+        if moveset and 'charged1' in moveset:
+            movesets[sid] = moveset
+    return movesets
+
+def _init_worker(cp_cap: int, species_ids: List[str], movesets: Dict[str, Dict[str, str]], engine: str):
+    """Load PokeData and build the simulator once per worker process"""
+    poke_data = PokeData(cp_cap=cp_cap)
+    _worker['poke_data'] = poke_data
+    # Room for every meta profile so rows never evict each other's profiles
+    _worker['simulator'] = BattleSimulator(poke_data, profile_cache_size=2 * len(species_ids) + 1)
+    _worker['species'] = [poke_data.get_by_species_id(sid) for sid in species_ids]
+    _worker['movesets'] = [movesets[sid] for sid in species_ids]
+    _worker['engine'] = engine
+    _worker['batch'] = BatchSimulator(_worker['simulator'])
+
+def _compute_row(task: Tuple[int, List[Tuple[int, int]]]) -> Tuple[int, List[List[int]]]:
+    """Simulate one species against every meta species for every shield scenario"""
+    row, scenarios = task
+    sim = _worker['simulator']
+    species = _worker['species']
+    movesets = _worker['movesets']
+    engine = _worker['engine']
+    p1, p1_moves = species[row], movesets[row]
+    # Seed each pairing by name so buff rolls are reproducible across runs and workers
+    pairings = [(p2, p2_moves, p1_shields, p2_shields, f"{p1['speciesId']}:{p2['speciesId']}:{p1_shields}-{p2_shields}")
+                for p1_shields, p2_shields in scenarios for p2, p2_moves in zip(species, movesets)]
+    if engine == 'batch':
+        battles = [(p1, p2, p1_moves, p2_moves, p1_shields, p2_shields)
+                   for p2, p2_moves, p1_shields, p2_shields, _ in pairings]
+        results = _worker['batch'].simulate_many(battles, seeds=[seed for *_, seed in pairings])
+    else:
+        results = [sim.simulate(p1, p2, p1_moves, p2_moves, p1_shields, p2_shields,
+                                settings={'engine': engine, 'seed': seed, 'detail': 'none'})
+                   for p2, p2_moves, p1_shields, p2_shields, seed in pairings]
+    row_ratings = [matchup_rating(result) for result in results]
+    ratings = [row_ratings[s * len(species):(s + 1) * len(species)] for s in range(len(scenarios))]
+    return row, ratings
+
+def compute_matchup_matrix(cp_cap: int = 1500, species_ids: Optional[List[str]] = None,
+                           scenarios: List[Tuple[int, int]] = SHIELD_SCENARIOS,
+                           processes: Optional[int] = None, engine: str = 'batch') -> MatchupMatrix:
+    """
+    Simulate every meta species against every other across shield scenarios.
+
+    Args:
+        cp_cap: League CP cap (0 for Master League)
+        species_ids: Meta to rank; defaults to every species in the gamemaster
+        scenarios: Shield scenarios as (p1_shields, p2_shields) pairs
+        processes: Worker processes; defaults to the CPU count, 1 runs in-process
+        engine: 'batch' (default) runs each row through BatchSimulator.simulate_many;
+            'event' or 'turn' simulate every battle with that BattleSimulator engine
+
+    Returns:
+        MatchupMatrix with ratings[scenario][row][col]
+    """
+    poke_data = PokeData(cp_cap=cp_cap)
+    movesets = _meta_movesets(poke_data, species_ids)
+    meta = list(movesets.keys())
+    scenarios = [tuple(s) for s in scenarios]
+    init_args = (cp_cap, meta, movesets, engine)
+    tasks = [(row, scenarios) for row in range(len(meta))]
+
+    rows: List[Optional[List[List[int]]]] = [None] * len(meta)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        _init_worker(*init_args)
+        for task in tasks:
+            row, ratings = _compute_row(task)
+            rows[row] = ratings
+    else:
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=init_args) as pool:
+            for row, ratings in pool.imap_unordered(_compute_row, tasks):
+                rows[row] = ratings
+
+    # Transpose rows into one dense matrix per scenario
+    ratings = [[rows[row][s] for row in range(len(meta))] for s in range(len(scenarios))]
+    return MatchupMatrix(cp_cap, meta, scenarios, ratings, data_version=poke_data.data_version)
+
+def _benchmark_row(task: Tuple[int, List[Tuple[int, int]], int]) -> Tuple[int, Dict[str, List[float]], int]:
+    """Rate each shield strategy against an optimal opponent for one species' matchups"""
+    row, scenarios, node_budget = task
+    sim = _worker['simulator']
+    species = _worker['species']
+    movesets = _worker['movesets']
+    p1, p1_moves = species[row], movesets[row]
+    regrets = {strategy: [] for strategy in ShieldAI.STRATEGIES}
+    incomplete = 0
+    for p1_shields, p2_shields in scenarios:
+        for p2, p2_moves in zip(species, movesets):
+            settings = {'mode': 'optimal', 'node_budget': node_budget, 'time_budget': None}
+            optimal = sim.simulate(p1, p2, p1_moves, p2_moves, p1_shields, p2_shields, settings=settings)
+            incomplete += not optimal['complete']
+            for strategy in ShieldAI.STRATEGIES:
+                result = sim.simulate(p1, p2, p1_moves, p2_moves, p1_shields, p2_shields,
+                                      settings=dict(settings, p1_play='heuristic', p1_shield_ai=strategy))
+                incomplete += not result['complete']
+                regrets[strategy].append(optimal['rating'] - result['rating'])
+    return row, regrets, incomplete
+
+def benchmark_shield_strategies(cp_cap: int = 1500, species_ids: Optional[List[str]] = None,
+                                scenarios: List[Tuple[int, int]] = ((1, 1), (2, 2)),
+                                processes: Optional[int] = None,
+                                node_budget: int = 20000) -> Dict[str, Any]:
+    """
+    Benchmark every ShieldAI strategy against optimal play.
+    
+    For each matchup, P1 is played once optimally and once per strategy using
+    the DPE move heuristic with that shield AI, both times against an optimal
+    P2. Regret is the rating P1 gives up compared to optimal play.
+    
+    Returns:
+        Per-strategy mean and max regret plus the number of matchups, and how
+        many searches ran out of node budget
+    """
+    poke_data = PokeData(cp_cap=cp_cap)
+    movesets = _meta_movesets(poke_data, species_ids)
+    meta = list(movesets.keys())
+    scenarios = [tuple(s) for s in scenarios]
+    init_args = (cp_cap, meta, movesets, 'event')
+    tasks = [(row, scenarios, node_budget) for row in range(len(meta))]
+    
+    regrets = {strategy: [] for strategy in ShieldAI.STRATEGIES}
+    incomplete = 0
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        _init_worker(*init_args)
+        rows = [_benchmark_row(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=init_args) as pool:
+            rows = list(pool.imap_unordered(_benchmark_row, tasks))
+    for _, row_regrets, row_incomplete in rows:
+        incomplete += row_incomplete
+        for strategy, values in row_regrets.items():
+            regrets[strategy].extend(values)
+    
+    strategies = {}
+    for strategy, values in regrets.items():
+        strategies[strategy] = {
+            'mean_regret': sum(values) / len(values) if values else 0.0,
+            'max_regret': max(values) if values else 0.0
+        }
+    return {
+        'matchups': len(meta) ** 2 * len(scenarios),
+        'incomplete_searches': incomplete,
+        'strategies': strategies
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute an all-vs-all matchup matrix')
+    parser.add_argument('--cp-cap', type=int, default=1500)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--species', nargs='*', help='Restrict the meta to these species IDs')
+    parser.add_argument('--top', type=int, default=20, help='Number of ranked species to print')
+    parser.add_argument('--benchmark-shields', action='store_true',
+                        help='Compare every shield AI strategy against optimal play instead of ranking')
+    args = parser.parse_args()
+
+    if args.benchmark_shields:
+        start = time.time()
+        benchmark = benchmark_shield_strategies(args.cp_cap, args.species or None, processes=args.processes)
+        print(f"Benchmarked {benchmark['matchups']} matchups in {time.time() - start:.1f}s "
+              f"({benchmark['incomplete_searches']} searches hit the node budget)")
+        ranked = sorted(benchmark['strategies'].items(), key=lambda item: item[1]['mean_regret'])
+        for strategy, stats in ranked:
+            print(f"{strategy:14s} mean regret {stats['mean_regret']:6.1f}  max regret {stats['max_regret']:6.1f}")
+    else:
+        start = time.time()
+        matrix = compute_matchup_matrix(args.cp_cap, args.species or None, processes=args.processes)
+        elapsed = time.time() - start
+        battles = len(matrix.species_ids) ** 2 * len(matrix.scenarios)
+        print(f"Simulated {battles} battles for {len(matrix.species_ids)} species in {elapsed:.1f}s")
+        for rank, (sid, score) in enumerate(matrix.rankings()[:args.top], start=1):
+            print(f"{rank:3d}. {sid:30s} {score:6.1f}")
@@ -1,8 +1,22 @@
+import itertools
+import logging
 import math
+import multiprocessing
 import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
 from poke_data import PokeData
 
+# Debug output goes through logging, and per-turn detail only through an opt-in
+# BattleContext.trace, so a battle with both off never formats a message
+logger = logging.getLogger(__name__)
+
 class ShieldAI:
     """Intelligent shield decision making for PvP battles"""
     
@@ -122,162 +136,490 @@ class TypeChart:
         "fairy": {"weaknesses": ["poison", "steel"], "resistances": ["fighting", "bug", "dark"], "double_resistances": ["dragon"]}
     }
 
+    # Type ids used by the effectiveness matrices, in Pokédex order
+    TYPES = ('normal', 'fire', 'water', 'electric', 'grass', 'ice', 'fighting', 'poison', 'ground',
+             'flying', 'psychic', 'bug', 'rock', 'ghost', 'dragon', 'dark', 'steel', 'fairy')
+    TYPE_IDS = {type_name: i for i, type_name in enumerate(TYPES)}
+    # Every defender typing: the 18 single types, then the 153 dual types as sorted id pairs
+    TYPINGS = tuple((i,) for i in range(len(TYPES))) + tuple(itertools.combinations(range(len(TYPES)), 2))
+    TYPING_IDS = {typing: i for i, typing in enumerate(TYPINGS)}
+    # Extra all-neutral column for Pokémon with no known type
+    UNKNOWN_TYPING = len(TYPINGS)
+    
+    # Built once at import by _build_matrices
+    MATRIX: np.ndarray = None         # float32 [attacking type, defending type]
+    TYPING_MATRIX: np.ndarray = None  # float64 [attacking type, typing], products of MATRIX entries
+    _typing_rows: List[List[float]] = None
+    _typing_cache: Dict[Tuple[str, ...], int] = {}
+    
+    @classmethod
+    def _build_matrices(cls):
+        """Compile TYPE_TRAITS into the single and dual type effectiveness matrices"""
+        n = len(cls.TYPES)
+        matrix = np.ones((n, n), dtype=np.float32)
+        for defending, traits in cls.TYPE_TRAITS.items():
+            d = cls.TYPE_IDS[defending]
+            for attacking in cls.TYPES:
+                if attacking in traits["weaknesses"]:
+                    matrix[cls.TYPE_IDS[attacking], d] = DamageMultiplier.SUPER_EFFECTIVE
+                elif attacking in traits["resistances"]:
+                    matrix[cls.TYPE_IDS[attacking], d] = DamageMultiplier.RESISTED
+                elif attacking in traits["double_resistances"]:
+                    matrix[cls.TYPE_IDS[attacking], d] = DamageMultiplier.DOUBLE_RESISTED
+        
+        # Dual typings multiply in float64, exactly like multiplying the Python floats
+        singles = matrix.astype(np.float64)
+        typing_matrix = np.ones((n, len(cls.TYPINGS) + 1), dtype=np.float64)
+        for i, typing in enumerate(cls.TYPINGS):
+            for d in typing:
+                typing_matrix[:, i] *= singles[:, d]
+        
+        cls.MATRIX = matrix
+        cls.TYPING_MATRIX = typing_matrix
+        cls._typing_rows = typing_matrix.tolist()
+    
+    @classmethod
+    def typing_id(cls, target_types: List[str]) -> int:
+        """Intern a defender typing (e.g. ['water', 'fairy']) as a TYPING_MATRIX column"""
+        key = tuple(target_types)
+        typing = cls._typing_cache.get(key)
+        if typing is None:
+            ids = sorted({cls.TYPE_IDS[t.lower()] for t in target_types if t and t.lower() in cls.TYPE_IDS})
+            typing = cls.TYPING_IDS.get(tuple(ids), cls.UNKNOWN_TYPING)
+            cls._typing_cache[key] = typing
+        return typing
+    
+    @classmethod
+    def typing_ids(cls, typings: List[List[str]]) -> np.ndarray:
+        """Intern a column of defender typings"""
+        return np.fromiter((cls.typing_id(types) for types in typings), dtype=np.intp, count=len(typings))
+    
     @classmethod
     def get_effectiveness(cls, move_type: str, target_types: List[str]) -> float:
         """Calculate type effectiveness multiplier"""
-        effectiveness = 1.0
-        move_type = move_type.lower()
-        
-        for target_type in target_types:
-            target_type = target_type.lower()
-            if target_type not in cls.TYPE_TRAITS:
-                continue
-                
-            traits = cls.TYPE_TRAITS[target_type]
-            
-            if move_type in traits["weaknesses"]:
-                effectiveness *= DamageMultiplier.SUPER_EFFECTIVE
-            elif move_type in traits["resistances"]:
-                effectiveness *= DamageMultiplier.RESISTED
-            elif move_type in traits["double_resistances"]:
-                effectiveness *= DamageMultiplier.DOUBLE_RESISTED
-                
-        return effectiveness
+        attacking = cls.TYPE_IDS.get(move_type.lower())
+        if attacking is None:
+            return 1.0
+        return cls._typing_rows[attacking][cls.typing_id(target_types)]
+    
+    @classmethod
+    def defense_profile(cls, target_types: List[str]) -> np.ndarray:
+        """Multiplier of every attacking type (in TYPES order) against one defender typing"""
+        return cls.TYPING_MATRIX[:, cls.typing_id(target_types)]
+    
+    @classmethod
+    def effectiveness_against(cls, move_type: str, typings: np.ndarray) -> np.ndarray:
+        """Multiplier of one move type against a column of interned defender typings"""
+        attacking = cls.TYPE_IDS.get(move_type.lower()) if move_type else None
+        if attacking is None:
+            return np.ones(len(typings), dtype=np.float64)
+        return cls.TYPING_MATRIX[attacking, typings]
+    
+    @classmethod
+    def effectiveness_grid(cls, move_types: List[str], typings: np.ndarray) -> np.ndarray:
+        """Multipliers of several move types against a column of defenders, [move, defender]"""
+        attacking = [cls.TYPE_IDS.get(t.lower()) if t else None for t in move_types]
+        known = np.array([a if a is not None else 0 for a in attacking], dtype=np.intp)
+        grid = cls.TYPING_MATRIX[known[:, None], np.asarray(typings)[None, :]]
+        grid[[a is None for a in attacking]] = 1.0
+        return grid
 
-class BattlePokemon:
-    """Represents a Pokémon in battle with current state"""
-    def __init__(self, pokemon_data: Dict[str, Any], moves: Dict[str, str], shields: int = 2, poke_data: PokeData = None):
-        self.data = pokemon_data
-        self.moves = moves
-        self.shields = shields
-        self.poke_data = poke_data or PokeData()
-        print(f"[DEBUG] BattlePokemon created: {self.data.get('speciesId', 'unknown')} id={id(self)} shields={self.shields}")
+TypeChart._build_matrices()
+
+# Stat multiplier for each buff stage from -4 to +4, indexed by stage + 4
+BUFF_MULTIPLIERS = tuple((2 + stage) / 2 if stage >= 0 else 2 / (2 - stage) for stage in range(-4, 5))
+BUFF_STAGES = tuple(range(-4, 5))
+
+# Damage tables kept per attacking profile before the oldest are dropped
+DAMAGE_TABLE_CACHE_SIZE = 1024
+
+# Energy cap; charged move decisions are tabulated for every energy from 0 to MAX_ENERGY
+MAX_ENERGY = 100
+
+def _charged_move_choice(charged_moves: Tuple[Dict[str, Any], ...], move_dpe: Dict[str, float],
+                         best_move: Dict[str, Any], energy: int, opponent_low_hp: bool,
+                         self_low_hp: bool) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    The DPE heuristic: the charged move to throw (None to keep charging) and the reasons for it.
+    
+    Only energy and whether either side is under 30% HP matter, which is
+    what lets BattleProfile.decision_table tabulate it per matchup.
+    """
+    available_moves = [move for move in charged_moves if energy >= move["energy"]]
+    if not available_moves:
+        return None, []
+    
+    # If the best move is available, use it
+    if energy >= best_move["energy"]:
+        return best_move, ["best_move"]
+    
+    # Check if we should wait for the best move
+    reasons = []
+    # Don't wait if we're in danger (low HP)
+    if opponent_low_hp:
+        reasons.append("opponent_low_hp")
+    if self_low_hp:
+        reasons.append("self_low_hp")
+    if best_move["energy"] > energy * 1.5:
+        reasons.append("best_move_too_expensive")
+    if best_move["energy"] - energy <= 3:
+        reasons.append("close_to_best_move")
+    if not reasons:
+        return None, ["waiting_for_best_move"]  # Skip this turn, wait for better move
+    # Pick the available move with the highest DPE
+    return max(available_moves, key=lambda m: move_dpe[m["name"]]), reasons
+
+@dataclass(frozen=True, eq=False)
+class BattleProfile:
+    """Immutable, cacheable battle data for one species + moveset in one league.
 
+    Holds everything a battle needs that does not change turn to turn: final
+    stats, shadow multipliers, resolved move records and STAB per move. Type
+    effectiveness and charged move decision tables against a given defender
+    typing and damage tables against a given defender are memoized on first use.
+    """
+    species_id: str
+    data: Dict[str, Any]
+    moves: Tuple[Tuple[str, str], ...]
+    atk: float
+    defense: float
+    max_hp: int
+    ivs: Dict[str, Any]
+    stat_product: Any
+    level: Any
+    iv_atk: Any
+    iv_def: Any
+    iv_sta: Any
+    shadow_atk_mult: float
+    shadow_def_mult: float
+    fast_move: Optional[Dict[str, Any]]
+    charged_moves: Tuple[Dict[str, Any], ...]
+    stab: Dict[str, float]
+    typing: int
+    _effectiveness: Dict[int, Dict[str, float]] = field(default_factory=dict, repr=False)
+    _damage: Dict[Tuple[int, float], Dict[str, Tuple[int, ...]]] = field(default_factory=dict, repr=False)
+    _decisions: Dict[int, Tuple[int, ...]] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def build(cls, pokemon_data: Dict[str, Any], moves: Dict[str, str], poke_data: PokeData) -> 'BattleProfile':
+        """Resolve stats and moves for a Pokémon from poke_data"""
         # Use PvPoke rank 1 stats if available
-        self.species_id = self.data.get('speciesId') or self.data.get('name', '').lower().replace(' ', '_')
-        self.rank1_stats = self.poke_data.get_rank1_stats(self.species_id)
-        print(f"[DEBUG] Rank1 stats for {self.species_id}: {self.rank1_stats}")
-        if self.rank1_stats:
-            if 'atk' not in self.rank1_stats:
-                print(f"[ERROR] Missing 'atk' key in rank1_stats for {self.species_id}. Available keys: {list(self.rank1_stats.keys())}")
-                # Fallback to old calculation
-                base_stats = self.data.get("baseStats", {})
-                hp_base = base_stats.get("hp", 100)
-                atk_base = base_stats.get("atk", 100)
-                defense_base = base_stats.get("def", 100)
-                hp_iv = atk_iv = defense_iv = 15
-                level = 40
-                self.atk = (atk_base + atk_iv) * (0.5 + level * 0.01)
-                self.defense = (defense_base + defense_iv) * (0.5 + level * 0.01)
-                self.hp = int((hp_base + hp_iv) * (0.5 + level * 0.01))
-                self.max_hp = self.hp
-                self.ivs = {'atk': atk_iv, 'def': defense_iv, 'sta': hp_iv}
-                self.stat_product = self.atk * self.defense * self.hp
-                self.level = level
-                self.iv_atk = atk_iv
-                self.iv_def = defense_iv
-                self.iv_sta = hp_iv
-                print(f"[DEBUG] Using fallback stats for {self.species_id}: ATK={self.atk}, DEF={self.defense}, HP={self.hp}, Level={self.level}, IVs=({self.iv_atk}/{self.iv_def}/{self.iv_sta}), Stat Product={self.stat_product}")
-            else:
-                self.atk = self.rank1_stats['atk']
-                self.defense = self.rank1_stats['def']
-                self.hp = self.rank1_stats['hp']
-                self.max_hp = self.hp
-                self.ivs = self.rank1_stats.get('ivs', {})
-                self.stat_product = self.rank1_stats.get('product')
-                self.level = self.rank1_stats.get('level')
-                self.iv_atk = self.rank1_stats.get('iv_atk')
-                self.iv_def = self.rank1_stats.get('iv_def')
-                self.iv_sta = self.rank1_stats.get('iv_sta')
-                print(f"[DEBUG] Using PvPoke rank 1 stats for {self.species_id}: ATK={self.atk}, DEF={self.defense}, HP={self.hp}, Level={self.level}, IVs=({self.iv_atk}/{self.iv_def}/{self.iv_sta}), Stat Product={self.stat_product}")
+        species_id = pokemon_data.get('speciesId') or pokemon_data.get('name', '').lower().replace(' ', '_')
+        rank1_stats = poke_data.get_rank1_stats(species_id)
+        if rank1_stats and 'atk' in rank1_stats:
+            stats = {
+                'atk': rank1_stats['atk'],
+                'defense': rank1_stats['def'],
+                'max_hp': rank1_stats['hp'],
+                'ivs': rank1_stats.get('ivs', {}),
+                'stat_product': rank1_stats.get('product'),
+                'level': rank1_stats.get('level'),
+                'iv_atk': rank1_stats.get('iv_atk'),
+                'iv_def': rank1_stats.get('iv_def'),
+                'iv_sta': rank1_stats.get('iv_sta'),
+            }
+            source = 'PvPoke rank 1'
         else:
+            if rank1_stats:
+                logger.error("Missing 'atk' key in rank1_stats for %s. Available keys: %s", species_id, list(rank1_stats))
             # Fallback to old calculation
-            base_stats = self.data.get("baseStats", {})
-            hp_base = base_stats.get("hp", 100)
-            atk_base = base_stats.get("atk", 100)
-            defense_base = base_stats.get("def", 100)
-            hp_iv = atk_iv = defense_iv = 15
-            level = 40
-            self.atk = (atk_base + atk_iv) * (0.5 + level * 0.01)
-            self.defense = (defense_base + defense_iv) * (0.5 + level * 0.01)
-            self.hp = int((hp_base + hp_iv) * (0.5 + level * 0.01))
-            self.max_hp = self.hp
-            self.ivs = {'atk': atk_iv, 'def': defense_iv, 'sta': hp_iv}
-            self.stat_product = self.atk * self.defense * self.hp
-            self.level = level
-            self.iv_atk = atk_iv
-            self.iv_def = defense_iv
-            self.iv_sta = hp_iv
-            print(f"[DEBUG] Using fallback stats for {self.species_id}: ATK={self.atk}, DEF={self.defense}, HP={self.hp}, Level={self.level}, IVs=({self.iv_atk}/{self.iv_def}/{self.iv_sta}), Stat Product={self.stat_product}")
+            stats = cls._fallback_stats(pokemon_data)
+            source = 'fallback'
+        logger.debug("Using %s stats for %s: %s", source, species_id, stats)
 
-        # Battle state
-        self.energy = 0
-        self.max_energy = 100
-        # Stats with buffs/debuffs
-        self.atk_buffs = 0  # -4 to +4
-        self.def_buffs = 0  # -4 to +4
         # Shadow multipliers
-        self.shadow_atk_mult = 1.0
-        self.shadow_def_mult = 1.0
+        shadow_atk_mult = 1.0
+        shadow_def_mult = 1.0
         if "shadow" in pokemon_data.get("tags", []):
-            self.shadow_atk_mult = DamageMultiplier.SHADOW_ATK
-            self.shadow_def_mult = DamageMultiplier.SHADOW_DEF
-        # Move objects
-        self.fast_move = None
-        self.charged_moves = []
-        self._initialize_moves()
-    
-    def _initialize_moves(self):
-        """Initialize move objects from move IDs"""
-        print(f"[DEBUG] Initializing moves for {self.data['speciesId']}: {self.moves}")
-        
-        if "fast" in self.moves:
-            self.fast_move = self.poke_data.get_move_details(self.moves["fast"])
-            print(f"[DEBUG] Fast move: {self.moves['fast']} -> {self.fast_move['name'] if self.fast_move else 'NOT FOUND'}")
-            if self.fast_move:
-                print(f"[DEBUG] Fast move details: power={self.fast_move.get('power', 'N/A')}, energy={self.fast_move.get('energy', 'N/A')}, energyGain={self.fast_move.get('energyGain', 'N/A')}")
-        
+            shadow_atk_mult = DamageMultiplier.SHADOW_ATK
+            shadow_def_mult = DamageMultiplier.SHADOW_DEF
+
+        fast_move, charged_moves = cls._resolve_moves(pokemon_data, moves, poke_data)
+        attacker_types = pokemon_data.get("types", [])
+        stab = {}
+        for move in ([fast_move] if fast_move else []) + charged_moves:
+            stab[move["moveId"]] = DamageMultiplier.STAB if move["type"] in attacker_types else 1.0
+
+        return cls(
+            species_id=species_id,
+            data=pokemon_data,
+            moves=tuple(sorted(moves.items())),
+            shadow_atk_mult=shadow_atk_mult,
+            shadow_def_mult=shadow_def_mult,
+            fast_move=fast_move,
+            charged_moves=tuple(charged_moves),
+            stab=stab,
+            typing=TypeChart.typing_id(attacker_types),
+            **stats
+        )
+
+    @staticmethod
+    def _fallback_stats(pokemon_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Approximate level 40 hundo stats from base stats"""
+        base_stats = pokemon_data.get("baseStats", {})
+        hp_base = base_stats.get("hp", 100)
+        atk_base = base_stats.get("atk", 100)
+        defense_base = base_stats.get("def", 100)
+        hp_iv = atk_iv = defense_iv = 15
+        level = 40
+        atk = (atk_base + atk_iv) * (0.5 + level * 0.01)
+        defense = (defense_base + defense_iv) * (0.5 + level * 0.01)
+        hp = int((hp_base + hp_iv) * (0.5 + level * 0.01))
+        return {
+            'atk': atk,
+            'defense': defense,
+            'max_hp': hp,
+            'ivs': {'atk': atk_iv, 'def': defense_iv, 'sta': hp_iv},
+            'stat_product': atk * defense * hp,
+            'level': level,
+            'iv_atk': atk_iv,
+            'iv_def': defense_iv,
+            'iv_sta': hp_iv,
+        }
+
+    @staticmethod
+    def _resolve_moves(pokemon_data: Dict[str, Any], moves: Dict[str, str], poke_data: PokeData):
+        """Resolve move IDs to move records"""
+        fast_move = None
+        if "fast" in moves:
+            fast_move = poke_data.get_move_details(moves["fast"])
+            if not fast_move:
+                logger.warning("Fast move %s not found for %s", moves["fast"], pokemon_data['speciesId'])
+
+        charged_moves = []
         for i in range(1, 3):
             key = f"charged{i}"
-            if key in self.moves:
-                move_data = self.poke_data.get_move_details(self.moves[key])
+            if key in moves:
+                move_data = poke_data.get_move_details(moves[key])
                 if move_data:
-                    self.charged_moves.append(move_data)
-                    print(f"[DEBUG] Charged move {i}: {self.moves[key]} -> {move_data['name']} (power: {move_data.get('power', 'N/A')}, energy: {move_data.get('energy', 'N/A')})")
+                    charged_moves.append(move_data)
                 else:
-                    print(f"[DEBUG] Charged move {i}: {self.moves[key]} -> NOT FOUND")
-                    print(f"[DEBUG] Available move IDs: {list(self.poke_data.moves_by_id.keys())[:10]}...")  # Show first 10 for debugging
+                    logger.warning("Charged move %s not found for %s", moves[key], pokemon_data['speciesId'])
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Moves for %s: fast=%s charged=%s", pokemon_data['speciesId'],
+                         fast_move and fast_move['name'], [m['name'] for m in charged_moves])
+        return fast_move, charged_moves
+
+    def rank_charged_moves(self, defender: 'BattleProfile') -> Tuple[Dict[str, float], Dict[str, Any]]:
+        """DPE of each charged move against a defender ({name: dpe}) and the move with the highest"""
+        # Calculate DPE for all moves (using effective power after type effectiveness)
+        move_dpe = {}
+        effectiveness_table = self.get_effectiveness(defender.typing)
+        for move in self.charged_moves:
+            # Calculate effective power considering type effectiveness and STAB
+            effectiveness = effectiveness_table[move["moveId"]]
+            stab = self.stab[move["moveId"]]
+            
+            effective_power = move["power"] * effectiveness * stab
+            effective_dpe = effective_power / move["energy"] if move["energy"] > 0 else 0
+            move_dpe[move["name"]] = effective_dpe
+        
+        # Find the move with the highest DPE
+        best_move_name = max(move_dpe.keys(), key=lambda k: move_dpe[k])
+        best_move = next(m for m in self.charged_moves if m["name"] == best_move_name)
+        return move_dpe, best_move
+
+    def decision_table(self, defender: 'BattleProfile') -> Tuple[int, ...]:
+        """
+        Get the DPE heuristic's charged move choice against a defender in every state it looks at.
         
-        print(f"[DEBUG] Final charged moves for {self.data['speciesId']}: {[m['name'] for m in self.charged_moves]}")
-        print(f"[DEBUG] Final charged moves details for {self.data['speciesId']}: {[(m['name'], m.get('power', 'N/A'), m.get('energy', 'N/A')) for m in self.charged_moves]}")
+        Entry energy * 4 + opponent_low_hp * 2 + self_low_hp (the flags being
+        HP under 30% of max) holds the index in charged_moves of the move to
+        throw, or -1 to keep charging. The DPE ranking depends only on the
+        defender's typing, so the table is shared by defenders of one typing.
+        """
+        table = self._decisions.get(defender.typing)
+        if table is None:
+            if not self.charged_moves:
+                table = (-1,) * ((MAX_ENERGY + 1) * 4)
+            else:
+                move_dpe, best_move = self.rank_charged_moves(defender)
+                choices = (_charged_move_choice(self.charged_moves, move_dpe, best_move, energy, opponent_low_hp, self_low_hp)[0]
+                           for energy in range(MAX_ENERGY + 1)
+                           for opponent_low_hp in (False, True) for self_low_hp in (False, True))
+                table = tuple(-1 if move is None else self.charged_moves.index(move) for move in choices)
+            self._decisions[defender.typing] = table
+        return table
+
+    def has_random_buffs(self) -> bool:
+        """Whether any move can roll a buff with a chance strictly between 0 and 1"""
+        moves = ([self.fast_move] if self.fast_move else []) + list(self.charged_moves)
+        return any(m.get("buffs") and 0 < float(m.get("buffApplyChance", "0")) < 1 for m in moves)
+
+    def get_effectiveness(self, defender_typing: int) -> Dict[str, float]:
+        """Get {moveId: type effectiveness} for this profile's moves against an interned defender typing"""
+        table = self._effectiveness.get(defender_typing)
+        if table is None:
+            moves = ([self.fast_move] if self.fast_move else []) + list(self.charged_moves)
+            column = TypeChart.effectiveness_grid([m["type"] for m in moves], [defender_typing])[:, 0]
+            table = {move["moveId"]: float(eff) for move, eff in zip(moves, column)}
+            self._effectiveness[defender_typing] = table
+        return table
+
+    def damage_table(self, defender: 'BattleProfile') -> Dict[str, Tuple[int, ...]]:
+        """
+        Get {moveId: damage per buff stage pair} for this profile's moves against a defender.
+        
+        Each entry holds the 81 integer damages for attack stage a and defense
+        stage d (both -4..+4) at index (a + 4) * 9 + (d + 4), computed with the
+        same float expression a per-hit calculation would use. Tables depend
+        only on the defender's typing and defense, so defenders that share
+        both share a table.
+        """
+        key = (defender.typing, defender.defense * defender.shadow_def_mult)
+        tables = self._damage.get(key)
+        if tables is None:
+            effectiveness = self.get_effectiveness(defender.typing)
+            attacks = [self.atk * self.shadow_atk_mult * mult for mult in BUFF_MULTIPLIERS]
+            defenses = [defender.defense * defender.shadow_def_mult * mult for mult in BUFF_MULTIPLIERS]
+            tables = {}
+            for move in ([self.fast_move] if self.fast_move else []) + list(self.charged_moves):
+                move_id = move["moveId"]
+                scaled_power = move["power"] * self.stab[move_id]
+                eff = effectiveness[move_id]
+                tables[move_id] = tuple(
+                    max(1, math.floor(scaled_power * (atk / def_) * eff * 0.5 * DamageMultiplier.BONUS) + 1)
+                    for atk in attacks for def_ in defenses
+                )
+            if len(self._damage) >= DAMAGE_TABLE_CACHE_SIZE:
+                self._damage.pop(next(iter(self._damage), None), None)
+            self._damage[key] = tables
+        return tables
+
+class ProfileCache:
+    """LRU cache of BattleProfile objects, cleared when the league data changes"""
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self.data_version = None
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pokemon_data: Dict[str, Any], moves: Dict[str, str], poke_data: PokeData) -> BattleProfile:
+        """Get the profile for a species + moveset, building it on a miss"""
+        species_id = pokemon_data.get('speciesId') or pokemon_data.get('name', '').lower().replace(' ', '_')
+        stats = poke_data.get_rank1_stats(species_id) or {}
+        ivs = (stats.get('iv_atk'), stats.get('iv_def'), stats.get('iv_sta'))
+        key = (species_id, moves.get('fast'), moves.get('charged1'), moves.get('charged2'), poke_data.cp_cap, ivs)
+        version = getattr(poke_data, 'data_version', None)
+
+        with self._lock:
+            if version != self.data_version:
+                self._profiles.clear()
+                self.data_version = version
+            profile = self._profiles.get(key)
+            if profile is not None:
+                self._profiles.move_to_end(key)
+                return profile
+
+        profile = BattleProfile.build(pokemon_data, moves, poke_data)
+        with self._lock:
+            self._profiles[key] = profile
+            if len(self._profiles) > self.maxsize:
+                self._profiles.popitem(last=False)
+        return profile
+
+    def clear(self):
+        """Drop all cached profiles"""
+        with self._lock:
+            self._profiles.clear()
+
+class BattlePokemon:
+    """
+    Represents a Pokémon in battle with current state.
+    
+    Only what changes during a battle lives on the instance (hp, energy,
+    shields, buff stages and the effective attack/defense they give), in
+    slots. Species data, stats and moves are read from the shared, immutable
+    BattleProfile. The effective stats are recomputed only when a buff stage
+    is set, not on every damage calculation, and so are atk_row / def_col,
+    this Pokémon's offsets into damage tables (see BattleProfile.damage_table).
+    """
+    __slots__ = ('profile', 'species_id', 'max_hp', 'fast_move', 'charged_moves', 'damage_vs', 'decisions',
+                 'hp', 'energy', 'shields', '_atk_buffs', '_def_buffs', 'effective_atk', 'effective_def',
+                 'atk_row', 'def_col')
+    
+    max_energy = MAX_ENERGY
+    
+    def __init__(self, pokemon_data: Dict[str, Any], moves: Dict[str, str], shields: int = 2,
+                 poke_data: PokeData = None, profile: BattleProfile = None):
+        if profile is None:
+            profile = BattleProfile.build(pokemon_data, moves, poke_data or PokeData())
+        self.profile = profile
+        # Shared with the profile; read on every turn so kept as plain slots
+        self.species_id = profile.species_id
+        self.max_hp = profile.max_hp
+        self.fast_move = profile.fast_move
+        self.charged_moves = profile.charged_moves
+        # Damage and charged move decision tables against the opponent, set by face()
+        self.damage_vs = None
+        self.decisions = None
+        
+        # Battle state
+        self.hp = profile.max_hp
+        self.energy = 0
+        self.shields = shields
+        # Buff stages (-4 to +4); setting them refreshes effective_atk / effective_def
+        self.atk_buffs = 0
+        self.def_buffs = 0
+    
+    @property
+    def atk_buffs(self) -> int:
+        return self._atk_buffs
+    
+    @atk_buffs.setter
+    def atk_buffs(self, stage: int):
+        self._atk_buffs = stage
+        self.effective_atk = self.profile.atk * self.profile.shadow_atk_mult * BUFF_MULTIPLIERS[stage + 4]
+        self.atk_row = (stage + 4) * 9
+    
+    @property
+    def def_buffs(self) -> int:
+        return self._def_buffs
+    
+    @def_buffs.setter
+    def def_buffs(self, stage: int):
+        self._def_buffs = stage
+        self.effective_def = self.profile.defense * self.profile.shadow_def_mult * BUFF_MULTIPLIERS[stage + 4]
+        self.def_col = stage + 4
+    
+    # Static data, read through from the profile
+    data = property(lambda self: self.profile.data)
+    moves = property(lambda self: dict(self.profile.moves))
+    atk = property(lambda self: self.profile.atk)
+    defense = property(lambda self: self.profile.defense)
+    ivs = property(lambda self: self.profile.ivs)
+    stat_product = property(lambda self: self.profile.stat_product)
+    level = property(lambda self: self.profile.level)
+    iv_atk = property(lambda self: self.profile.iv_atk)
+    iv_def = property(lambda self: self.profile.iv_def)
+    iv_sta = property(lambda self: self.profile.iv_sta)
+    shadow_atk_mult = property(lambda self: self.profile.shadow_atk_mult)
+    shadow_def_mult = property(lambda self: self.profile.shadow_def_mult)
+    
+    def face(self, opponent: 'BattlePokemon'):
+        """Load the damage and charged move decision tables of this Pokémon against its opponent"""
+        self.damage_vs = self.profile.damage_table(opponent.profile)
+        self.decisions = self.profile.decision_table(opponent.profile)
     
     def get_effective_atk(self) -> float:
         """Get effective attack stat with buffs and shadow multiplier"""
-        buff_mult = self._get_buff_multiplier(self.atk_buffs)
-        return self.atk * self.shadow_atk_mult * buff_mult
+        return self.effective_atk
     
     def get_effective_def(self) -> float:
         """Get effective defense stat with buffs and shadow multiplier"""
-        buff_mult = self._get_buff_multiplier(self.def_buffs)
-        return self.defense * self.shadow_def_mult * buff_mult
-    
-    def _get_buff_multiplier(self, buff_stage: int) -> float:
-        """Get stat multiplier from buff stage (-4 to +4)"""
-        if buff_stage >= 0:
-            return (2 + buff_stage) / 2
-        else:
-            return 2 / (2 - buff_stage)
+        return self.effective_def
     
     def apply_buff(self, atk_change: int, def_change: int):
         """Apply buff/debuff to stats"""
-        self.atk_buffs = max(-4, min(4, self.atk_buffs + atk_change))
-        self.def_buffs = max(-4, min(4, self.def_buffs + def_change))
+        if atk_change:
+            self.atk_buffs = max(-4, min(4, self._atk_buffs + atk_change))
+        if def_change:
+            self.def_buffs = max(-4, min(4, self._def_buffs + def_change))
     
     def take_damage(self, damage: int):
         """Take damage and update HP"""
-        old_hp = self.hp
         self.hp = max(0, self.hp - damage)
-        print(f"[DEBUG] {self.data['speciesId']} took {damage} damage: {old_hp} -> {self.hp} HP")
     
     def gain_energy(self, energy: int):
         """Gain energy"""
@@ -290,11 +632,8 @@ class BattlePokemon:
     def use_shield(self):
         """Use a shield"""
         if self.shields > 0:
-            old_shields = self.shields
             self.shields -= 1
-            print(f"[DEBUG] {self.data['speciesId']} used shield: {old_shields} -> {self.shields} (id={id(self)})")
             return True
-        print(f"[DEBUG] {self.data['speciesId']} tried to use shield but has {self.shields} shields (id={id(self)})")
         return False
     
     def is_fainted(self) -> bool:
@@ -305,12 +644,112 @@ class BattlePokemon:
         """Get charged moves that can be used with current energy"""
         return [move for move in self.charged_moves if self.energy >= move["energy"]]
 
+@dataclass
+class BattleContext:
+    """
+    Everything that changes during one battle: both Pokémon, their shield AIs
+    and the buff roll source. It is created per call and threaded through the
+    simulator's methods, so a single BattleSimulator can run battles on many
+    threads at once.
+    """
+    p1: BattlePokemon
+    p2: BattlePokemon
+    p1_shield_ai: ShieldAI
+    p2_shield_ai: ShieldAI
+    rng: random.Random = field(default_factory=random.Random)
+    # Forced buff roll outcomes while simulate_expected / OptimalPlaySearch walk the battle tree
+    scripted_rolls: Optional['_ScriptedRolls'] = None
+    # Structured decision events, collected only when tracing (settings['trace'] or DEBUG logging)
+    trace: Optional[List[Dict[str, Any]]] = None
+    # Timeline entries to build: 'full' (every move), 'charged' (charged moves only) or 'none'
+    detail: str = 'full'
+    # Limits of a simulate run: the last turn to play and a time.monotonic() deadline
+    max_turns: Optional[int] = None
+    deadline: Optional[float] = None
+    # Why the battle was cut short ('turn_limit' or 'time_budget'); None if it ran to the end
+    aborted: Optional[str] = None
+    steps: int = 0
+    
+    def __post_init__(self):
+        self.p1.face(self.p2)
+        self.p2.face(self.p1)
+    
+    def shield_ai_for(self, defender: BattlePokemon) -> ShieldAI:
+        """Shield AI of the player defending"""
+        return self.p2_shield_ai if defender is self.p2 else self.p1_shield_ai
+    
+    def out_of_budget(self, turn: int) -> bool:
+        """Whether the battle must stop instead of playing turn + 1 (recorded in aborted)"""
+        if self.max_turns is not None and turn >= self.max_turns:
+            self.aborted = 'turn_limit'
+        elif self.deadline is not None:
+            self.steps += 1
+            # Checking the clock every step is measurable; every 64 is plenty
+            if self.steps % 64 == 0 and time.monotonic() > self.deadline:
+                self.aborted = 'time_budget'
+        return self.aborted is not None
+    
+    def roll_buff(self, chance: float) -> bool:
+        """Roll for a buff; exact evaluation replaces the roll with scripted outcomes"""
+        if self.scripted_rolls is not None:
+            return self.scripted_rolls.roll(chance)
+        return self.rng.random() < chance
+
 class BattleSimulator:
-    def __init__(self, poke_data: PokeData):
+    ENGINES = ('turn', 'event')
+    MODES = ('battle', 'expected', 'optimal')
+    PLAY_STYLES = ('optimal', 'heuristic')
+    DETAIL_LEVELS = ('full', 'charged', 'none')
+
+    def __init__(self, poke_data: PokeData, profile_cache_size: int = 512):
         self.poke_data = poke_data
-        # Default shield AI strategies for each player
-        self.p1_shield_ai = ShieldAI('smart_30')
-        self.p2_shield_ai = ShieldAI('smart_30')
+        # Shared, precompiled species + moveset data. Nothing else is stored on
+        # the simulator: per-battle state lives in a BattleContext
+        self.profiles = ProfileCache(profile_cache_size)
+    
+    def _new_context(self, p1_data: Dict[str, Any], p2_data: Dict[str, Any],
+                     p1_moves: Dict[str, str], p2_moves: Dict[str, str],
+                     p1_shields: int, p2_shields: int, settings: Optional[Dict[str, Any]],
+                     seed=None) -> BattleContext:
+        """Fresh battle state for one call, with shield AI strategies from settings"""
+        settings = settings or {}
+        p1_profile = self.profiles.get(p1_data, p1_moves, self.poke_data)
+        p2_profile = self.profiles.get(p2_data, p2_moves, self.poke_data)
+        self.check_matchup(p1_profile, p2_profile)
+        return BattleContext(
+            p1=BattlePokemon(p1_data, p1_moves, p1_shields, profile=p1_profile),
+            p2=BattlePokemon(p2_data, p2_moves, p2_shields, profile=p2_profile),
+            p1_shield_ai=ShieldAI(settings.get('p1_shield_ai', 'smart_30')),
+            p2_shield_ai=ShieldAI(settings.get('p2_shield_ai', 'smart_30')),
+            rng=random.Random(seed)
+        )
+
+    @staticmethod
+    def _set_limits(ctx: BattleContext, settings: Optional[Dict[str, Any]]):
+        """
+        Load settings['max_turns'] and settings['time_budget'] (seconds) into
+        ctx, or the defaults, held to the caller's settings['deadline'] if any
+        """
+        settings = settings or {}
+        ctx.max_turns = settings.get('max_turns', MAX_BATTLE_TURNS)
+        time_budget = settings.get('time_budget', BATTLE_TIME_BUDGET)
+        ctx.deadline = _earliest(time.monotonic() + time_budget if time_budget else None, settings.get('deadline'))
+
+    @staticmethod
+    def check_matchup(p1: BattleProfile, p2: BattleProfile):
+        """
+        Reject a matchup that could never end, before any battle loop starts.
+        
+        Every fast move deals at least 1 damage, so a battle ends as long as
+        one side has a fast move. Without any, neither side ever gains energy
+        for a charged move either.
+        
+        Raises:
+            ValueError: if neither side has a fast move
+        """
+        if p1.fast_move is None and p2.fast_move is None:
+            raise ValueError(f"Neither {p1.species_id} nor {p2.species_id} has a fast move, "
+                             f"so the battle could never end")
 
     def simulate(self, p1_data: Dict[str, Any], p2_data: Dict[str, Any],
                  p1_moves: Dict[str, str], p2_moves: Dict[str, str],
@@ -323,72 +762,91 @@ class BattleSimulator:
             p1_data, p2_data: Pokémon dicts from poke_data
             p1_moves, p2_moves: {'fast': move_id, 'charged1': move_id, 'charged2': move_id}
             p1_shields, p2_shields: Number of shields for each Pokémon
-            settings: Battle settings (CP cap, level, etc.)
+            settings: Battle settings (CP cap, level, etc.). settings['engine'] picks
+                the battle loop: 'event' (default) or 'turn', the turn-by-turn
+                reference it matches. settings['seed'] seeds
+                buff chance rolls; settings['runs'] > 1 runs a Monte Carlo batch
+                (see simulate_monte_carlo), settings['mode'] = 'expected'
+                evaluates every buff outcome exactly (see simulate_expected) and
+                settings['mode'] = 'optimal' searches for perfect play
+                (see simulate_optimal). settings['trace'] = True adds a
+                structured 'trace' of charged move and shield decisions.
+                settings['detail'] sets what the timeline records: 'full'
+                (default, every move), 'charged' (charged moves only) or
+                'none' (no timeline, for callers that only need the outcome).
+                settings['max_turns'] (default MAX_BATTLE_TURNS) and
+                settings['time_budget'] (seconds, default BATTLE_TIME_BUDGET)
+                bound the battle; one that hits either stops with no winner,
+                a rating of 0.5 and 'aborted' set to 'turn_limit' or
+                'time_budget'. settings['deadline'], a time.monotonic()
+                value, bounds a caller's whole request: every mode stops
+                there as if its own time budget had run out.
         
         Returns:
             Detailed battle result with winner, timeline, stats, etc.
-        """
-        print(f"[BATTLE SIM DEBUG] Starting simulation with moves:")
-        print(f"[BATTLE SIM DEBUG] P1 moves: {p1_moves}")
-        print(f"[BATTLE SIM DEBUG] P2 moves: {p2_moves}")
         
-        # Get shield AI strategies from settings
-        p1_shield_strategy = settings.get('p1_shield_ai', 'smart_30') if settings else 'smart_30'
-        p2_shield_strategy = settings.get('p2_shield_ai', 'smart_30') if settings else 'smart_30'
+        Raises:
+            ValueError: for invalid settings or a matchup that could never end
+            (see check_matchup)
+        """
+        # Exact and repeated evaluations of buff outcomes are aggregated separately
+        mode = settings.get('mode', 'battle') if settings else 'battle'
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid battle mode: {mode}. Valid options: {list(self.MODES)}")
+        if mode == 'expected':
+            return self.simulate_expected(p1_data, p2_data, p1_moves, p2_moves,
+                                          p1_shields, p2_shields, settings)
+        if mode == 'optimal':
+            return self.simulate_optimal(p1_data, p2_data, p1_moves, p2_moves,
+                                         p1_shields, p2_shields, settings)
+        runs = settings.get('runs', 1) if settings else 1
+        if runs > 1:
+            return self.simulate_monte_carlo(p1_data, p2_data, p1_moves, p2_moves,
+                                             p1_shields, p2_shields, settings)
         
-        # Update shield AI strategies
-        self.p1_shield_ai = ShieldAI(p1_shield_strategy)
-        self.p2_shield_ai = ShieldAI(p2_shield_strategy)
+        # Random source for buff chances; a seed makes the battle reproducible
+        seed = settings.get('seed') if settings else None
         
-        # Initialize battle Pokémon with poke_data for rank 1 stats
-        p1 = BattlePokemon(p1_data, p1_moves, p1_shields, poke_data=self.poke_data)
-        p2 = BattlePokemon(p2_data, p2_moves, p2_shields, poke_data=self.poke_data)
+        # 'turn' steps every turn; 'event' jumps over stretches where only fast moves happen
+        engine = settings.get('engine', 'event') if settings else 'event'
+        if engine not in self.ENGINES:
+            raise ValueError(f"Invalid battle engine: {engine}. Valid options: {list(self.ENGINES)}")
+        detail = settings.get('detail', 'full') if settings else 'full'
+        if detail not in self.DETAIL_LEVELS:
+            raise ValueError(f"Invalid detail level: {detail}. Valid options: {list(self.DETAIL_LEVELS)}")
         
-        # Store references to determine which player is which
-        self.p1_pokemon = p1
-        self.p2_pokemon = p2
-        print(f"[DEBUG] BattleSimulator: p1 id={id(p1)}, p2 id={id(p2)}")
+        # Initialize battle Pokémon with poke_data for rank 1 stats, plus their shield AIs
+        ctx = self._new_context(p1_data, p2_data, p1_moves, p2_moves, p1_shields, p2_shields, settings, seed)
+        ctx.detail = detail
+        self._set_limits(ctx, settings)
+        p1, p2 = ctx.p1, ctx.p2
+        want_trace = bool(settings.get('trace')) if settings else False
+        log_trace = logger.isEnabledFor(logging.DEBUG)
+        if want_trace or log_trace:
+            ctx.trace = []
         
         # Battle state
-        turn = 0
-        timeline = []
+        timeline = [] if detail != 'none' else None
         
         # Main battle loop
-        while not p1.is_fainted() and not p2.is_fainted():
-            turn += 1
-            print(f"[BATTLE SIM DEBUG] Turn {turn} - P1 HP: {p1.hp}, P2 HP: {p2.hp}")
-            
-            # Process fast moves
-            p1_fast_result = self._process_fast_move(p1, p2, turn)
-            p2_fast_result = self._process_fast_move(p2, p1, turn)
-            
-            timeline.extend([p1_fast_result, p2_fast_result])
-            
-            # Check for fainting after fast moves
-            if p1.is_fainted() or p2.is_fainted():
-                break
-            
-            # Process charged moves (AI decision)
-            p1_charged_result = self._process_charged_move(p1, p2, turn)
-            p2_charged_result = self._process_charged_move(p2, p1, turn)
-            
-            if p1_charged_result:
-                timeline.append(p1_charged_result)
-                print(f"[BATTLE SIM DEBUG] P1 used charged move: {p1_charged_result.get('move', 'Unknown')}")
-            if p2_charged_result:
-                timeline.append(p2_charged_result)
-                print(f"[BATTLE SIM DEBUG] P2 used charged move: {p2_charged_result.get('move', 'Unknown')}")
-            
-            # Check for fainting after charged moves
-            if p1.is_fainted() or p2.is_fainted():
-                break
+        if engine == 'event':
+            turn = self._run_event_loop(ctx, timeline)
+        else:
+            turn = self._run_turn_loop(ctx, timeline)
         
         # Determine winner and calculate battle rating
-        winner, battle_rating = self._determine_winner(p1, p2)
-        print(f"[DEBUG] Battle finished. Winner: {winner}, P1 HP: {p1.hp}/{p1.max_hp}, P2 HP: {p2.hp}/{p2.max_hp}, Battle rating: {battle_rating}")
-        # Debug: Show final shield counts
-        print(f"[DEBUG] Final shield counts - P1 ({p1.data['speciesId']} id={id(p1)}): {p1.shields}, P2 ({p2.data['speciesId']} id={id(p2)}): {p2.shields}")
-        return {
+        if ctx.aborted:
+            winner, battle_rating = None, 0.5
+            logger.warning("Battle %s vs %s aborted (%s) after %d turns",
+                           p1.species_id, p2.species_id, ctx.aborted, turn)
+        else:
+            winner, battle_rating = self._determine_winner(p1, p2)
+        if log_trace:
+            for event in ctx.trace:
+                logger.debug("%s vs %s: %s", p1.species_id, p2.species_id, event)
+            logger.debug("Battle finished. Winner: %s, P1 HP: %d/%d, P2 HP: %d/%d, shields %d/%d",
+                         winner, p1.hp, p1.max_hp, p2.hp, p2.max_hp, p1.shields, p2.shields)
+        result = {
             "winner": winner,
             "p1_final_hp": p1.hp,
             "p2_final_hp": p2.hp,
@@ -399,15 +857,514 @@ class BattleSimulator:
             "p1_final_shields": p1.shields,
             "p2_final_shields": p2.shields,
             "turns": turn,
-            "timeline": timeline,
             "battle_rating": battle_rating,
             "p1_final_buffs": {"atk": p1.atk_buffs, "def": p1.def_buffs},
-            "p2_final_buffs": {"atk": p2.atk_buffs, "def": p2.def_buffs}
+            "p2_final_buffs": {"atk": p2.atk_buffs, "def": p2.def_buffs},
+            "seed": seed
+        }
+        if detail != 'none':
+            result["timeline"] = _expand_timeline(timeline)
+        if want_trace:
+            result["trace"] = ctx.trace
+        if ctx.aborted:
+            result["aborted"] = ctx.aborted
+        return result
+    
+    def simulate_monte_carlo(self, p1_data: Dict[str, Any], p2_data: Dict[str, Any],
+                             p1_moves: Dict[str, str], p2_moves: Dict[str, str],
+                             p1_shields: int = 2, p2_shields: int = 2,
+                             settings: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Run the same battle many times with independent buff rolls and aggregate.
+        
+        settings['runs'] is the number of battles, settings['seed'] makes the
+        whole batch reproducible (each run gets its own seed drawn from it), and
+        settings['processes'] spreads the runs over a pool of worker processes
+        started for this call, for offline jobs (the web app stays in-process).
+        Battles without any partial buff chances are deterministic and run only once.
+        Past settings['deadline'] no further runs start; the result then
+        aggregates the runs that finished and has 'aborted' = 'time_budget'.
+        
+        Returns:
+            Win probabilities with a 95% Wilson interval for P1, and the
+            distribution, mean and 95% interval of P1's battle rating (0-1000)
+        """
+        settings = dict(settings or {})
+        runs = int(settings.pop('runs', 1))
+        seed = settings.pop('seed', None)
+        processes = int(settings.pop('processes', 1))
+        settings.pop('trace', None)
+        # Runs are only aggregated, so none of them needs a timeline
+        settings['detail'] = 'none'
+        
+        seeder = random.Random(seed)
+        run_seeds = [seeder.getrandbits(64) for _ in range(runs)]
+        battle_args = (p1_data, p2_data, p1_moves, p2_moves, p1_shields, p2_shields, settings)
+        
+        p1_profile = self.profiles.get(p1_data, p1_moves, self.poke_data)
+        p2_profile = self.profiles.get(p2_data, p2_moves, self.poke_data)
+        if not (p1_profile.has_random_buffs() or p2_profile.has_random_buffs()):
+            outcomes = _run_monte_carlo_seeds(self, battle_args, run_seeds[:1]) * runs
+        elif processes > 1:
+            chunk_size = max(1, -(-runs // (processes * 4)))
+            chunks = [run_seeds[i:i + chunk_size] for i in range(0, runs, chunk_size)]
+            with multiprocessing.Pool(processes, initializer=_init_monte_carlo_worker,
+                                      initargs=(self.poke_data,)) as pool:
+                outcomes = []
+                for chunk in pool.map(_monte_carlo_chunk, [(battle_args, chunk) for chunk in chunks]):
+                    outcomes.extend(chunk)
+        else:
+            outcomes = _run_monte_carlo_seeds(self, battle_args, run_seeds)
+        
+        result = _aggregate_monte_carlo(outcomes, p1_profile.species_id, p2_profile.species_id, seed)
+        if len(outcomes) < runs:
+            result["aborted"] = "time_budget"
+        return result
+    
+    def simulate_expected(self, p1_data: Dict[str, Any], p2_data: Dict[str, Any],
+                          p1_moves: Dict[str, str], p2_moves: Dict[str, str],
+                          p1_shields: int = 2, p2_shields: int = 2,
+                          settings: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Evaluate every buff outcome of a battle exactly instead of sampling.
+        
+        Each buff roll with a chance strictly between 0 and 1 splits the battle
+        into two weighted branches. Branches that reach an identical state
+        (hp, energy, shields and buff stages on both sides) share one
+        memoized evaluation, so the battle tree is walked as a DAG.
+        
+        settings['max_turns'] caps the turns along any line of the walk and
+        settings['time_budget'] the whole walk, as in simulate; if either
+        runs out, the result has no winner or probabilities, an expected
+        rating of 500 and 'aborted' set to 'turn_limit' or 'time_budget'.
+        
+        Returns:
+            Exact win/tie probabilities and the expected P1 battle rating
+            (0-1000) and battle length
+        """
+        ctx = self._new_context(p1_data, p2_data, p1_moves, p2_moves, p1_shields, p2_shields, settings)
+        ctx.detail = 'none'
+        self._set_limits(ctx, settings)
+        p1, p2 = ctx.p1, ctx.p2
+        
+        # value[state] = (p1 win, p2 win, tie, expected rating, expected remaining turns)
+        values: Dict[Tuple, Tuple[float, float, float, float, float]] = {}
+        transitions: Dict[Tuple, List[Tuple[float, int, Tuple]]] = {}
+        root = _battle_state(p1, p2)
+        # (state, turns played to reach it along the line being walked)
+        stack = [(root, 0)]
+        while stack:
+            state, turn = stack[-1]
+            if state in values:
+                stack.pop()
+                continue
+            if state not in transitions:
+                transitions[state] = self._expand_state(ctx, state, turn)
+                if ctx.aborted:
+                    break
+            pending = [(nxt, turn + elapsed) for _, elapsed, nxt in transitions[state] if nxt not in values]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            values[state] = self._combine_branches(ctx, state, transitions[state], values)
+        
+        if ctx.aborted:
+            logger.warning("Expected battle %s vs %s aborted (%s) after %d states",
+                           p1.species_id, p2.species_id, ctx.aborted, len(transitions))
+            return {
+                "mode": "expected",
+                "winner": None,
+                "p1_win_probability": None,
+                "p2_win_probability": None,
+                "tie_probability": None,
+                "expected_rating": 500.0,
+                "expected_turns": None,
+                "states_evaluated": len(values),
+                "aborted": ctx.aborted
+            }
+        p1_win, p2_win, tie, rating, turns = values[root]
+        outcomes = {p1.species_id: p1_win, p2.species_id: p2_win, "tie": tie}
+        return {
+            "mode": "expected",
+            "winner": max(outcomes, key=outcomes.get),
+            "p1_win_probability": p1_win,
+            "p2_win_probability": p2_win,
+            "tie_probability": tie,
+            "expected_rating": rating,
+            "expected_turns": turns,
+            "states_evaluated": len(values)
+        }
+    
+    def simulate_optimal(self, p1_data: Dict[str, Any], p2_data: Dict[str, Any],
+                         p1_moves: Dict[str, str], p2_moves: Dict[str, str],
+                         p1_shields: int = 2, p2_shields: int = 2,
+                         settings: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Search for perfect charged move and shield play (see OptimalPlaySearch).
+        
+        Settings:
+            p1_play / p2_play: 'optimal' (default) or 'heuristic' to pin a side
+                to the DPE move choice and its shield AI
+            node_budget: Positions to expand before falling back to heuristic play
+            time_budget: Seconds to search before falling back to heuristic play
+            max_turns: Turn cap of each heuristic playout (default MAX_BATTLE_TURNS)
+            deadline: time.monotonic() value neither the search nor its playouts go past
+        
+        The playouts that score positions past the search budget get
+        BATTLE_TIME_BUDGET seconds on top of time_budget. If a playout hits
+        the turn cap or that deadline, the search stops and the result has
+        no winner or line, a rating of 500 and 'aborted' set to
+        'turn_limit' or 'time_budget'.
+        
+        Returns:
+            Minimax P1 battle rating (0-1000), the principal line of charged
+            moves and shields, and search statistics. 'complete' is False if
+            a budget ran out ('budget_exhausted' says which) and
+            'heuristic_positions' positions were scored by heuristic play
+            instead; the rating is then only partly optimal, and the
+            principal line stops where the search did.
+        """
+        settings = dict(settings or {})
+        plays = (settings.get('p1_play', 'optimal'), settings.get('p2_play', 'optimal'))
+        for play in plays:
+            if play not in self.PLAY_STYLES:
+                raise ValueError(f"Invalid play style: {play}. Valid options: {list(self.PLAY_STYLES)}")
+        ctx = self._new_context(p1_data, p2_data, p1_moves, p2_moves, p1_shields, p2_shields, settings)
+        ctx.detail = 'none'
+        p1, p2 = ctx.p1, ctx.p2
+        
+        search = OptimalPlaySearch(
+            self, ctx,
+            optimal=(plays[0] == 'optimal', plays[1] == 'optimal'),
+            node_budget=settings.get('node_budget', OPTIMAL_NODE_BUDGET),
+            time_budget=settings.get('time_budget', OPTIMAL_TIME_BUDGET),
+            seed=settings.get('seed')
+        )
+        search.deadline = _earliest(search.deadline, settings.get('deadline'))
+        ctx.max_turns = settings.get('max_turns', MAX_BATTLE_TURNS)
+        ctx.deadline = _earliest(search.deadline + BATTLE_TIME_BUDGET if search.deadline is not None else None,
+                                 settings.get('deadline'))
+        start = time.monotonic()
+        root = _battle_state(p1, p2)
+        rating = search.solve(root)
+        if ctx.aborted:
+            logger.warning("Optimal search %s vs %s aborted (%s) after %d positions",
+                           p1.species_id, p2.species_id, ctx.aborted, search.nodes)
+            rating, line, final_state = 500.0, [], None
+        else:
+            line, final_state = search.principal_line(root)
+        elapsed = time.monotonic() - start
+        
+        winner = None
+        if final_state is not None:
+            _restore_battle_state(p1, p2, final_state)
+            winner, _ = self._determine_winner(p1, p2)
+        result = {
+            "mode": "optimal",
+            "winner": winner,
+            "rating": rating,
+            "p1_play": plays[0],
+            "p2_play": plays[1],
+            "principal_line": line,
+            "p1_final_hp": final_state[0] if final_state else None,
+            "p2_final_hp": final_state[5] if final_state else None,
+            "p1_max_hp": p1.max_hp,
+            "p2_max_hp": p2.max_hp,
+            "complete": search.complete and not ctx.aborted,
+            "budget_exhausted": search.budget_exhausted,
+            "heuristic_positions": search.playouts,
+            "nodes": search.nodes,
+            "positions": len(search.table),
+            "search_time": elapsed
+        }
+        if ctx.aborted:
+            result["aborted"] = ctx.aborted
+        return result
+    
+    def damage_readout(self, p1_data: Dict[str, Any], p2_data: Dict[str, Any],
+                       p1_moves: Dict[str, str], p2_moves: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Breakpoints and bulkpoints of a matchup across buff stages.
+        
+        For each side's moves, read from the matchup's damage tables:
+        'by_atk_stage' is the damage at each attack stage (-4..+4) of the
+        attacker against an unbuffed defender and 'by_def_stage' the damage at
+        each defense stage of the defender against an unbuffed attacker.
+        'breakpoints' are the attack stages that deal more damage than the
+        stage below, 'bulkpoints' the defense stages that take less.
+        """
+        p1_profile = self.profiles.get(p1_data, p1_moves, self.poke_data)
+        p2_profile = self.profiles.get(p2_data, p2_moves, self.poke_data)
+        
+        def side(attacker: BattleProfile, defender: BattleProfile) -> List[Dict[str, Any]]:
+            tables = attacker.damage_table(defender)
+            readout = []
+            for move in ([attacker.fast_move] if attacker.fast_move else []) + list(attacker.charged_moves):
+                table = tables[move["moveId"]]
+                by_atk = [table[(stage + 4) * 9 + 4] for stage in BUFF_STAGES]
+                by_def = [table[4 * 9 + stage + 4] for stage in BUFF_STAGES]
+                readout.append({
+                    "move": move["name"],
+                    "move_id": move["moveId"],
+                    "damage": table[4 * 9 + 4],
+                    "by_atk_stage": by_atk,
+                    "by_def_stage": by_def,
+                    "breakpoints": [BUFF_STAGES[i] for i in range(1, 9) if by_atk[i] > by_atk[i - 1]],
+                    "bulkpoints": [BUFF_STAGES[i] for i in range(1, 9) if by_def[i] < by_def[i - 1]]
+                })
+            return readout
+        
+        return {
+            "stages": list(BUFF_STAGES),
+            "p1": side(p1_profile, p2_profile),
+            "p2": side(p2_profile, p1_profile)
         }
     
-    def _process_fast_move(self, attacker: BattlePokemon, defender: BattlePokemon, turn: int) -> Dict[str, Any]:
-        """Process a fast move and return timeline entry"""
+    def _expand_state(self, ctx: BattleContext, state: Tuple, turn: int = 0) -> List[Tuple[float, int, Tuple]]:
+        """
+        List the (probability, turns elapsed, next state) branches out of a state.
+        
+        Runs turns from the state until the battle ends or a turn that rolled
+        at least one uncertain buff finishes. Deterministic stretches are
+        therefore collapsed into a single edge. turn is the number of turns
+        already played to reach the state, for ctx's limits; once they run
+        out (ctx.aborted) the branches are incomplete.
+        """
+        if state[0] <= 0 or state[5] <= 0:
+            return []
+        p1, p2 = ctx.p1, ctx.p2
+        branches = []
+        prefixes = [[]]
+        while prefixes:
+            prefix = prefixes.pop()
+            _restore_battle_state(p1, p2, state)
+            rolls = _ScriptedRolls(prefix)
+            ctx.scripted_rolls = rolls
+            turns = 0
+            try:
+                while not p1.is_fainted() and not p2.is_fainted():
+                    if ctx.out_of_budget(turn + turns):
+                        return branches
+                    skip = self._turns_until_next_event(p1, p2, through_waits=True)
+                    if ctx.max_turns is not None:
+                        skip = min(skip, ctx.max_turns - turn - turns - 1)
+                    if skip > 0:
+                        turns = self._apply_fast_stretch(p1, p2, turns, skip, None)
+                    turns += 1
+                    self._run_turn(ctx, turns, None)
+                    if rolls.used:
+                        break
+            except _BranchNeeded:
+                prefixes.append(prefix + [True])
+                prefixes.append(prefix + [False])
+                continue
+            finally:
+                ctx.scripted_rolls = None
+            branches.append((rolls.probability, turns, _battle_state(p1, p2)))
+        return branches
+    
+    def _combine_branches(self, ctx: BattleContext, state: Tuple,
+                          branches: List[Tuple[float, int, Tuple]], values: Dict[Tuple, Tuple]) -> Tuple[float, float, float, float, float]:
+        """Probability-weighted value of a state from its branches, or its outcome if the battle is over"""
+        if not branches:
+            p1, p2 = ctx.p1, ctx.p2
+            _restore_battle_state(p1, p2, state)
+            rating = matchup_rating({
+                'p1_final_hp': p1.hp, 'p1_max_hp': p1.max_hp,
+                'p2_final_hp': p2.hp, 'p2_max_hp': p2.max_hp
+            })
+            if p1.is_fainted() and p2.is_fainted():
+                return 0.0, 0.0, 1.0, rating, 0.0
+            if p1.is_fainted():
+                return 0.0, 1.0, 0.0, rating, 0.0
+            return 1.0, 0.0, 0.0, rating, 0.0
+        p1_win = p2_win = tie = rating = turns = 0.0
+        for probability, elapsed, nxt in branches:
+            v = values[nxt]
+            p1_win += probability * v[0]
+            p2_win += probability * v[1]
+            tie += probability * v[2]
+            rating += probability * v[3]
+            turns += probability * (elapsed + v[4])
+        return p1_win, p2_win, tie, rating, turns
+    
+    def _run_turn_loop(self, ctx: BattleContext, timeline: List[Dict[str, Any]]) -> int:
+        """Step the battle one turn at a time until a Pokémon faints or a budget runs out. Returns the turn count."""
+        p1, p2 = ctx.p1, ctx.p2
+        turn = 0
+        while not p1.is_fainted() and not p2.is_fainted():
+            if ctx.out_of_budget(turn):
+                break
+            turn += 1
+            self._run_turn(ctx, turn, timeline)
+        return turn
+    
+    def _run_event_loop(self, ctx: BattleContext, timeline: List[Dict[str, Any]]) -> int:
+        """
+        Event-driven battle loop.
+        
+        Jumps straight over stretches of turns where only fast moves can happen
+        (nobody can faint and nobody would throw a charged move), then steps
+        the decision turn normally. Produces the same result and timeline as
+        _run_turn_loop.
+        """
+        p1, p2 = ctx.p1, ctx.p2
+        fast_timeline = timeline if ctx.detail == 'full' else None
+        # Turns where a side only holds its energy are skipped too, unless each decision is traced
+        through_waits = ctx.trace is None
+        turn = 0
+        while not p1.is_fainted() and not p2.is_fainted():
+            if ctx.out_of_budget(turn):
+                break
+            skip = self._turns_until_next_event(p1, p2, through_waits)
+            if ctx.max_turns is not None:
+                # Stop a stretch in time for the turn cap to fall where it does stepping turn by turn
+                skip = min(skip, ctx.max_turns - turn - 1)
+            if skip > 0:
+                turn = self._apply_fast_stretch(p1, p2, turn, skip, fast_timeline)
+            turn += 1
+            self._run_turn(ctx, turn, timeline)
+        return turn
+    
+    def _run_turn(self, ctx: BattleContext, turn: int, timeline: Optional[List[Dict[str, Any]]]):
+        """
+        Run a single turn: fast moves for both sides, then charged move decisions.
+        
+        Entries are added to timeline as ctx.detail asks; with detail 'none'
+        (timeline may then be None) the turn builds no entries at all.
+        """
+        p1, p2 = ctx.p1, ctx.p2
+        
+        # Process fast moves
+        p1_fast_result = self._process_fast_move(ctx, p1, p2, turn)
+        p2_fast_result = self._process_fast_move(ctx, p2, p1, turn)
+        
+        if p1_fast_result is not None:
+            timeline.extend([p1_fast_result, p2_fast_result])
+        
+        # Check for fainting after fast moves
+        if p1.is_fainted() or p2.is_fainted():
+            return
+        
+        # Process charged moves (AI decision)
+        p1_charged_result = self._process_charged_move(ctx, p1, p2, turn)
+        p2_charged_result = self._process_charged_move(ctx, p2, p1, turn)
+        
+        if p1_charged_result:
+            timeline.append(p1_charged_result)
+        if p2_charged_result:
+            timeline.append(p2_charged_result)
+    
+    def _turns_until_next_event(self, p1: BattlePokemon, p2: BattlePokemon, through_waits: bool = False) -> int:
+        """
+        Count the upcoming turns that are guaranteed to be fast-move-only.
+        
+        A turn is an event if, after its fast moves, someone has fainted or has
+        enough energy for a charged move. Fast moves that may buff are random,
+        so those battles are never skipped. With through_waits, a Pokémon that
+        can afford a charged move but is holding energy for its best one only
+        makes an event of the turn its DPE heuristic would throw (see
+        _turns_until_throw); callers that decide charged moves themselves
+        leave it off.
+        
+        Every threshold is found in O(1) from the per-hit damage and energy
+        gain, both fixed until the next charged move or buff.
+        """
+        next_event = None
+        for attacker, defender in ((p1, p2), (p2, p1)):
+            move = attacker.fast_move
+            if move and move.get("buffs") and move.get("buffTarget") == "self":
+                return 0
+            if move:
+                # Defender faints on the first turn where cumulative damage reaches its HP
+                damage = self._calculate_damage(attacker, defender, move)
+                faint_turn = -(-defender.hp // damage)
+                next_event = faint_turn if next_event is None else min(next_event, faint_turn)
+            if attacker.charged_moves:
+                cheapest = min(m["energy"] for m in attacker.charged_moves)
+                missing = cheapest - attacker.energy
+                gain = move["energyGain"] if move else 0
+                if missing <= 0:
+                    if not through_waits:
+                        return 0
+                    throw_turn = self._turns_until_throw(attacker, defender)
+                    if throw_turn is None:
+                        continue
+                    if throw_turn <= 1:
+                        return 0
+                    next_event = throw_turn if next_event is None else min(next_event, throw_turn)
+                elif gain > 0:
+                    # Energy is capped at max_energy, which every charged move fits under
+                    ready_turn = -(-missing // gain)
+                    next_event = ready_turn if next_event is None else min(next_event, ready_turn)
+        if next_event is None:
+            return 0
+        return next_event - 1
+    
+    def _turns_until_throw(self, attacker: BattlePokemon, defender: BattlePokemon) -> Optional[int]:
+        """
+        First upcoming turn (1 = the next one) on which _choose_charged_move
+        throws, assuming fast moves only until then; None if it never would.
+        
+        The heuristic waits for its best-DPE move only while it is more than 3
+        energy away, that move costs at most 1.5x the current energy and both
+        sides are at 30% HP or more. Each fast-move turn moves hp and energy by
+        a fixed amount, so each condition flips at a turn found by division.
+        """
+        _, best_move = self._rank_charged_moves(attacker, defender)
+        gain = attacker.fast_move["energyGain"] if attacker.fast_move else 0
+        taken = self._calculate_damage(defender, attacker, defender.fast_move) if defender.fast_move else 0
+        dealt = self._calculate_damage(attacker, defender, attacker.fast_move) if attacker.fast_move else 0
+        
+        def energy_after(turns: int) -> int:
+            return min(attacker.max_energy, attacker.energy + gain * turns)
+        
+        # Too expensive only gets less true as energy grows
+        if best_move["energy"] > energy_after(1) * 1.5:
+            return 1
+        turns = []
+        # Close enough to (or able to afford) the best move
+        needed = best_move["energy"] - 3 - attacker.energy
+        if needed <= 0:
+            return 1
+        if gain > 0 and attacker.energy + needed <= attacker.max_energy:
+            turns.append(-(-needed // gain))
+        for pokemon, damage in ((defender, dealt), (attacker, taken)):
+            turn = _first_turn_below(pokemon.hp, damage, pokemon.max_hp * 0.3)
+            if turn is not None:
+                turns.append(turn)
+        return min(turns) if turns else None
+    
+    def _apply_fast_stretch(self, p1: BattlePokemon, p2: BattlePokemon, turn: int, count: int,
+                            timeline: Optional[List[Any]]) -> int:
+        """
+        Apply `count` fast-move-only turns in one step. Returns the new turn number.
+        
+        Nobody faints or buffs within a stretch, so the HP and energy deltas
+        are applied in bulk. If a timeline is given, the stretch goes into it
+        as a _FastStretch record, expanded into per-hit entries only when the
+        timeline is returned (see _expand_timeline).
+        """
+        sides = []
+        for attacker, defender in ((p1, p2), (p2, p1)):
+            move = attacker.fast_move
+            damage = self._calculate_damage(attacker, defender, move) if move else 0
+            if timeline is not None:
+                sides.append((attacker.species_id, defender.species_id, move, damage, defender.hp, attacker.energy))
+            if move:
+                defender.hp = max(0, defender.hp - damage * count)
+                attacker.gain_energy(move["energyGain"] * count)
+        if timeline is not None:
+            timeline.append(_FastStretch(turn + 1, count, sides))
+        return turn + count
+    
+    def _process_fast_move(self, ctx: BattleContext, attacker: BattlePokemon, defender: BattlePokemon,
+                           turn: int) -> Optional[Dict[str, Any]]:
+        """Process a fast move and return its timeline entry (None unless ctx.detail is 'full')"""
         if not attacker.fast_move:
+            if ctx.detail != 'full':
+                return None
             return {"turn": turn, "type": "fast", "attacker": attacker.data["speciesId"], "error": "No fast move"}
         
         move = attacker.fast_move
@@ -425,10 +1382,12 @@ class BattleSimulator:
         buff_applied = False
         if move.get("buffs") and move.get("buffTarget") == "self":
             chance = float(move.get("buffApplyChance", "0"))
-            if random.random() < chance:
+            if ctx.roll_buff(chance):
                 attacker.apply_buff(move["buffs"][0], move["buffs"][1])
                 buff_applied = True
         
+        if ctx.detail != 'full':
+            return None
         return {
             "turn": turn,
             "type": "fast",
@@ -442,104 +1401,98 @@ class BattleSimulator:
             "buff_applied": buff_applied
         }
     
-    def _process_charged_move(self, attacker: BattlePokemon, defender: BattlePokemon, turn: int) -> Optional[Dict[str, Any]]:
+    def _process_charged_move(self, ctx: BattleContext, attacker: BattlePokemon, defender: BattlePokemon,
+                              turn: int) -> Optional[Dict[str, Any]]:
         """Process a charged move (AI decision) and return timeline entry"""
-        available_moves = attacker.get_available_charged_moves()
-        if not available_moves:
+        decision = None
+        if ctx.trace is not None and attacker.get_available_charged_moves():
+            decision = {"turn": turn, "event": "charged_decision", "attacker": attacker.species_id,
+                        "energy": attacker.energy}
+            ctx.trace.append(decision)
+        move = self._choose_charged_move(attacker, defender, decision)
+        if move is None:
             return None
         
-        print(f"[DEBUG] {attacker.data['speciesId']} has {len(available_moves)} available charged moves: {[m['name'] for m in available_moves]}")
-        print(f"[DEBUG] {attacker.data['speciesId']} available moves details: {[(m['name'], m.get('power', 'N/A'), m.get('energy', 'N/A')) for m in available_moves]}")
-        
-        # Get ALL charged moves (not just available ones) to compare DPE
-        all_charged_moves = attacker.charged_moves
-        print(f"[DEBUG] {attacker.data['speciesId']} all charged moves: {[(m['name'], m.get('power', 'N/A'), m.get('energy', 'N/A')) for m in all_charged_moves]}")
-        
-        # Calculate DPE for all moves (using effective power after type effectiveness)
-        move_dpe = {}
-        for move in all_charged_moves:
-            # Calculate effective power considering type effectiveness and STAB
-            move_type = move["type"]
-            defender_types = defender.data.get("types", [])
-            effectiveness = TypeChart.get_effectiveness(move_type, defender_types)
-            stab = DamageMultiplier.STAB if move_type in attacker.data.get("types", []) else 1.0
-            
-            effective_power = move["power"] * effectiveness * stab
-            effective_dpe = effective_power / move["energy"] if move["energy"] > 0 else 0
-            move_dpe[move["name"]] = effective_dpe
-            print(f"[DEBUG] {attacker.data['speciesId']} move {move['name']}: power={move['power']}, energy={move['energy']}, effectiveness={effectiveness}, stab={stab}, effective_power={effective_power:.1f}, dpe={effective_dpe:.2f}")
-        
-        # Find the move with the highest DPE
-        best_move_name = max(move_dpe.keys(), key=lambda k: move_dpe[k])
-        best_dpe = move_dpe[best_move_name]
-        best_move = next(m for m in all_charged_moves if m["name"] == best_move_name)
-        current_energy = attacker.energy
-
-        # Print DPE for all available charged moves at this moment
-        print(f"[DEBUG] {attacker.data['speciesId']} available charged moves and DPE:")
-        for move in available_moves:
-            print(f"    {move['name']}: DPE={move_dpe[move['name']]:.2f} (energy: {move['energy']}, effective power: {move['power']})")
-        print(f"[DEBUG] {attacker.data['speciesId']} best move by DPE: {best_move_name} (dpe: {best_dpe:.2f}, energy: {best_move['energy']})")
-        print(f"[DEBUG] {attacker.data['speciesId']} current energy: {current_energy}")
-
-        # If the best move is available, use it
-        if current_energy >= best_move["energy"]:
-            move = best_move
-            print(f"[DEBUG] {attacker.data['speciesId']} using best move: {move['name']} (energy: {move['energy']}, dpe: {move_dpe[move['name']]:.2f})")
-        else:
-            # Check if we should wait for the best move
-            should_wait = True
-            # Don't wait if we're in danger (low HP)
-            if defender.hp < defender.max_hp * 0.3:
-                should_wait = False
-                print(f"[DEBUG] {attacker.data['speciesId']} not waiting - opponent is low HP")
-            if attacker.hp < attacker.max_hp * 0.3:
-                should_wait = False
-                print(f"[DEBUG] {attacker.data['speciesId']} not waiting - we're low HP")
-            if best_move["energy"] > current_energy * 1.5:
-                should_wait = False
-                print(f"[DEBUG] {attacker.data['speciesId']} not waiting - best move too expensive")
-            if best_move["energy"] - current_energy <= 3:
-                should_wait = False
-                print(f"[DEBUG] {attacker.data['speciesId']} not waiting - close to best move")
-            if should_wait:
-                print(f"[DEBUG] {attacker.data['speciesId']} waiting for better move - skipping charged move")
-                return None  # Skip this turn, wait for better move
-            else:
-                # Pick the available move with the highest DPE
-                best_available = max(available_moves, key=lambda m: move_dpe[m["name"]])
-                move = best_available
-                print(f"[DEBUG] {attacker.data['speciesId']} using best available move: {move['name']} (energy: {move['energy']}, dpe: {move_dpe[move['name']]:.2f})")
-        
         # Calculate damage
         damage = self._calculate_damage(attacker, defender, move)
         
-        # Determine which shield AI to use based on which player is defending
-        if defender is self.p1_pokemon:
-            shield_ai = self.p1_shield_ai
-        elif defender is self.p2_pokemon:
-            shield_ai = self.p2_shield_ai
-        else:
-            # Fallback to p1 strategy if we can't determine
-            shield_ai = self.p1_shield_ai
-        
         # Check if defender uses shield using intelligent AI
+        shield_ai = ctx.shield_ai_for(defender)
+        should_shield = self._choose_shield(shield_ai, defender, move, damage)
+        if ctx.trace is not None:
+            ctx.trace.append(dict(
+                self._damage_breakdown(attacker, defender, move),
+                turn=turn, event="charged_move", attacker=attacker.species_id, defender=defender.species_id,
+                move=move["name"], damage=damage, shield_strategy=shield_ai.strategy,
+                shields_left=defender.shields, shielded=should_shield
+            ))
+        return self._resolve_charged_move(ctx, attacker, defender, move, damage, should_shield, shield_ai.strategy, turn)
+    
+    def _choose_charged_move(self, attacker: BattlePokemon, defender: BattlePokemon,
+                             decision: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Pick the charged move to throw this turn by DPE, or None to keep charging.
+        
+        The choice is looked up in the matchup's decision table (see
+        BattleProfile.decision_table). If a decision dict is given (tracing),
+        the heuristic runs in full to record the DPE of each move, the choice
+        and the reasons for it.
+        """
+        opponent_low_hp = defender.hp < defender.max_hp * 0.3
+        self_low_hp = attacker.hp < attacker.max_hp * 0.3
+        if decision is None:
+            if attacker.decisions is None:
+                attacker.face(defender)
+            k = attacker.decisions[attacker.energy << 2 | opponent_low_hp << 1 | self_low_hp]
+            return attacker.charged_moves[k] if k >= 0 else None
+        
+        available_moves = attacker.get_available_charged_moves()
+        if not available_moves:
+            return None
+        move_dpe, best_move = self._rank_charged_moves(attacker, defender)
+        move, reasons = _charged_move_choice(attacker.charged_moves, move_dpe, best_move, attacker.energy,
+                                             opponent_low_hp, self_low_hp)
+        decision["dpe"] = {name: round(dpe, 4) for name, dpe in move_dpe.items()}
+        decision["available"] = [m["name"] for m in available_moves]
+        decision["choice"] = move["name"] if move else None
+        decision["reasons"] = reasons
+        return move
+    
+    def _rank_charged_moves(self, attacker: BattlePokemon, defender: BattlePokemon) -> Tuple[Dict[str, float], Dict[str, Any]]:
+        """DPE of each of the attacker's charged moves ({name: dpe}) and the move with the highest"""
+        return attacker.profile.rank_charged_moves(defender.profile)
+    
+    def _damage_breakdown(self, attacker: BattlePokemon, defender: BattlePokemon, move: Dict[str, Any]) -> Dict[str, Any]:
+        """The inputs of _calculate_damage, for traces"""
+        return {
+            "power": move["power"],
+            "stab": attacker.profile.stab[move["moveId"]],
+            "effectiveness": attacker.profile.get_effectiveness(defender.profile.typing)[move["moveId"]],
+            "attack": round(attacker.effective_atk, 3),
+            "defense": round(defender.effective_def, 3)
+        }
+    
+    def _choose_shield(self, shield_ai: ShieldAI, defender: BattlePokemon, move: Dict[str, Any], damage: int) -> bool:
+        """Ask the defender's shield AI whether to block a charged move"""
+        if defender.shields <= 0 or damage <= 0:
+            return False
+        return shield_ai.should_shield(
+            damage=damage,
+            current_hp=defender.hp,
+            max_hp=defender.max_hp,
+            move_type=move["type"],
+            defender_types=defender.data.get("types", []),
+            remaining_shields=defender.shields,
+            is_charged_move=True
+        )
+    
+    def _resolve_charged_move(self, ctx: BattleContext, attacker: BattlePokemon, defender: BattlePokemon,
+                              move: Dict[str, Any], damage: int, should_shield: bool, shield_strategy: Optional[str], turn: int) -> Optional[Dict[str, Any]]:
+        """Apply a charged move with a decided shield choice and return its timeline entry (None if ctx.detail is 'none')"""
         shield_used = False
-        if defender.shields > 0 and damage > 0:
-            should_shield = shield_ai.should_shield(
-                damage=damage,
-                current_hp=defender.hp,
-                max_hp=defender.max_hp,
-                move_type=move["type"],
-                defender_types=defender.data.get("types", []),
-                remaining_shields=defender.shields,
-                is_charged_move=True
-            )
-            
-            if should_shield:
-                shield_used = defender.use_shield()
-                damage = 0
-                print(f"[DEBUG] {defender.data['speciesId']} used shield (strategy: {shield_ai.strategy})")
+        if should_shield:
+            shield_used = defender.use_shield()
+            damage = 0
         
         # Apply damage
         if not shield_used:
@@ -547,19 +1500,20 @@ class BattleSimulator:
         
         # Use energy
         attacker.use_energy(move["energy"])
-        print(f"[DEBUG] {attacker.data['speciesId']} current energy: {attacker.energy}")
         
         # Apply buffs if any
         buff_applied = False
         if move.get("buffs"):
             chance = float(move.get("buffApplyChance", "0"))
-            if random.random() < chance:
+            if ctx.roll_buff(chance):
                 if move.get("buffTarget") == "self":
                     attacker.apply_buff(move["buffs"][0], move["buffs"][1])
                 else:  # opponent
                     defender.apply_buff(move["buffs"][0], move["buffs"][1])
                 buff_applied = True
         
+        if ctx.detail == 'none':
+            return None
         return {
             "turn": turn,
             "type": "charged",
@@ -572,34 +1526,14 @@ class BattleSimulator:
             "defender_hp_remaining": defender.hp,
             "attacker_energy": attacker.energy,
             "buff_applied": buff_applied,
-            "shield_strategy": shield_ai.strategy if shield_used else None
+            "shield_strategy": shield_strategy if shield_used else None
         }
     
     def _calculate_damage(self, attacker: BattlePokemon, defender: BattlePokemon, move: Dict[str, Any]) -> int:
-        """Calculate damage using PvPoke's formula"""
-        # Get move type effectiveness
-        move_type = move["type"]
-        defender_types = defender.data.get("types", [])
-        effectiveness = TypeChart.get_effectiveness(move_type, defender_types)
-        
-        # Check for STAB
-        stab = DamageMultiplier.STAB if move_type in attacker.data.get("types", []) else 1.0
-        
-        # Calculate damage using PvPoke formula
-        raw_damage = (
-            move["power"] * 
-            stab * 
-            (attacker.get_effective_atk() / defender.get_effective_def()) * 
-            effectiveness * 
-            0.5 * 
-            DamageMultiplier.BONUS
-        )
-        damage = math.floor(raw_damage) + 1
-        
-        # Debug logging
-        print(f"[DEBUG] Damage calc for {move['name']}: power={move['power']}, stab={stab}, atk={attacker.get_effective_atk():.1f}, def={defender.get_effective_def():.1f}, effectiveness={effectiveness}, raw_damage={raw_damage:.3f}, final_damage={damage}")
-        
-        return max(1, damage)  # Minimum 1 damage
+        """Damage of one hit using PvPoke's formula, looked up in the matchup's damage table"""
+        if attacker.damage_vs is None:
+            attacker.face(defender)
+        return attacker.damage_vs[move["moveId"]][attacker.atk_row + defender.def_col]
     
     def _determine_winner(self, p1: BattlePokemon, p2: BattlePokemon) -> Tuple[str, float]:
         """Determine winner and calculate battle rating"""
@@ -612,4 +1546,475 @@ class BattleSimulator:
         else:
             # P1 wins
             battle_rating = min(1.0, p1.hp / p1.max_hp)  # Cap at 100%
-            return p1.data["speciesId"], battle_rating 
\ No newline at end of file
+            return p1.data["speciesId"], battle_rating 
+
+# Default limits of one simulate battle. Every fast move deals at least 1 damage,
+# so a real battle ends within the defender's max HP in turns, far below the cap
+MAX_BATTLE_TURNS = 10000
+BATTLE_TIME_BUDGET = 2.0
+
+# Default search budget for simulate_optimal. Matchups with chance buffs on both
+# sides (an Obstagoon mirror) can take millions of positions; those come back
+# incomplete after about a second rather than holding a web worker for longer
+OPTIMAL_NODE_BUDGET = 200000
+OPTIMAL_TIME_BUDGET = 1.0
+
+class OptimalPlaySearch:
+    """
+    Memoized minimax search over charged move and shield choices.
+    
+    P1 maximizes the battle rating (matchup_rating, 0-1000) and P2 minimizes
+    it. The engine's turn order is kept: after both fast moves, P1 throws a
+    charged move (or keeps charging) and P2 answers with a shield choice, then
+    P2 does the same. Buff rolls are chance nodes valued by their expectation.
+    
+    Positions are stored in a transposition table keyed on the phase plus hp,
+    energy, shields and buff stages of both sides, so different lines that
+    reach the same position are searched once. Fast-move-only stretches are
+    skipped in one step, like the event engine.
+    """
+    FAST = 'fast'  # Start of a turn, before fast moves
+    P1 = 'p1'      # P1 to decide on a charged move
+    P2 = 'p2'      # P2 to decide on a charged move
+    
+    def __init__(self, sim: 'BattleSimulator', ctx: BattleContext,
+                 optimal: Tuple[bool, bool] = (True, True),
+                 node_budget: int = OPTIMAL_NODE_BUDGET, time_budget: Optional[float] = OPTIMAL_TIME_BUDGET,
+                 seed=None):
+        self.sim = sim
+        self.ctx = ctx
+        self.p1 = ctx.p1
+        self.p2 = ctx.p2
+        # A side that is not optimal follows the simulator's heuristics
+        self.optimal = optimal
+        self.node_budget = node_budget
+        self.deadline = time.monotonic() + time_budget if time_budget else None
+        self.seed = seed
+        # (phase, state) -> (value, (moveId or None, defender shielded or None))
+        self.table: Dict[Tuple, Tuple[float, Optional[Tuple]]] = {}
+        self.nodes = 0
+        self.complete = True
+        # Which budget ran out ('node_budget' or 'time_budget'), and how many positions were played out instead
+        self.budget_exhausted: Optional[str] = None
+        self.playouts = 0
+    
+    def solve(self, state: Tuple) -> float:
+        """Minimax P1 rating of a battle starting from state"""
+        return self.value(self.FAST, state)
+    
+    def value(self, phase: str, state: Tuple) -> float:
+        """
+        Value of a position, searching it if it is not in the table yet.
+        
+        Positions are searched depth first on an explicit stack rather than
+        by recursion, since a line runs a few frames per turn: each frame is
+        a _search generator that yields the positions it needs the value of.
+        """
+        key = (phase, state)
+        entry = self.table.get(key)
+        if entry is not None:
+            return entry[0]
+        stack = [(key, self._search(phase, state))]
+        value = None
+        # A playout past its limits stops the search (see _playout); the value is then meaningless
+        while stack and not self.ctx.aborted:
+            key, frame = stack[-1]
+            try:
+                child = frame.send(value)
+            except StopIteration as done:
+                stack.pop()
+                self.table[key] = done.value
+                value = done.value[0]
+                continue
+            entry = self.table.get(child)
+            if entry is not None:
+                value = entry[0]
+            else:
+                stack.append((child, self._search(*child)))
+                value = None
+        return value
+    
+    def _search(self, phase: str, state: Tuple):
+        """Search one position: yields (phase, state) of the positions it needs and returns its table entry"""
+        # P2 still gets its charged move in a turn where P1 knocked it out
+        if phase != self.P2 and (state[0] <= 0 or state[5] <= 0):
+            return self._rating(state), None
+        if self._budget_spent():
+            self.complete = False
+            self.playouts += 1
+            return self._playout(phase, state), None
+        self.nodes += 1
+        if phase != self.FAST:
+            return (yield from self._decide(phase, state))
+        value = 0
+        for p, nxt_phase, nxt, _ in self._advance(state):
+            value += p * (yield nxt_phase, nxt)
+        return value, None
+    
+    def principal_line(self, state: Tuple) -> Tuple[List[Dict[str, Any]], Optional[Tuple]]:
+        """
+        Replay the best decisions from state, following the most likely buff rolls.
+        
+        Returns the charged moves thrown and the final state, or None as the
+        final state if the line runs into positions scored by heuristic play.
+        """
+        line = []
+        phase, turn = self.FAST, 0
+        while phase == self.P2 or (state[0] > 0 and state[5] > 0):
+            if phase == self.FAST:
+                _, phase, state, turns = max(self._advance(state), key=lambda branch: branch[0])
+                turn += turns
+                continue
+            entry = self.table.get((phase, state))
+            if entry is None or entry[1] is None:
+                return line, None
+            move_id, shielded = entry[1]
+            next_phase = self.P2 if phase == self.P1 else self.FAST
+            if move_id is not None:
+                attacker = self.p1 if phase == self.P1 else self.p2
+                move = next(m for m in attacker.charged_moves if m["moveId"] == move_id)
+                branches = self._charged_branches(phase, state, move, shielded, next_phase)
+                probability, _, state, _ = max(branches, key=lambda branch: branch[0])
+                line.append({
+                    "turn": turn,
+                    "player": phase,
+                    "move": move["name"],
+                    "shield_used": shielded,
+                    "p1_hp": state[0],
+                    "p2_hp": state[5]
+                })
+            phase = next_phase
+        return line, state
+    
+    def _budget_spent(self) -> bool:
+        if self.budget_exhausted is None:
+            if self.nodes >= self.node_budget:
+                self.budget_exhausted = 'node_budget'
+            # Checking the clock every node is measurable; every 256 is plenty
+            elif self.deadline is not None and self.nodes % 256 == 0 and time.monotonic() > self.deadline:
+                self.budget_exhausted = 'time_budget'
+        return self.budget_exhausted is not None
+    
+    def _rating(self, state: Tuple) -> int:
+        return matchup_rating({
+            'p1_final_hp': state[0], 'p1_max_hp': self.p1.max_hp,
+            'p2_final_hp': state[5], 'p2_max_hp': self.p2.max_hp
+        })
+    
+    def _decide(self, phase: str, state: Tuple):
+        """Best charged move choice (or waiting) for the side to act (a _search step)"""
+        side = 0 if phase == self.P1 else 1
+        attacker, defender = (self.p1, self.p2) if side == 0 else (self.p2, self.p1)
+        next_phase = self.P2 if phase == self.P1 else self.FAST
+        _restore_battle_state(self.p1, self.p2, state)
+        if self.optimal[side]:
+            options = []
+            for move in attacker.get_available_charged_moves():
+                if all(move["moveId"] != m["moveId"] for m in options):
+                    options.append(move)
+            options.append(None)
+        else:
+            options = [self.sim._choose_charged_move(attacker, defender)]
+        
+        best = None
+        for move in options:
+            if move is None:
+                choice = ((yield next_phase, state), (None, None))
+            else:
+                choice = yield from self._shield_reply(phase, state, move, next_phase,
+                                                       best[0] if best is not None else None)
+            if best is None or (choice[0] > best[0] if side == 0 else choice[0] < best[0]):
+                best = choice
+        return best
+    
+    def _shield_reply(self, phase: str, state: Tuple, move: Dict[str, Any], next_phase: str,
+                      bound: Optional[float] = None):
+        """
+        Value of a charged move after the defender's best (or heuristic) shield choice (a _search step).
+        
+        bound is the value the attacker already has from another option. Once
+        one shield choice holds the move to it, the move cannot be picked over
+        that option whatever the other choice is worth, so it is not searched.
+        """
+        side = 0 if phase == self.P1 else 1
+        attacker, defender = (self.p1, self.p2) if side == 0 else (self.p2, self.p1)
+        _restore_battle_state(self.p1, self.p2, state)
+        damage = self.sim._calculate_damage(attacker, defender, move)
+        if not self.optimal[1 - side]:
+            shields = [self.sim._choose_shield(self.ctx.shield_ai_for(defender), defender, move, damage)]
+        elif defender.shields > 0 and damage > 0:
+            shields = [True, False]
+        else:
+            shields = [False]
+        
+        best = None
+        for shield in shields:
+            value = 0
+            for p, nxt_phase, nxt, _ in self._charged_branches(phase, state, move, shield, next_phase):
+                value += p * (yield nxt_phase, nxt)
+            # The defender is the opposite side, so it wants the opposite extreme
+            if best is None or (value < best[0] if side == 0 else value > best[0]):
+                best = (value, (move["moveId"], shield))
+            if bound is not None and (best[0] <= bound if side == 0 else best[0] >= bound):
+                break
+        return best
+    
+    def _charged_branches(self, phase: str, state: Tuple, move: Dict[str, Any], shield: bool,
+                          next_phase: str) -> List[Tuple[float, str, Tuple, int]]:
+        """(probability, phase, state, turns) outcomes of a charged move, one per buff roll outcome"""
+        attacker, defender = (self.p1, self.p2) if phase == self.P1 else (self.p2, self.p1)
+        
+        def throw():
+            damage = self.sim._calculate_damage(attacker, defender, move)
+            self.sim._resolve_charged_move(self.ctx, attacker, defender, move, damage, shield, 'optimal', 0)
+            return next_phase, 0
+        return self._branches(state, throw)
+    
+    def _advance(self, state: Tuple) -> List[Tuple[float, str, Tuple, int]]:
+        """
+        (probability, phase, state, turns) outcomes of playing fast moves.
+        
+        Plays turns until a side faints, a side can afford a charged move, or
+        a turn rolled an uncertain buff.
+        """
+        p1, p2, sim, ctx = self.p1, self.p2, self.sim, self.ctx
+        
+        def fast_turns():
+            turns = 0
+            while True:
+                skip = sim._turns_until_next_event(p1, p2)
+                if skip > 0:
+                    turns = sim._apply_fast_stretch(p1, p2, turns, skip, None)
+                turns += 1
+                sim._process_fast_move(ctx, p1, p2, turns)
+                sim._process_fast_move(ctx, p2, p1, turns)
+                if p1.is_fainted() or p2.is_fainted():
+                    return self.FAST, turns
+                if p1.get_available_charged_moves() or p2.get_available_charged_moves():
+                    return self.P1, turns
+                if ctx.scripted_rolls.used:
+                    return self.FAST, turns
+        return self._branches(state, fast_turns)
+    
+    def _branches(self, state: Tuple, play) -> List[Tuple[float, str, Tuple, int]]:
+        """Run play() from state once per combination of uncertain buff roll outcomes"""
+        branches = []
+        prefixes = [[]]
+        while prefixes:
+            prefix = prefixes.pop()
+            _restore_battle_state(self.p1, self.p2, state)
+            rolls = _ScriptedRolls(prefix)
+            self.ctx.scripted_rolls = rolls
+            try:
+                phase, turns = play()
+            except _BranchNeeded:
+                prefixes.append(prefix + [True])
+                prefixes.append(prefix + [False])
+                continue
+            finally:
+                self.ctx.scripted_rolls = None
+            branches.append((rolls.probability, phase, _battle_state(self.p1, self.p2), turns))
+        return branches
+    
+    def _playout(self, phase: str, state: Tuple) -> int:
+        """
+        Score a position past the search budget by playing it out with the heuristics.
+        
+        Each playout is held to ctx.max_turns and all of them to ctx.deadline;
+        one that runs out sets ctx.aborted and is scored as even.
+        """
+        p1, p2, sim, ctx = self.p1, self.p2, self.sim, self.ctx
+        _restore_battle_state(p1, p2, state)
+        ctx.rng = random.Random(self.seed)
+        if phase == self.P1:
+            sim._process_charged_move(ctx, p1, p2, 0)
+        if phase in (self.P1, self.P2):
+            sim._process_charged_move(ctx, p2, p1, 0)
+        turn = 0
+        while not p1.is_fainted() and not p2.is_fainted():
+            if ctx.out_of_budget(turn):
+                return 500
+            turn += 1
+            sim._run_turn(ctx, turn, None)
+        return self._rating(_battle_state(p1, p2))
+
+def matchup_rating(result: Dict[str, Any]) -> int:
+    """
+    PvPoke-style battle rating from P1's perspective (0-1000, 500 = even).
+    
+    Half of the rating is damage dealt to P2, half is P1's remaining HP.
+    """
+    damage_dealt = (result['p2_max_hp'] - result['p2_final_hp']) / result['p2_max_hp']
+    hp_remaining = result['p1_final_hp'] / result['p1_max_hp']
+    return int(500 * damage_dealt + 500 * hp_remaining)
+
+def _earliest(*deadlines: Optional[float]) -> Optional[float]:
+    """The soonest of some time.monotonic() deadlines, ignoring None (no deadline)"""
+    return min((d for d in deadlines if d is not None), default=None)
+
+def _first_turn_below(hp: int, damage: int, threshold: float) -> Optional[int]:
+    """First turn k >= 1 with hp - k * damage < threshold, or None if hp never gets there"""
+    if hp < threshold:
+        return 1
+    if damage <= 0:
+        return None
+    turn = max(1, int((hp - threshold) // damage) + 1)
+    # Settle float rounding of the division against the exact comparison
+    while turn > 1 and hp - (turn - 1) * damage < threshold:
+        turn -= 1
+    while hp - turn * damage >= threshold:
+        turn += 1
+    return turn
+
+class _FastStretch:
+    """
+    Fast-move-only turns applied in bulk by the event engine, kept as one
+    timeline record. sides holds, for P1 then P2, (attacker id, defender id,
+    fast move, damage per hit, defender HP and attacker energy before the
+    stretch), which is all entries() needs to rebuild the per-hit entries.
+    """
+    __slots__ = ('first_turn', 'count', 'sides')
+    
+    def __init__(self, first_turn: int, count: int, sides: List[Tuple]):
+        self.first_turn = first_turn
+        self.count = count
+        self.sides = sides
+    
+    def entries(self):
+        for hits in range(1, self.count + 1):
+            turn = self.first_turn + hits - 1
+            for attacker_id, defender_id, move, damage, defender_hp, attacker_energy in self.sides:
+                if not move:
+                    yield {"turn": turn, "type": "fast", "attacker": attacker_id, "error": "No fast move"}
+                    continue
+                yield {
+                    "turn": turn,
+                    "type": "fast",
+                    "attacker": attacker_id,
+                    "defender": defender_id,
+                    "move": move["name"],
+                    "damage": damage,
+                    "energy_gained": move["energyGain"],
+                    "defender_hp_remaining": max(0, defender_hp - damage * hits),
+                    "attacker_energy": min(BattlePokemon.max_energy, attacker_energy + move["energyGain"] * hits),
+                    "buff_applied": False
+                }
+
+def _expand_timeline(timeline: List[Any]) -> List[Dict[str, Any]]:
+    """Timeline entries with every _FastStretch record expanded in place"""
+    expanded = []
+    for item in timeline:
+        if isinstance(item, _FastStretch):
+            expanded.extend(item.entries())
+        else:
+            expanded.append(item)
+    return expanded
+
+def _battle_state(p1: BattlePokemon, p2: BattlePokemon) -> Tuple:
+    """Hashable snapshot of everything that changes during a battle"""
+    return (p1.hp, p1.energy, p1.shields, p1.atk_buffs, p1.def_buffs,
+            p2.hp, p2.energy, p2.shields, p2.atk_buffs, p2.def_buffs)
+
+def _restore_battle_state(p1: BattlePokemon, p2: BattlePokemon, state: Tuple):
+    """Load a _battle_state snapshot back into both Pokemon"""
+    (p1.hp, p1.energy, p1.shields, p1.atk_buffs, p1.def_buffs,
+     p2.hp, p2.energy, p2.shields, p2.atk_buffs, p2.def_buffs) = state
+
+class _BranchNeeded(Exception):
+    """Raised when a scripted battle reaches an uncertain buff roll with no outcome chosen yet"""
+
+class _ScriptedRolls:
+    """Replays a fixed sequence of buff roll outcomes and tracks the path probability"""
+    def __init__(self, outcomes: List[bool]):
+        self.outcomes = outcomes
+        self.used = 0
+        self.probability = 1.0
+    
+    def roll(self, chance: float) -> bool:
+        chance = float(chance)
+        if chance <= 0:
+            return False
+        if chance >= 1:
+            return True
+        if self.used == len(self.outcomes):
+            raise _BranchNeeded()
+        outcome = self.outcomes[self.used]
+        self.used += 1
+        self.probability *= chance if outcome else 1 - chance
+        return outcome
+
+# Per-process simulator for Monte Carlo workers, set up once by _init_monte_carlo_worker
+_monte_carlo_worker = {}
+
+def _init_monte_carlo_worker(poke_data: PokeData):
+    """Build a simulator once per worker process, on the caller's data"""
+    _monte_carlo_worker['simulator'] = BattleSimulator(poke_data)
+
+def _monte_carlo_chunk(task) -> List[Tuple[int, int]]:
+    """Run a chunk of seeded battles in a worker process"""
+    battle_args, run_seeds = task
+    return _run_monte_carlo_seeds(_monte_carlo_worker['simulator'], battle_args, run_seeds)
+
+def _run_monte_carlo_seeds(sim: BattleSimulator, battle_args, run_seeds: List[int]) -> List[Tuple[int, int]]:
+    """Run one battle per seed, returning (winner side, P1 rating) pairs; side 0 is a tie or an aborted battle"""
+    p1_data, p2_data, p1_moves, p2_moves, p1_shields, p2_shields, settings = battle_args
+    deadline = settings.get('deadline')
+    outcomes = []
+    for run_seed in run_seeds:
+        # Past the caller's deadline no new run starts (the first always runs, so there is a result)
+        if outcomes and deadline is not None and time.monotonic() > deadline:
+            break
+        result = sim.simulate(p1_data, p2_data, p1_moves, p2_moves, p1_shields, p2_shields,
+                              settings=dict(settings, seed=run_seed))
+        if result.get('aborted') or (result['p1_final_hp'] <= 0 and result['p2_final_hp'] <= 0):
+            side = 0
+        elif result['p2_final_hp'] <= 0:
+            side = 1
+        else:
+            side = 2
+        outcomes.append((side, matchup_rating(result)))
+    return outcomes
+
+def _wilson_interval(successes: int, total: int, z: float = 1.96) -> List[float]:
+    """95% Wilson score interval for a binomial proportion"""
+    if total == 0:
+        return [0.0, 0.0]
+    p = successes / total
+    denom = 1 + z * z / total
+    centre = (p + z * z / (2 * total)) / denom
+    half = z * math.sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / denom
+    return [max(0.0, centre - half), min(1.0, centre + half)]
+
+def _aggregate_monte_carlo(outcomes: List[Tuple[int, int]], p1_id: str, p2_id: str, seed) -> Dict[str, Any]:
+    """Summarize Monte Carlo outcomes into probabilities, intervals and a rating histogram"""
+    runs = len(outcomes)
+    wins = {0: 0, 1: 0, 2: 0}
+    for side, _ in outcomes:
+        wins[side] += 1
+    ratings = [rating for _, rating in outcomes]
+    mean = sum(ratings) / runs
+    variance = sum((r - mean) ** 2 for r in ratings) / (runs - 1) if runs > 1 else 0.0
+    half_width = 1.96 * math.sqrt(variance / runs)
+    
+    # Histogram of P1 ratings in 100-point buckets (1000 falls in the top bucket)
+    distribution = {f"{low}-{low + 99}": 0 for low in range(0, 1000, 100)}
+    for rating in ratings:
+        low = min(rating, 999) // 100 * 100
+        distribution[f"{low}-{low + 99}"] += 1
+    
+    most_likely = max(wins, key=lambda side: wins[side])
+    winner = {0: "tie", 1: p1_id, 2: p2_id}[most_likely]
+    return {
+        "runs": runs,
+        "seed": seed,
+        "winner": winner,
+        "p1_win_probability": wins[1] / runs,
+        "p2_win_probability": wins[2] / runs,
+        "tie_probability": wins[0] / runs,
+        "p1_win_probability_ci": _wilson_interval(wins[1], runs),
+        "rating_mean": mean,
+        "rating_ci": [mean - half_width, mean + half_width],
+        "rating_min": min(ratings),
+        "rating_max": max(ratings),
+        "rating_distribution": distribution
+    }
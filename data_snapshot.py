@@ -0,0 +1,83 @@
+import hashlib
+import logging
+import os
+import pickle
+import struct
+from typing import Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Directory holding parsed-data snapshots (set DATA_SNAPSHOT_DIR to '' to disable them)
+SNAPSHOT_DIR = os.environ.get(
+    'DATA_SNAPSHOT_DIR', os.path.join(os.path.dirname(__file__), 'data_cache')
+)
+
+# File layout: magic, format version, source signature (size, mtime, sha1), pickled payload.
+# Bump FORMAT_VERSION whenever a projection changes so old snapshots are rebuilt.
+MAGIC = b'EWDS'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sHqq20s')
+
+def snapshot_path(kind: str, source_path: str, snapshot_dir: str = SNAPSHOT_DIR) -> str:
+    """Path of the snapshot for one parsed view of a source file"""
+    source_key = hashlib.sha1(os.path.abspath(source_path).encode('utf-8')).hexdigest()[:10]
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(snapshot_dir, f'{kind}-{name}-{source_key}.snap')
+
+def _file_sha1(path: str) -> bytes:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+def _read_snapshot(path: str, st: os.stat_result, source_path: str) -> Tuple[Optional[Any], bool]:
+    """(payload, mtime_matches) of a snapshot if it matches the source file, else (None, False)"""
+    try:
+        with open(path, 'rb') as f:
+            magic, version, size, mtime_ns, sha1 = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC or version != FORMAT_VERSION or size != st.st_size:
+                return None, False
+            # Same size but a new mtime (e.g. a fresh checkout): trust the content hash instead
+            mtime_matches = mtime_ns == st.st_mtime_ns
+            if not mtime_matches and sha1 != _file_sha1(source_path):
+                return None, False
+            return pickle.load(f), mtime_matches
+    except (OSError, EOFError, struct.error, pickle.UnpicklingError, AttributeError, ImportError):
+        return None, False
+
+def _write_snapshot(path: str, st: os.stat_result, source_path: str, payload: Any):
+    """Write a snapshot via a temp file + rename so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, st.st_size, st.st_mtime_ns, _file_sha1(source_path)))
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+def load_cached(kind: str, source_path: str, build: Callable[[str], Any],
+                snapshot_dir: Optional[str] = SNAPSHOT_DIR) -> Any:
+    """
+    Load build(source_path), served from a binary snapshot while the source is unchanged.
+
+    kind names the projection build() produces, so several views of one file
+    get separate snapshots. A snapshot is current when the source's size and
+    mtime match, or its SHA-1 does if only the mtime moved. Otherwise (or
+    with snapshot_dir None/'') the source is parsed with build() and the
+    snapshot is rewritten (as it is after a hash-only match, to record the
+    new mtime); failures to write it are only logged.
+    """
+    if not snapshot_dir:
+        return build(source_path)
+    st = os.stat(source_path)
+    path = snapshot_path(kind, source_path, snapshot_dir)
+    payload, mtime_matches = _read_snapshot(path, st, source_path)
+    if payload is not None and mtime_matches:
+        return payload
+    if payload is None:
+        payload = build(source_path)
+    try:
+        _write_snapshot(path, st, source_path, payload)
+    except OSError as e:
+        logger.warning("Could not write data snapshot %s: %s", path, e)
+    return payload
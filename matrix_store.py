@@ -0,0 +1,181 @@
+import argparse
+import array
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from battle_matrix import MatchupMatrix, compute_matchup_matrix
+from poke_data import PokeData
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the compiled matchup matrix files
+MATRIX_STORE_DIR = os.environ.get(
+    'MATRIX_STORE_DIR', os.path.join(os.path.dirname(__file__), 'matrix_cache')
+)
+
+# File layout: magic, format version, header length, JSON header, padding, uint16 ratings
+MAGIC = b'EWMM'
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct('<4sHI')
+_ALIGN = 8
+
+def matrix_store_path(cp_cap: int, store_dir: str = MATRIX_STORE_DIR) -> str:
+    """Path of the matrix file for a league"""
+    return os.path.join(store_dir, f'matchups-{cp_cap}.bin')
+
+def write_matrix_store(matrix: MatchupMatrix, path: str):
+    """
+    Write a matchup matrix as a compact binary file.
+
+    Ratings are stored as little-endian uint16 indexed by
+    (row * N + col) * S + scenario, so all shield scenarios for one pairing
+    are adjacent. The file is written to a temp path and renamed into place
+    so readers never see a partial file.
+    """
+    n = len(matrix.species_ids)
+    s = len(matrix.scenarios)
+    header = json.dumps({
+        'cp_cap': matrix.cp_cap,
+        'data_version': matrix.data_version,
+        'species_ids': matrix.species_ids,
+        'scenarios': [list(scenario) for scenario in matrix.scenarios],
+    }, separators=(',', ':')).encode('utf-8')
+    padding = (-(_PREAMBLE.size + len(header))) % _ALIGN
+
+    ratings = array.array('H', bytes(2 * n * n * s))
+    for si, scenario in enumerate(matrix.ratings):
+        for row, values in enumerate(scenario):
+            base = row * n * s + si
+            for col, rating in enumerate(values):
+                ratings[base + col * s] = max(0, min(65535, int(rating)))
+    if sys.byteorder != 'little':
+        ratings.byteswap()
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.write(b'\0' * padding)
+        f.write(ratings.tobytes())
+    os.replace(tmp_path, path)
+
+class MatrixStore:
+    """Read-only, memory-mapped view of a matchup matrix file"""
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            # MAP_SHARED read-only pages are shared by every process mapping the file
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_len = _PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"Not a matchup matrix file (or unsupported version): {path}")
+        header = json.loads(self._mm[_PREAMBLE.size:_PREAMBLE.size + header_len].decode('utf-8'))
+        self.cp_cap = header['cp_cap']
+        self.data_version = header['data_version']
+        self.species_ids = header['species_ids']
+        self.scenarios = [tuple(scenario) for scenario in header['scenarios']]
+        self.index = {sid: i for i, sid in enumerate(self.species_ids)}
+        self._scenario_index = {scenario: i for i, scenario in enumerate(self.scenarios)}
+        self._n = len(self.species_ids)
+        self._s = len(self.scenarios)
+        header_end = _PREAMBLE.size + header_len
+        self._offset = header_end + (-header_end) % _ALIGN
+        self.mtime = os.stat(path).st_mtime_ns
+
+    def rating(self, p1_id: str, p2_id: str, shields: Tuple[int, int] = (1, 1)) -> Optional[int]:
+        """Rating (0-1000) of p1 vs p2 in a shield scenario, or None if not in the matrix"""
+        row = self.index.get(p1_id)
+        col = self.index.get(p2_id)
+        scenario = self._scenario_index.get(tuple(shields))
+        if row is None or col is None or scenario is None:
+            return None
+        position = (row * self._n + col) * self._s + scenario
+        return struct.unpack_from('<H', self._mm, self._offset + 2 * position)[0]
+
+    def ratings_for(self, p1_id: str, p2_id: str) -> Optional[Dict[str, int]]:
+        """Ratings for every stored shield scenario, keyed 'p1-p2'"""
+        if p1_id not in self.index or p2_id not in self.index:
+            return None
+        return {f'{a}-{b}': self.rating(p1_id, p2_id, (a, b)) for a, b in self.scenarios}
+
+    def close(self):
+        self._mm.close()
+
+def read_store_version(path: str) -> Optional[str]:
+    """Read only the data_version from a matrix file header"""
+    try:
+        with open(path, 'rb') as f:
+            magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != MAGIC or version != FORMAT_VERSION:
+                return None
+            return json.loads(f.read(header_len).decode('utf-8')).get('data_version')
+    except (OSError, ValueError, struct.error):
+        return None
+
+def build_matrix_store(cp_cap: int, store_dir: str = MATRIX_STORE_DIR, force: bool = False,
+                       **matrix_kwargs: Any) -> Tuple[str, bool]:
+    """
+    Compute and write the matrix for a league unless the stored one is current.
+
+    Returns (path, rebuilt).
+    """
+    path = matrix_store_path(cp_cap, store_dir)
+    current_version = PokeData(cp_cap=cp_cap).data_version
+    if not force and read_store_version(path) == current_version:
+        return path, False
+    matrix = compute_matchup_matrix(cp_cap, **matrix_kwargs)
+    write_matrix_store(matrix, path)
+    return path, True
+
+class MatrixStoreRegistry:
+    """Per-league cache of open MatrixStore objects for the web app"""
+    def __init__(self, store_dir: str = MATRIX_STORE_DIR):
+        self.store_dir = store_dir
+        self._stores: Dict[int, MatrixStore] = {}
+        self._lock = threading.Lock()
+
+    def get(self, cp_cap: int, data_version: str) -> Optional[MatrixStore]:
+        """
+        Get the open store for a league if its file matches data_version.
+
+        Reopens the file if it was rebuilt on disk, and returns None when the
+        file is missing or stale so callers fall back to simulating.
+        """
+        path = matrix_store_path(cp_cap, self.store_dir)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            store = self._stores.get(cp_cap)
+            if store is None or store.mtime != mtime:
+                try:
+                    store = MatrixStore(path)
+                except (OSError, ValueError) as e:
+                    logger.warning("Could not open matchup matrix %s: %s", path, e)
+                    return None
+                # Old maps are left for the garbage collector; in-flight lookups may still hold them
+                self._stores[cp_cap] = store
+        if store.data_version != data_version:
+            return None
+        return store
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the memory-mapped matchup matrix files')
+    parser.add_argument('--cp-cap', type=int, nargs='+', default=[1500])
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--store-dir', default=MATRIX_STORE_DIR)
+    parser.add_argument('--force', action='store_true', help='Rebuild even if the data has not changed')
+    args = parser.parse_args()
+
+    for cp_cap in args.cp_cap:
+        path, rebuilt = build_matrix_store(cp_cap, args.store_dir, force=args.force, processes=args.processes)
+        print(f"CP {cp_cap}: {'rebuilt' if rebuilt else 'up to date'} -> {path}")
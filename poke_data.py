@@ -1,31 +1,56 @@
+import copy
+import hashlib
 import json
+import logging
 import os
 from typing import List, Dict, Any, Optional
 
+from data_snapshot import SNAPSHOT_DIR, load_cached
+
+logger = logging.getLogger(__name__)
+
+# PvPoke checkout: the pvpoke submodule unless PVPOKE_DIR points at another copy (such as test data)
+PVPOKE_DIR = os.environ.get('PVPOKE_DIR') or os.path.join(os.path.dirname(__file__), 'pvpoke')
+
 # Path templates for PvPoke data
-GAMEMASTER_PATH = os.path.join(
-    os.path.dirname(__file__), 'pvpoke', 'src', 'data', 'gamemaster.json'
-)
-MOVES_PATH = os.path.join(
-    os.path.dirname(__file__), 'pvpoke', 'src', 'data', 'gamemaster', 'moves.json'
-)
-RANK1_PATH_TEMPLATE = os.path.join(
-    os.path.dirname(__file__), 'pvpoke', 'src', 'data', 'rankings', 'all', 'overall', 'rankings-{}.json'
-)
+GAMEMASTER_PATH = os.path.join(PVPOKE_DIR, 'src', 'data', 'gamemaster.json')
+MOVES_PATH = os.path.join(PVPOKE_DIR, 'src', 'data', 'gamemaster', 'moves.json')
+RANK1_PATH_TEMPLATE = os.path.join(PVPOKE_DIR, 'src', 'data', 'rankings', 'all', 'overall', 'rankings-{}.json')
+
+# Gamemaster fields the app and simulator read; everything else is dropped at parse time
+POKEMON_FIELDS = ('dex', 'speciesName', 'speciesId', 'baseStats', 'types', 'fastMoves', 'chargedMoves',
+                  'tags', 'defaultIVs')
 
 class PokeData:
-    def __init__(self, gamemaster_path: str = GAMEMASTER_PATH, moves_path: str = MOVES_PATH, cp_cap: int = 1500):
-        with open(gamemaster_path, encoding='utf-8') as f:
-            data = json.load(f)
-        self.pokemon = self._extract_pokemon_list(data)
-        with open(moves_path, encoding='utf-8') as f:
-            self.moves = json.load(f)
+    def __init__(self, gamemaster_path: str = GAMEMASTER_PATH, moves_path: str = MOVES_PATH, cp_cap: int = 1500,
+                 snapshot_dir: Optional[str] = SNAPSHOT_DIR):
+        # Parsed data comes from binary snapshots while the JSON sources are unchanged
+        self.pokemon = load_cached('pokemon', gamemaster_path, self._parse_gamemaster, snapshot_dir)
+        self._build_indexes()
+        self.moves = load_cached('moves', moves_path, self._parse_json, snapshot_dir)
         self.moves_by_id = {move['moveId']: move for move in self.moves}
-        # Load rank 1 stats for the selected CP cap
+        self._source_paths = [gamemaster_path, moves_path]
+        self._snapshot_dir = snapshot_dir
+        self._load_league(cp_cap)
+
+    def for_league(self, cp_cap: int) -> 'PokeData':
+        """
+        A PokeData for another league that shares this one's species, moves and
+        indexes (treat them as read-only); only the rank 1 stats are loaded anew.
+        """
+        league = copy.copy(self)
+        league._load_league(cp_cap)
+        return league
+
+    def _load_league(self, cp_cap: int):
+        """Load rank 1 stats for the selected CP cap"""
         self.cp_cap = cp_cap
-        self.rank1_stats = self._load_rank1_stats(self._get_rank1_path(cp_cap))
+        rank1_path = self._get_rank1_path(cp_cap)
+        self.rank1_stats = self._load_rank1_stats(rank1_path, self._snapshot_dir)
         self.rank1_ivs = self._extract_rank1_ivs_from_gamemaster(self.pokemon, cp_cap)
-        print(f"[DEBUG] Loaded PvPoke rank 1 stats for CP cap: {cp_cap}")
+        # Identifies the exact league + source files this instance was built from
+        self.data_version = self._compute_data_version(self._source_paths + [rank1_path])
+        logger.debug("Loaded PvPoke rank 1 stats for CP cap: %s", cp_cap)
 
     def _get_rank1_path(self, cp_cap: int) -> str:
         # For Master League (no CP cap), use the 10000 CP rankings
@@ -33,6 +58,26 @@ class PokeData:
             return RANK1_PATH_TEMPLATE.format(10000)
         return RANK1_PATH_TEMPLATE.format(cp_cap)
 
+    def _compute_data_version(self, paths: List[str]) -> str:
+        """Build a short version string from the CP cap and source file mtimes/sizes"""
+        parts = [str(self.cp_cap)]
+        for path in paths:
+            try:
+                st = os.stat(path)
+                parts.append(f"{os.path.basename(path)}:{st.st_mtime_ns}:{st.st_size}")
+            except OSError:
+                parts.append(f"{os.path.basename(path)}:missing")
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+    def _parse_json(self, path: str) -> Any:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _parse_gamemaster(self, path: str) -> List[Dict[str, Any]]:
+        """Species list from the gamemaster, projected to POKEMON_FIELDS"""
+        pokemon = self._extract_pokemon_list(self._parse_json(path))
+        return [{k: p[k] for k in POKEMON_FIELDS if k in p} for p in pokemon]
+
     def _extract_pokemon_list(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
         for key, value in data.items():
             if isinstance(value, list) and len(value) > 0:
@@ -40,52 +85,51 @@ class PokeData:
                     return value
         return []
 
+    def _build_indexes(self):
+        """Build case-folded lookup indexes over self.pokemon once at load"""
+        self._by_species_id = {}
+        self._by_name = {}
+        self._by_type = {}
+        self._by_move = {}
+        types = set()
+        moves = set()
+        for p in self.pokemon:
+            # The first entry wins, as with a front-to-back scan
+            self._by_species_id.setdefault(p.get('speciesId', '').lower(), p)
+            self._by_name.setdefault(p.get('speciesName', '').lower(), p)
+            for type_lower in dict.fromkeys(t.lower() for t in p.get('types', [])):
+                self._by_type.setdefault(type_lower, []).append(p)
+            for move_lower in dict.fromkeys(m.lower() for m in p.get('fastMoves', []) + p.get('chargedMoves', [])):
+                self._by_move.setdefault(move_lower, []).append(p)
+            types.update(p.get('types', []))
+            moves.update(p.get('fastMoves', []))
+            moves.update(p.get('chargedMoves', []))
+        self._all_types = sorted(types)
+        self._all_moves = sorted(moves)
+
     def get_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         """Get Pokémon by species name (case-insensitive)"""
-        name_lower = name.lower()
-        for p in self.pokemon:
-            if p.get('speciesName', '').lower() == name_lower:
-                return p
-        return None
+        return self._by_name.get(name.lower())
 
     def get_by_species_id(self, species_id: str) -> Optional[Dict[str, Any]]:
         """Get Pokémon by species ID (case-insensitive)"""
-        species_id_lower = species_id.lower()
-        for p in self.pokemon:
-            if p.get('speciesId', '').lower() == species_id_lower:
-                return p
-        return None
+        return self._by_species_id.get(species_id.lower())
 
     def get_by_type(self, type_name: str) -> List[Dict[str, Any]]:
         """Get all Pokémon of a specific type"""
-        type_lower = type_name.lower()
-        return [p for p in self.pokemon if type_lower in [t.lower() for t in p.get('types', [])]]
+        return list(self._by_type.get(type_name.lower(), []))
 
     def get_by_move(self, move_id: str) -> List[Dict[str, Any]]:
         """Get all Pokémon that can learn a specific move"""
-        move_lower = move_id.lower()
-        result = []
-        for p in self.pokemon:
-            fast_moves = [m.lower() for m in p.get('fastMoves', [])]
-            charged_moves = [m.lower() for m in p.get('chargedMoves', [])]
-            if move_lower in fast_moves or move_lower in charged_moves:
-                result.append(p)
-        return result
+        return list(self._by_move.get(move_id.lower(), []))
 
     def get_all_types(self) -> List[str]:
-        """Get all unique types"""
-        types = set()
-        for p in self.pokemon:
-            types.update(p.get('types', []))
-        return sorted(list(types))
+        """Get all unique types (shared sorted list; do not modify)"""
+        return self._all_types
 
     def get_all_moves(self) -> List[str]:
-        """Get all unique move IDs"""
-        moves = set()
-        for p in self.pokemon:
-            moves.update(p.get('fastMoves', []))
-            moves.update(p.get('chargedMoves', []))
-        return sorted(list(moves))
+        """Get all unique move IDs (shared sorted list; do not modify)"""
+        return self._all_moves
 
     def get_move_details(self, move_id: str) -> Optional[Dict[str, Any]]:
         """Get detailed move information by move ID"""
@@ -136,12 +180,14 @@ class PokeData:
             'charged_moves': charged_moves
         }
 
-    def _load_rank1_stats(self, path: str) -> Dict[str, Any]:
+    def _load_rank1_stats(self, path: str, snapshot_dir: Optional[str] = SNAPSHOT_DIR) -> Dict[str, Any]:
         if not os.path.exists(path):
-            print(f"[DEBUG] Rank 1 stats file not found for path: {path}")
+            logger.debug("Rank 1 stats file not found for path: %s", path)
             return {}
-        with open(path, encoding='utf-8') as f:
-            data = json.load(f)
+        return load_cached('rank1', path, self._parse_rank1_stats, snapshot_dir)
+
+    def _parse_rank1_stats(self, path: str) -> Dict[str, Any]:
+        data = self._parse_json(path)
         stats = {}
         for entry in data:
             sid = entry.get('speciesId')
@@ -156,7 +202,8 @@ class PokeData:
                 'def': s.get('def'),
                 'hp': s.get('hp'),
                 'product': s.get('product'),
-                'ivs': ivs
+                'ivs': ivs,
+                'moveset': entry.get('moveset', [])
             }
         return stats
 
@@ -187,6 +234,23 @@ class PokeData:
                     }
         return stats
 
+    def get_default_moveset(self, species_id: str) -> Optional[Dict[str, str]]:
+        """Get the PvPoke recommended moveset, falling back to the first learnable moves"""
+        p = self.get_by_species_id(species_id)
+        if not p or not p.get('fastMoves'):
+            return None
+        fast_moves = p.get('fastMoves', [])
+        charged_moves = p.get('chargedMoves', [])
+        ranked = (self.rank1_stats.get(p['speciesId']) or {}).get('moveset', [])
+        if ranked and ranked[0] in fast_moves and all(m in charged_moves for m in ranked[1:3]):
+            fast, charged = ranked[0], list(ranked[1:3])
+        else:
+            fast, charged = fast_moves[0], charged_moves[:2]
+        moveset = {'fast': fast}
+        for i, move_id in enumerate(charged, start=1):
+            moveset[f'charged{i}'] = move_id
+        return moveset
+
     def get_rank1_stats(self, species_id: str) -> Optional[Dict[str, Any]]:
         sid = species_id.lower()
         stats = self.rank1_stats.get(sid)
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# SQLite file shared by every worker process (set BATTLE_CACHE_PATH to '' to keep results in memory only)
+BATTLE_CACHE_PATH = os.environ.get(
+    'BATTLE_CACHE_PATH', os.path.join(os.path.dirname(__file__), 'result_cache', 'battles.sqlite3')
+)
+# Results kept decoded-ready in each process, and rows kept on disk before the oldest are dropped
+BATTLE_CACHE_LRU_SIZE = 4096
+BATTLE_CACHE_MAX_ROWS = 200000
+
+# Modules whose code decides a cached result or its key
+_VERSIONED_SOURCES = ('battle_sim.py', 'batch_sim.py', 'poke_data.py', 'result_cache.py')
+
+def _source_version() -> int:
+    """Hash of the simulator sources, small enough for SQLite's user_version"""
+    digest = hashlib.sha256()
+    for name in _VERSIONED_SOURCES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as f:
+            digest.update(f.read())
+    return int(digest.hexdigest()[:7], 16)
+
+# Any change to the simulator's code changes this, so rows cached by an older deploy are dropped
+SIMULATOR_VERSION = _source_version()
+# Settings that change how a battle is computed but never its result
+_UNKEYED_SETTINGS = ('processes', 'engine')
+
+def battle_key(cp_cap: int, data_version: str, p1_id: str, p2_id: str, p1_moves: Dict[str, str],
+               p2_moves: Dict[str, str], p1_shields: int, p2_shields: int, settings: Dict[str, Any]) -> str:
+    """
+    Content hash of a battle request: league, data version, both species and
+    movesets, shields and every setting that affects the result (shield AIs,
+    seed, mode...), in a canonical JSON form so equal requests hash equally.
+    """
+    keyed_settings = {k: v for k, v in settings.items() if k not in _UNKEYED_SETTINGS}
+    keyed_settings.setdefault('p1_shield_ai', 'smart_30')
+    keyed_settings.setdefault('p2_shield_ai', 'smart_30')
+    movesets = [{slot: moves.get(slot) for slot in ('fast', 'charged1', 'charged2')} for moves in (p1_moves, p2_moves)]
+    canonical = json.dumps([SIMULATOR_VERSION, cp_cap, data_version, p1_id, p2_id, movesets,
+                            p1_shields, p2_shields, keyed_settings], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class BattleResultCache:
+    """
+    Battle results by battle_key: an in-process LRU in front of a SQLite file.
+
+    Every worker process opens the same file (in WAL mode, so readers never
+    wait on a writer) and results survive restarts. Rows are tagged with
+    their league's data version; the first time a process sees a league at a
+    new version, rows of other versions of that league are deleted, so
+    results never outlive the gamemaster and rankings they came from. A
+    file written by different simulator code (SIMULATOR_VERSION, kept as
+    its user_version) is emptied when opened. Results are stored as JSON,
+    so callers always get a fresh copy. SQLite errors are logged and
+    treated as misses; the cache never fails a request.
+    """
+    def __init__(self, path: Optional[str] = BATTLE_CACHE_PATH, lru_size: int = BATTLE_CACHE_LRU_SIZE,
+                 max_rows: int = BATTLE_CACHE_MAX_ROWS):
+        self.path = path
+        self.lru_size = lru_size
+        self.max_rows = max_rows
+        self._lru: 'OrderedDict[str, str]' = OrderedDict()
+        self._versions: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        # Opened lazily, and again after a fork: connections must not cross processes
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._writes = 0
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'errors': 0}
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS results ('
+                     'key TEXT PRIMARY KEY, cp_cap INTEGER NOT NULL, data_version TEXT NOT NULL, result TEXT NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS results_league ON results (cp_cap, data_version)')
+        if conn.execute('PRAGMA user_version').fetchone()[0] != SIMULATOR_VERSION:
+            conn.execute('DELETE FROM results')
+            conn.execute(f'PRAGMA user_version={SIMULATOR_VERSION}')
+        self._conn, self._pid = conn, os.getpid()
+        self._versions.clear()
+        return conn
+
+    def _check_version(self, conn: sqlite3.Connection, cp_cap: int, data_version: str):
+        """Drop a league's rows from other data versions the first time this version is seen"""
+        if self._versions.get(cp_cap) == data_version:
+            return
+        deleted = conn.execute('DELETE FROM results WHERE cp_cap = ? AND data_version != ?',
+                               (cp_cap, data_version)).rowcount
+        if deleted:
+            logger.info("Dropped %d cached battles of an old data version for CP cap %s", deleted, cp_cap)
+        self._versions[cp_cap] = data_version
+
+    def _remember(self, key: str, text: str):
+        self._lru[key] = text
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, cp_cap: int, data_version: str, key: str) -> Optional[Dict[str, Any]]:
+        """The cached result for a battle_key, or None"""
+        with self._lock:
+            text = self._lru.get(key)
+            if text is not None:
+                self._lru.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return json.loads(text)
+            try:
+                conn = self._connect()
+                if conn is not None:
+                    self._check_version(conn, cp_cap, data_version)
+                    row = conn.execute('SELECT result FROM results WHERE key = ?', (key,)).fetchone()
+                    if row is not None:
+                        self._remember(key, row[0])
+                        self.counters['disk_hits'] += 1
+                        return json.loads(row[0])
+            except (sqlite3.Error, OSError) as e:
+                self.counters['errors'] += 1
+                logger.warning("Battle cache read failed: %s", e)
+            self.counters['misses'] += 1
+            return None
+
+    def put(self, cp_cap: int, data_version: str, key: str, result: Dict[str, Any]):
+        """Store a result under its battle_key"""
+        text = json.dumps(result, separators=(',', ':'))
+        with self._lock:
+            self._remember(key, text)
+            self.counters['stores'] += 1
+            try:
+                conn = self._connect()
+                if conn is None:
+                    return
+                self._check_version(conn, cp_cap, data_version)
+                conn.execute('INSERT OR REPLACE INTO results (key, cp_cap, data_version, result) VALUES (?, ?, ?, ?)',
+                             (key, cp_cap, data_version, text))
+                # Rows are trimmed oldest first (rowid order is insertion order), now and then
+                self._writes += 1
+                if self._writes % 1000 == 0:
+                    conn.execute('DELETE FROM results WHERE rowid <= (SELECT MAX(rowid) FROM results) - ?',
+                                 (self.max_rows,))
+            except (sqlite3.Error, OSError) as e:
+                self.counters['errors'] += 1
+                logger.warning("Battle cache write failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        """This process's hit/miss counters plus the size of both layers"""
+        with self._lock:
+            stats = dict(self.counters)
+            lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+            stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+            stats['memory_entries'] = len(self._lru)
+            stats['disk_entries'] = None
+            try:
+                conn = self._connect()
+                if conn is not None:
+                    stats['disk_entries'] = conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            except (sqlite3.Error, OSError) as e:
+                logger.warning("Battle cache stats failed: %s", e)
+            stats['pid'] = os.getpid()
+            return stats
+
+    def clear(self):
+        """Drop every cached result, in memory and on disk"""
+        with self._lock:
+            self._lru.clear()
+            try:
+                conn = self._connect()
+                if conn is not None:
+                    conn.execute('DELETE FROM results')
+            except (sqlite3.Error, OSError) as e:
+                logger.warning("Battle cache clear failed: %s", e)
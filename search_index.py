@@ -0,0 +1,272 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+# Longest n-gram kept in the substring postings; longer queries intersect trigrams
+NGRAM_SIZE = 3
+# Typo-tolerant results returned when nothing contains the query
+FUZZY_LIMIT = 5
+
+def max_typo_distance(length: int) -> int:
+    """Edits allowed for a query of this length (short queries would match almost anything)"""
+    if length <= 2:
+        return 0
+    if length <= 5:
+        return 1
+    return 2
+
+def normalize(text: str) -> str:
+    """Normalize a name or query for matching: lowercase, no spaces or hyphens"""
+    return text.lower().replace(' ', '').replace('-', '')
+
+def _ngrams(text: str, n: int) -> set:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+def _pattern_masks(pattern: str) -> Dict[str, int]:
+    """Bit mask of the positions of each character in pattern"""
+    masks: Dict[str, int] = {}
+    for i, ch in enumerate(pattern):
+        masks[ch] = masks.get(ch, 0) | (1 << i)
+    return masks
+
+def _edit_distance(masks: Dict[str, int], length: int, text: str) -> int:
+    """Levenshtein distance between a pattern (as _pattern_masks) and text, bit-parallel (Myers/Hyyrö)"""
+    if length == 0:
+        return len(text)
+    full = (1 << length) - 1
+    top = 1 << (length - 1)
+    pv, mv, score = full, 0, length
+    for ch in text:
+        eq = masks.get(ch, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & top:
+            score += 1
+        elif mh & top:
+            score -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return score
+
+def levenshtein(a: str, b: str) -> int:
+    """Edit distance between two strings"""
+    return _edit_distance(_pattern_masks(a), len(a), b)
+
+def _char_set(text: str) -> int:
+    mask = 0
+    for ch in text:
+        mask |= 1 << ord(ch)
+    return mask
+
+class _BKNode:
+    __slots__ = ('word', 'children', 'chars', 'max_edge')
+
+    def __init__(self, word: str):
+        self.word = word
+        self.children: Dict[int, '_BKNode'] = {}
+        self.chars = _char_set(word)
+        self.max_edge = 0
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Levenshtein distance.
+
+    Each child edge is labelled with its distance to the parent word, so the
+    triangle inequality rules out every subtree whose edge is further than
+    max_distance from the query's distance to the parent. Nodes whose
+    character sets or lengths already differ by more than a match (or any
+    child) could allow are skipped without computing the distance.
+    """
+    def __init__(self, words=()):
+        self.root: '_BKNode' = None
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str):
+        if self.root is None:
+            self.root = _BKNode(word)
+            self.size = 1
+            return
+        masks = _pattern_masks(word)
+        node = self.root
+        while True:
+            distance = _edit_distance(masks, len(word), node.word)
+            if distance == 0:
+                return
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _BKNode(word)
+                node.max_edge = max(node.max_edge, distance)
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, str]]:
+        """All (distance, word) pairs within max_distance of word"""
+        if self.root is None:
+            return []
+        masks = _pattern_masks(word)
+        length = len(word)
+        chars = _char_set(word)
+        matches = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            # Lower bounds on the distance: length difference and characters missing on either side
+            bound = max(abs(len(node.word) - length),
+                        (chars & ~node.chars).bit_count(), (node.chars & ~chars).bit_count())
+            if bound > max_distance + node.max_edge:
+                continue
+            distance = _edit_distance(masks, length, node.word)
+            if distance <= max_distance:
+                matches.append((distance, node.word))
+            children = node.children
+            for edge in range(max(1, distance - max_distance), min(distance + max_distance, node.max_edge) + 1):
+                child = children.get(edge)
+                if child is not None:
+                    stack.append(child)
+        return matches
+
+def _score(ranking: Dict[str, Any]) -> float:
+    """PvPoke score as a float; CSV fallback rankings store it as a string"""
+    try:
+        return float(ranking.get('score', 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+class SearchIndex:
+    """
+    Autocomplete index over species names and IDs.
+
+    A species matches when the normalized query is a substring of its
+    normalized name or ID. Prefix matches come from a trie whose nodes hold
+    their species already sorted by rank; other substring matches come from
+    n-gram postings (1- to 3-grams) verified against the names. Results are
+    ranked prefix matches first, then by PvPoke score, then gamemaster order.
+    When nothing contains the query, a BK-tree finds the closest names within
+    a few edits instead. An LRU of per-query results sits in front of it all.
+    """
+    def __init__(self, pokemon: List[Dict[str, Any]], rankings: Dict[str, Dict[str, Any]],
+                 cache_size: int = 4096):
+        self.results: List[Dict[str, Any]] = []
+        self.keys: List[Tuple[str, ...]] = []
+        scores = []
+        for p in pokemon:
+            species_id = p['speciesId']
+            self.results.append({
+                'name': species_id,
+                'readable_name': p['speciesName'],
+                'sprite': f"/static/sprites/{species_id}.png",
+                'types': p.get('types', [])
+            })
+            self.keys.append(tuple(dict.fromkeys((normalize(p.get('speciesName', '')), normalize(species_id)))))
+            scores.append(_score(rankings.get(species_id.lower(), {})))
+        # rank[i] sorts entries by score (best first), then gamemaster order
+        order = sorted(range(len(self.results)), key=lambda i: (-scores[i], i))
+        self.rank = [0] * len(order)
+        for position, i in enumerate(order):
+            self.rank[i] = position
+
+        self._trie: Dict[str, Any] = {}
+        self._postings: Dict[str, List[int]] = {}
+        for i in order:
+            for key in self.keys[i]:
+                self._add_to_trie(key, i)
+            grams = set()
+            for key in self.keys[i]:
+                for n in range(1, NGRAM_SIZE + 1):
+                    grams |= _ngrams(key, n)
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(i)
+
+        # Typo fallback: every distinct normalized key, mapped back to its entries
+        self._entries_by_key: Dict[str, List[int]] = {}
+        for i in order:
+            for key in self.keys[i]:
+                self._entries_by_key.setdefault(key, []).append(i)
+        self._bk_tree = BKTree(self._entries_by_key)
+
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[Tuple[str, int], List[int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _add_to_trie(self, key: str, i: int):
+        """Add entry i under every prefix of key; entries arrive in rank order"""
+        node = self._trie
+        for ch in key:
+            node = node.setdefault(ch, {'': []})
+            if not node[''] or node[''][-1] != i:
+                node[''].append(i)
+
+    def _prefix_matches(self, query: str) -> List[int]:
+        node = self._trie
+        for ch in query:
+            node = node.get(ch)
+            if node is None:
+                return []
+        return node['']
+
+    def _substring_matches(self, query: str) -> List[int]:
+        """Entries containing query anywhere, in rank order"""
+        if len(query) <= NGRAM_SIZE:
+            return self._postings.get(query, [])
+        postings = []
+        for gram in _ngrams(query, NGRAM_SIZE):
+            posting = self._postings.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        matches = [i for i in candidates if any(query in key for key in self.keys[i])]
+        return sorted(matches, key=self.rank.__getitem__)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Top matches for a raw query as ready-to-serialize dicts (shared; do not modify)"""
+        normalized = normalize(query)
+        if not normalized:
+            return []
+        key = (normalized, limit)
+        with self._lock:
+            ids = self._cache.get(key)
+            if ids is not None:
+                self._cache.move_to_end(key)
+        if ids is None:
+            ids = self._search_ids(normalized, limit)
+            with self._lock:
+                self._cache[key] = ids
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [self.results[i] for i in ids]
+
+    def _search_ids(self, normalized: str, limit: int) -> List[int]:
+        ids = list(self._prefix_matches(normalized)[:limit])
+        if len(ids) < limit:
+            seen = set(ids)
+            for i in self._substring_matches(normalized):
+                if i not in seen:
+                    ids.append(i)
+                    if len(ids) == limit:
+                        break
+        if not ids:
+            ids = self._fuzzy_ids(normalized, min(limit, FUZZY_LIMIT))
+        return ids
+
+    def _fuzzy_ids(self, normalized: str, limit: int) -> List[int]:
+        """Closest entries by edit distance, trying one edit before allowing more"""
+        for distance in range(1, max_typo_distance(len(normalized)) + 1):
+            matches = self._bk_tree.search(normalized, distance)
+            if matches:
+                best = {}
+                for d, key in matches:
+                    for i in self._entries_by_key[key]:
+                        best[i] = min(d, best.get(i, d))
+                return sorted(best, key=lambda i: (best[i], self.rank[i]))[:limit]
+        return []
+
@@ -89,7 +89,7 @@ document.addEventListener('keydown', (e) => {
 
 async function searchPokemon(query) {
     try {
-        const response = await fetch(`/api/search/${encodeURIComponent(query)}`);
+        const response = await fetch(`/api/search/${encodeURIComponent(query)}?cp_cap=${battleSimulationState.cpCap}`);
         const data = await response.json();
         
         if (data.error) {
@@ -134,7 +134,7 @@ async function getPokemonData(name) {
     hidePokemonInfo();
     
     try {
-        const response = await fetch(`/api/pokemon/${encodeURIComponent(name)}`);
+        const response = await fetch(`/api/pokemon/${encodeURIComponent(name)}?cp_cap=${battleSimulationState.cpCap}`);
         const data = await response.json();
         
         if (data.error) {
@@ -415,7 +415,7 @@ teamModalSearch.addEventListener('input', (e) => {
         return;
     }
     teamModalSearchTimeout = setTimeout(() => {
-        fetch(`/api/search/${encodeURIComponent(query)}`)
+        fetch(`/api/search/${encodeURIComponent(query)}?cp_cap=${battleSimulationState.cpCap}`)
             .then(res => res.json())
             .then(data => {
                 if (data.error) {
@@ -458,7 +458,7 @@ window.openMoveSelector = function(slotNumber, currentMoveName, moveClass) {
     }
     
     // Use only speciesId for API calls
-    fetch(`/api/pokemon/${encodeURIComponent(pokemon.speciesId)}/moves`)
+    fetch(`/api/pokemon/${encodeURIComponent(pokemon.speciesId)}/moves?cp_cap=${battleSimulationState.cpCap}`)
         .then(res => res.json())
         .then(data => {
             if (data.error) {
@@ -552,7 +552,7 @@ window.selectMove = function(moveName) {
     }
     
     // Use only speciesId for API calls
-    fetch(`/api/pokemon/${encodeURIComponent(pokemon.speciesId)}/moves`)
+    fetch(`/api/pokemon/${encodeURIComponent(pokemon.speciesId)}/moves?cp_cap=${battleSimulationState.cpCap}`)
         .then(res => res.json())
         .then(data => {
             if (data.error) {
@@ -737,7 +737,7 @@ window.selectTeamPokemonModal = function(pokemonName) {
 async function addPokemonToTeam(pokemonName, slotNumber) {
     try {
         console.log('Adding Pokemon:', pokemonName, 'to slot:', slotNumber);
-        const response = await fetch(`/api/pokemon/${encodeURIComponent(pokemonName)}`);
+        const response = await fetch(`/api/pokemon/${encodeURIComponent(pokemonName)}?cp_cap=${battleSimulationState.cpCap}`);
         
         if (!response.ok) {
             console.error('API response not ok:', response.status, response.statusText);
@@ -1657,7 +1657,7 @@ async function updateMatchupAnalysis() {
         const resp = await fetch('/api/matchup', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ opponent: opponentId, team: teamIds })
+            body: JSON.stringify({ opponent: opponentId, team: teamIds, cp_cap: battleSimulationState.cpCap })
         });
         const data = await resp.json();
         // Update left panel (opponent) with full type chart
@@ -1940,54 +1940,82 @@ async function runBattleSimulations() {
     console.log('Current opponent:', currentOpponent);
     console.log('User team:', userTeam);
 
-    const results = [];
     const shieldCount = battleSimulationState.shieldCount;
 
-    // Run simulations for each team member vs opponent
+    // Use the actual moves from the opponent data (including custom movesets)
+    const opponentMoves = currentOpponent.pvp_moves || [];
+    console.log(`[BATTLE DEBUG] Opponent moves for ${currentOpponent.name}:`, opponentMoves.map(m => `${m.name} (${m.move_class})`));
+    if (!opponentMoves || opponentMoves.length === 0) {
+        console.log(`No PvP moves found for ${currentOpponent.name}`);
+        return;
+    }
+
+    // Build one batch entry per team member, remembering which slot each came from
+    const teamEntries = [];
+    const slotIndexes = [];
     for (let i = 0; i < userTeam.length; i++) {
         const teamPokemon = userTeam[i];
         if (!teamPokemon) continue;
 
-        console.log(`Simulating battle for ${teamPokemon.name} vs ${currentOpponent.name}`);
-        console.log('Using speciesIds:', teamPokemon.speciesId, currentOpponent.speciesId);
+        // Use the actual moves from the Pokémon data (including custom movesets)
+        const teamMoves = teamPokemon.pvp_moves || [];
+        console.log(`[BATTLE DEBUG] Team moves for ${teamPokemon.name}:`, teamMoves.map(m => `${m.name} (${m.move_class})`));
+        if (!teamMoves || teamMoves.length === 0) {
+            console.log(`No PvP moves found for ${teamPokemon.name}`);
+            continue;
+        }
 
-        try {
-            // Use the actual moves from the Pokémon data (including custom movesets)
-            let teamMoves = teamPokemon.pvp_moves || [];
-            console.log(`[BATTLE DEBUG] Team moves for ${teamPokemon.name}:`, teamMoves.map(m => `${m.name} (${m.move_class})`));
-            if (!teamMoves || teamMoves.length === 0) {
-                console.log(`No PvP moves found for ${teamPokemon.name}`);
-                continue;
-            }
+        teamEntries.push(buildBattleEntry(teamPokemon, teamMoves, true));
+        slotIndexes.push(i);
+    }
 
-            // Use the actual moves from the opponent data (including custom movesets)
-            let opponentMoves = currentOpponent.pvp_moves || [];
-            console.log(`[BATTLE DEBUG] Opponent moves for ${currentOpponent.name}:`, opponentMoves.map(m => `${m.name} (${m.move_class})`));
-            if (!opponentMoves || opponentMoves.length === 0) {
-                console.log(`No PvP moves found for ${currentOpponent.name}`);
-                continue;
-            }
+    if (teamEntries.length === 0) {
+        displayBattleSimulations([]);
+        return;
+    }
+
+    const analyticsData = buildTeamAnalyticsData();
+    const batchData = {
+        team: teamEntries,
+        opponents: [buildBattleEntry(currentOpponent, opponentMoves, false)],
+        shield_scenarios: [[shieldCount, shieldCount]],
+        p1_shield_ai: battleSimulationState.shieldAI || 'smart_30',
+        p2_shield_ai: battleSimulationState.shieldAI || 'smart_30',
+        cp_cap: battleSimulationState.cpCap,
+        // Only the outcome is shown, so skip the move-by-move timeline
+        settings: { detail: 'none' },
+        team_ids: analyticsData.team_ids,
+        team_moves: analyticsData.team_moves
+    };
+
+    console.log('Batch battle data:', batchData);
+
+    const results = [];
+    try {
+        // Simulate the whole team against the opponent in one round trip
+        const response = await fetch('/api/battle/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(batchData)
+        });
 
-            // Run battle simulation
-            const battleResult = await runSingleBattle(
-                teamPokemon, teamMoves,
-                currentOpponent, opponentMoves,
-                shieldCount,
-                battleSimulationState.shieldAI,
-                battleSimulationState.shieldAI
-            );
+        const batchResult = await response.json();
+        console.log('Batch battle API response:', batchResult);
 
-            console.log(`Battle result for ${teamPokemon.name}:`, battleResult);
+        if (batchResult.error) {
+            throw new Error(batchResult.error);
+        }
 
+        batchResult.results.forEach(battleResult => {
+            const slotIndex = slotIndexes[battleResult.team_index];
             results.push({
-                teamPokemon,
+                teamPokemon: userTeam[slotIndex],
                 battleResult,
-                slotIndex: i
+                slotIndex
             });
-
-        } catch (error) {
-            console.error(`Error simulating battle for ${teamPokemon.name}:`, error);
-        }
+        });
+    } catch (error) {
+        console.error('Batch battle simulation failed:', error);
     }
 
     console.log('All battle results:', results);
@@ -2003,7 +2031,7 @@ async function runBattleSimulations() {
 async function getPvPMovesForPokemon(speciesId) {
     try {
         console.log(`Getting PvP moves for speciesId: ${speciesId}`);
-        let response = await fetch(`/api/pokemon/${speciesId}`);
+        let response = await fetch(`/api/pokemon/${speciesId}?cp_cap=${battleSimulationState.cpCap}`);
         let data = await response.json();
         if (data.error) {
             console.error(`Error fetching PvP moves for ${speciesId}:`, data.error);
@@ -2018,60 +2046,18 @@ async function getPvPMovesForPokemon(speciesId) {
     }
 }
 
-async function runSingleBattle(teamPokemon, teamMoves, opponentPokemon, opponentMoves, shieldCount, p1ShieldAI, p2ShieldAI) {
-    console.log('Running single battle with:', { teamPokemon, teamMoves, opponentPokemon, opponentMoves, shieldCount });
-    
-    // Prepare battle data using the same "best moves" logic as the UI
-    let teamFastMove, teamChargedMoves, opponentFastMove, opponentChargedMoves;
-    
-    // For team Pokémon - use the actual moves that are currently selected (no PvPoke filtering)
-    // This ensures battle simulation uses the moves the user actually selected
-    teamFastMove = teamMoves.find(m => m.move_class === 'fast');
-    
-    // Get the charged moves that are actually being used
-    // IMPORTANT: Use the moves that are actually displayed in the UI, not the original teamMoves
-    teamChargedMoves = [];
-    
-    // If the Pokémon has custom moveset, use those moves
-    if (teamPokemon.customMoveset && teamPokemon.customMoveset.charged) {
-        // Find the custom charged move in the available moves
-        const customMove = teamMoves.find(m => m.move_class === 'charged' && m.name === teamPokemon.customMoveset.charged);
-        if (customMove) {
-            teamChargedMoves.push(customMove);
-            console.log('[BATTLE DEBUG] Using custom charged move:', customMove.name);
-        }
-    }
-    
-    // Add the remaining charged moves (up to 2 total)
-    const remainingChargedMoves = teamMoves.filter(m => m.move_class === 'charged' && 
-        (!teamPokemon.customMoveset || m.name !== teamPokemon.customMoveset.charged));
-    
-    for (let i = 0; i < remainingChargedMoves.length && teamChargedMoves.length < 2; i++) {
-        teamChargedMoves.push(remainingChargedMoves[i]);
-    }
-    
-    console.log('[BATTLE DEBUG] Final team charged moves:', teamChargedMoves.map(m => m.name));
-    
-    // For opponent Pokémon - use the actual moves that are currently selected (no PvPoke filtering)
-    // This ensures battle simulation uses the moves that are actually displayed in the UI
-    opponentFastMove = opponentMoves.find(m => m.move_class === 'fast');
-    opponentChargedMoves = opponentMoves.filter(m => m.move_class === 'charged').slice(0, 2);
+// Convert a displayed move name to the move ID the battle API expects
+function toBattleMoveId(move) {
+    return move ? move.name.toUpperCase().replace(' ', '_') : null;
+}
 
-    console.log('[BATTLE DEBUG] Selected moves for battle:', {
-        teamFastMove: teamFastMove ? `${teamFastMove.name} (${teamFastMove.move_class})` : 'None',
-        teamChargedMoves: teamChargedMoves.map(m => `${m.name} (${m.move_class})`),
-        opponentFastMove: opponentFastMove ? `${opponentFastMove.name} (${opponentFastMove.move_class})` : 'None',
-        opponentChargedMoves: opponentChargedMoves.map(m => `${m.name} (${m.move_class})`)
-    });
-    console.log('[BATTLE DEBUG] Team custom moveset:', teamPokemon.customMoveset);
+// Use speciesId for API calls (handles alternate forms correctly)
+function getBattleSpeciesId(pokemon) {
+    let speciesId = pokemon.speciesId || pokemon.name;
 
-    // Use speciesId for API calls (handles alternate forms correctly)
-    let teamId = teamPokemon.speciesId || teamPokemon.name;
-    let opponentId = opponentPokemon.speciesId || opponentPokemon.name;
-    
     // Handle alternate forms by converting names to speciesId format
-    if (teamPokemon.name.includes('(') && !teamId.includes('_')) {
-        teamId = teamPokemon.name.toLowerCase()
+    if (pokemon.name.includes('(') && !speciesId.includes('_')) {
+        speciesId = pokemon.name.toLowerCase()
             .replace('(', '')
             .replace(')', '')
             .replace(' ', '_')
@@ -2079,35 +2065,65 @@ async function runSingleBattle(teamPokemon, teamMoves, opponentPokemon, opponent
             .replace('alolan', 'alola')      // Keep as 'alolan', not 'alola'
             .replace('hisuian', 'hisuian');   // Keep as 'hisuian', not 'hisui'
     }
-    
-    if (opponentPokemon.name.includes('(') && !opponentId.includes('_')) {
-        opponentId = opponentPokemon.name.toLowerCase()
-            .replace('(', '')
-            .replace(')', '')
-            .replace(' ', '_')
-            .replace('galarian', 'galar')  // Keep as 'galarian', not 'galar'
-            .replace('alolan', 'alola')      // Keep as 'alolan', not 'alola'
-            .replace('hisuian', 'hisuian');   // Keep as 'hisuian', not 'hisui'
+    return speciesId;
+}
+
+// Build a {id, moves} battle entry using the same "best moves" logic as the UI
+function buildBattleEntry(pokemon, moves, isTeam) {
+    const fastMove = moves.find(m => m.move_class === 'fast');
+    let chargedMoves = [];
+
+    if (isTeam) {
+        // For team Pokémon - use the actual moves that are currently selected (no PvPoke filtering)
+        // If the Pokémon has custom moveset, use those moves first
+        if (pokemon.customMoveset && pokemon.customMoveset.charged) {
+            const customMove = moves.find(m => m.move_class === 'charged' && m.name === pokemon.customMoveset.charged);
+            if (customMove) {
+                chargedMoves.push(customMove);
+                console.log('[BATTLE DEBUG] Using custom charged move:', customMove.name);
+            }
+        }
+
+        // Add the remaining charged moves (up to 2 total)
+        const remainingChargedMoves = moves.filter(m => m.move_class === 'charged' &&
+            (!pokemon.customMoveset || m.name !== pokemon.customMoveset.charged));
+        for (let i = 0; i < remainingChargedMoves.length && chargedMoves.length < 2; i++) {
+            chargedMoves.push(remainingChargedMoves[i]);
+        }
+    } else {
+        // For opponent Pokémon - use the moves that are actually displayed in the UI
+        chargedMoves = moves.filter(m => m.move_class === 'charged').slice(0, 2);
     }
 
-    console.log('Using IDs:', { teamId, opponentId });
+    const battleMoves = {
+        fast: toBattleMoveId(fastMove),
+        charged1: toBattleMoveId(chargedMoves[0]),
+        charged2: toBattleMoveId(chargedMoves[1])
+    };
+
+    // Remove empty moves
+    Object.keys(battleMoves).forEach(key => {
+        if (!battleMoves[key]) delete battleMoves[key];
+    });
 
-    // Build full team and moves for analytics (send in every request)
-    // userTeam is the current team array
+    return { id: getBattleSpeciesId(pokemon), moves: battleMoves };
+}
+
+// Build full team and moves for analytics (sent with every battle request)
+function buildTeamAnalyticsData() {
     const team_ids = userTeam.map(p => p.speciesId || p.name);
     // Build team_moves as {speciesId: {fast, charged1, charged2}}
     const team_moves = {};
     userTeam.forEach(p => {
-        // Find selected moves for this team member
         let fastMove = null;
         let charged1 = null;
         let charged2 = null;
         if (p.pvp_moves && p.pvp_moves.length > 0) {
             const fast = p.pvp_moves.find(m => m.move_class === 'fast');
             const charged = p.pvp_moves.filter(m => m.move_class === 'charged');
-            fastMove = fast ? fast.name.toUpperCase().replace(' ', '_') : null;
-            charged1 = charged[0] ? charged[0].name.toUpperCase().replace(' ', '_') : null;
-            charged2 = charged[1] ? charged[1].name.toUpperCase().replace(' ', '_') : null;
+            fastMove = toBattleMoveId(fast);
+            charged1 = toBattleMoveId(charged[0]);
+            charged2 = toBattleMoveId(charged[1]);
         }
         team_moves[p.speciesId || p.name] = {
             fast: fastMove,
@@ -2115,40 +2131,31 @@ async function runSingleBattle(teamPokemon, teamMoves, opponentPokemon, opponent
             charged2: charged2
         };
     });
+    return { team_ids, team_moves };
+}
+
+async function runSingleBattle(teamPokemon, teamMoves, opponentPokemon, opponentMoves, shieldCount, p1ShieldAI, p2ShieldAI) {
+    console.log('Running single battle with:', { teamPokemon, teamMoves, opponentPokemon, opponentMoves, shieldCount });
+
+    const teamEntry = buildBattleEntry(teamPokemon, teamMoves, true);
+    const opponentEntry = buildBattleEntry(opponentPokemon, opponentMoves, false);
+    const analyticsData = buildTeamAnalyticsData();
 
     const battleData = {
-        p1_id: teamId,
-        p2_id: opponentId,
-        p1_moves: {
-            fast: teamFastMove ? teamFastMove.name.toUpperCase().replace(' ', '_') : null,
-            charged1: teamChargedMoves[0] ? teamChargedMoves[0].name.toUpperCase().replace(' ', '_') : null,
-            charged2: teamChargedMoves[1] ? teamChargedMoves[1].name.toUpperCase().replace(' ', '_') : null
-        },
-        p2_moves: {
-            fast: opponentFastMove ? opponentFastMove.name.toUpperCase().replace(' ', '_') : null,
-            charged1: opponentChargedMoves[0] ? opponentChargedMoves[0].name.toUpperCase().replace(' ', '_') : null,
-            charged2: opponentChargedMoves[1] ? opponentChargedMoves[1].name.toUpperCase().replace(' ', '_') : null
-        },
+        p1_id: teamEntry.id,
+        p2_id: opponentEntry.id,
+        p1_moves: teamEntry.moves,
+        p2_moves: opponentEntry.moves,
         p1_shields: shieldCount,
         p2_shields: shieldCount,
         p1_shield_ai: p1ShieldAI || 'smart_30',
         p2_shield_ai: p2ShieldAI || 'smart_30',
         cp_cap: battleSimulationState.cpCap,
-        // --- ADDED: full team info for analytics ---
-        team_ids: team_ids,
-        team_moves: team_moves
+        settings: { detail: 'none' },
+        team_ids: analyticsData.team_ids,
+        team_moves: analyticsData.team_moves
     };
 
-    console.log('Battle data before cleanup:', battleData);
-
-    // Remove empty moves
-    Object.keys(battleData.p1_moves).forEach(key => {
-        if (!battleData.p1_moves[key]) delete battleData.p1_moves[key];
-    });
-    Object.keys(battleData.p2_moves).forEach(key => {
-        if (!battleData.p2_moves[key]) delete battleData.p2_moves[key];
-    });
-
     console.log('Final battle data:', battleData);
 
     try {
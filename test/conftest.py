@@ -0,0 +1,13 @@
+"""
+Shared pytest setup: importing app opens the battle result cache, so point it
+at a temporary directory instead of result_cache/ in the working tree.
+
+Game data comes from the pvpoke submodule; set PVPOKE_DIR to run the tests
+against another copy, such as a trimmed fixture checkout.
+"""
+
+import os
+import tempfile
+
+_battle_cache_dir = tempfile.TemporaryDirectory(prefix='battle_cache_')
+os.environ['BATTLE_CACHE_PATH'] = os.path.join(_battle_cache_dir.name, 'battles.sqlite3')
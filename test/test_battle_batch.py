@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for battle request validation in the web app
+"""
+
+AZUMARILL_MOVES = {'fast': 'BUBBLE', 'charged1': 'ICE_BEAM', 'charged2': 'PLAY_ROUGH'}
+REGISTEEL_MOVES = {'fast': 'LOCK_ON', 'charged1': 'FLASH_CANNON'}
+
+def test_shield_scenarios():
+    import app
+    assert app._parse_shield_scenarios([1, [0, 2]]) == [(1, 1), (0, 2)]
+    for invalid in ([True], [[False, 1]], [[1, True]], [3], [[1, 2, 0]], [-1], 2, None):
+        assert app._parse_shield_scenarios(invalid) is None, invalid
+
+    client = app.app.test_client()
+    batch = {'team': [{'id': 'azumarill', 'moves': AZUMARILL_MOVES}],
+             'opponents': [{'id': 'registeel', 'moves': REGISTEEL_MOVES}], 'cp_cap': 1500}
+    response = client.post('/api/battle/batch', json=dict(batch, shield_scenarios=[1, [0, 2]]))
+    assert response.status_code == 200, response.get_json()
+    results = response.get_json()['results']
+    assert [(r['p1_shields'], r['p2_shields']) for r in results] == [(1, 1), (0, 2)]
+    for invalid in ([True], [[1, False]], True):
+        response = client.post('/api/battle/batch', json=dict(batch, shield_scenarios=invalid))
+        print(f"shield_scenarios={invalid}: {response.status_code}")
+        assert response.status_code == 400
+
+def test_battle_shields():
+    import app
+    client = app.app.test_client()
+    battle = {'p1_id': 'azumarill', 'p2_id': 'registeel', 'cp_cap': 1500,
+              'p1_moves': AZUMARILL_MOVES, 'p2_moves': REGISTEEL_MOVES}
+    assert client.post('/api/battle', json=dict(battle, p1_shields=0, p2_shields=2)).status_code == 200
+    for invalid in (True, 3, -1, '1', None):
+        response = client.post('/api/battle', json=dict(battle, p2_shields=invalid))
+        assert response.status_code == 400, invalid
+
+def test_request_time_budget():
+    import app
+    client = app.app.test_client()
+    batch = {'team': [{'id': 'azumarill', 'moves': AZUMARILL_MOVES}],
+             'opponents': [{'id': 'registeel', 'moves': REGISTEEL_MOVES}], 'cp_cap': 1500,
+             'shield_scenarios': [0, 1, 2], 'settings': {'seed': 11, 'detail': 'charged'}}
+    original = app.REQUEST_TIME_BUDGET
+    app.REQUEST_TIME_BUDGET = 0
+    try:
+        results = client.post('/api/battle/batch', json=batch).get_json()['results']
+    finally:
+        app.REQUEST_TIME_BUDGET = original
+    # The first battle always runs; the rest are past the request's deadline and never start
+    assert len(results) == 3
+    assert all(r['aborted'] == 'time_budget' and r['winner'] is None for r in results[1:])
+    assert app.battle_cache.get(1500, app.leagues[1500].poke_data.data_version, 'missing') is None
+
+    # Few optimal searches fit in one request
+    optimal = dict(batch, settings={'mode': 'optimal'}, shield_scenarios=[0, 1, 2, [0, 1], [1, 0]])
+    response = client.post('/api/battle/batch', json=optimal)
+    print(f"Five optimal battles: {response.get_json()}")
+    assert response.status_code == 400
+
+def test_monte_carlo_stays_in_process():
+    import app
+    settings, error = app._build_battle_settings({'runs': 5000, 'processes': 8}, 'smart_30', 'smart_30')
+    assert error is None
+    # Web workers never fork a pool, whatever the client asks for
+    assert 'processes' not in settings
+
+if __name__ == "__main__":
+    test_shield_scenarios()
+    test_battle_shields()
+    test_request_time_budget()
+    test_monte_carlo_stays_in_process()
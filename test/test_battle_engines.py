@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Tests for the battle engines: engine agreement, seeding, Monte Carlo runs, exact evaluation
+the optimal play search, thread safety, battle traces, timeline detail levels, the
+NumPy batch engine and battle limits
+"""
+
+import itertools
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_sim import BatchSimulator
+from battle_sim import BattleSimulator, _first_turn_below, matchup_rating
+from poke_data import PokeData
+
+MATCHUPS = [
+    ('altaria', {'fast': 'DRAGON_BREATH', 'charged1': 'SKY_ATTACK', 'charged2': 'DRAGON_PULSE'},
+     'lanturn', {'fast': 'WATER_GUN', 'charged1': 'THUNDERBOLT', 'charged2': 'SURF'}),
+    ('azumarill', {'fast': 'BUBBLE', 'charged1': 'PLAY_ROUGH', 'charged2': 'ICE_BEAM'},
+     'medicham', {'fast': 'COUNTER', 'charged1': 'POWER_UP_PUNCH', 'charged2': 'ICE_PUNCH'}),
+]
+
+def run_engine(sim, poke_data, matchup, shields, engine):
+    p1_id, p1_moves, p2_id, p2_moves = matchup
+    return sim.simulate(
+        poke_data.get_by_species_id(p1_id), poke_data.get_by_species_id(p2_id),
+        p1_moves, p2_moves, shields, shields,
+        settings={'engine': engine, 'seed': 42}
+    )
+
+def test_event_engine_matches_turn_engine():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+    for matchup in MATCHUPS:
+        for shields in (0, 1, 2):
+            turn_result = run_engine(sim, poke_data, matchup, shields, 'turn')
+            event_result = run_engine(sim, poke_data, matchup, shields, 'event')
+            print(f"{matchup[0]} vs {matchup[2]} ({shields} shields): "
+                  f"winner={turn_result['winner']}, rating={turn_result['battle_rating']:.3f}")
+            assert event_result == turn_result
+
+def test_event_engine_skips_waiting_turns():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+    stepped = []
+    run_turn = sim._run_turn
+    sim._run_turn = lambda *args: stepped.append(args[1]) or run_turn(*args)
+    species = [p['speciesId'] for p in poke_data.pokemon]
+    for p1_id in species:
+        for p2_id in species:
+            p1, p2 = poke_data.get_by_species_id(p1_id), poke_data.get_by_species_id(p2_id)
+            p1_moves = poke_data.get_pokemon_moves(p1_id)
+            p2_moves = poke_data.get_pokemon_moves(p2_id)
+            if not p1_moves['fast_moves'] or not p2_moves['fast_moves']:
+                continue
+            moves = []
+            for available in (p1_moves, p2_moves):
+                moveset = {'fast': available['fast_moves'][0]['id']}
+                for i, move in enumerate(available['charged_moves'][:2], start=1):
+                    moveset[f'charged{i}'] = move['id']
+                moves.append(moveset)
+            args = (p1, p2, moves[0], moves[1], 1, 1)
+            stepped.clear()
+            event_result = sim.simulate(*args, settings={'engine': 'event', 'seed': 1})
+            event_steps = len(stepped)
+            assert event_result == sim.simulate(*args, settings={'engine': 'turn', 'seed': 1})
+            assert event_steps <= event_result['turns']
+    # Thresholds found by division agree with stepping hit by hit
+    for hp, damage, threshold in [(100, 7, 30.0), (30, 3, 30.0), (29, 3, 30.0), (50, 0, 15.0), (91, 3, 27.3)]:
+        expected = next((k for k in range(1, 200) if hp - k * damage < threshold), None)
+        assert _first_turn_below(hp, damage, threshold) == expected
+
+def test_seeded_battles_are_reproducible():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+    p1 = poke_data.get_by_species_id('medicham')
+    p2 = poke_data.get_by_species_id('azumarill')
+    p1_moves = {'fast': 'COUNTER', 'charged1': 'POWER_UP_PUNCH', 'charged2': 'ICE_PUNCH'}
+    p2_moves = {'fast': 'BUBBLE', 'charged1': 'PLAY_ROUGH', 'charged2': 'ICE_BEAM'}
+
+    first = sim.simulate(p1, p2, p1_moves, p2_moves, 1, 1, settings={'seed': 1234})
+    second = sim.simulate(p1, p2, p1_moves, p2_moves, 1, 1, settings={'seed': 1234})
+    assert first == second
+
+def test_monte_carlo_aggregates_runs():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+    p1 = poke_data.get_by_species_id('altaria')
+    p2 = poke_data.get_by_species_id('azumarill')
+    p1_moves = {'fast': 'DRAGON_BREATH', 'charged1': 'MOONBLAST', 'charged2': 'SKY_ATTACK'}
+    p2_moves = {'fast': 'BUBBLE', 'charged1': 'PLAY_ROUGH', 'charged2': 'ICE_BEAM'}
+
+    settings = {'runs': 200, 'seed': 99}
+    result = sim.simulate(p1, p2, p1_moves, p2_moves, 1, 1, settings=settings)
+    print(f"Altaria win probability: {result['p1_win_probability']:.3f} "
+          f"(95% CI {result['p1_win_probability_ci']}), mean rating {result['rating_mean']:.1f}")
+    assert result['runs'] == 200
+    total = result['p1_win_probability'] + result['p2_win_probability'] + result['tie_probability']
+    assert abs(total - 1.0) < 1e-9
+    assert sum(result['rating_distribution'].values()) == 200
+    assert result['rating_ci'][0] <= result['rating_mean'] <= result['rating_ci'][1]
+
+    # The same seed reproduces the same aggregate, in-process or across workers
+    assert sim.simulate(p1, p2, p1_moves, p2_moves, 1, 1, settings=settings) == result
+    parallel = sim.simulate(p1, p2, p1_moves, p2_moves, 1, 1, settings=dict(settings, processes=2))
+    assert parallel == result
+
+def test_expected_mode_is_exact():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+
+    # Without chance-based buffs the exact evaluation is the single battle
+    matchup = MATCHUPS[0]
+    battle = run_engine(sim, poke_data, matchup, 1, 'turn')
+    expected = sim.simulate(
+        poke_data.get_by_species_id(matchup[0]), poke_data.get_by_species_id(matchup[2]),
+        matchup[1], matchup[3], 1, 1, settings={'mode': 'expected'}
+    )
+    assert expected['winner'] == battle['winner']
+    assert expected['expected_rating'] == matchup_rating(battle)
+    assert expected['expected_turns'] == battle['turns']
+
+    # Dragon Breath / Moonblast rolls a 30% debuff, so the outcome branches
+    p1 = poke_data.get_by_species_id('altaria')
+    p2 = poke_data.get_by_species_id('swampert')
+    p1_moves = {'fast': 'DRAGON_BREATH', 'charged1': 'MOONBLAST', 'charged2': 'SKY_ATTACK'}
+    p2_moves = poke_data.get_default_moveset('swampert')
+    expected = sim.simulate(p1, p2, p1_moves, p2_moves, 1, 1, settings={'mode': 'expected'})
+    sampled = sim.simulate(p1, p2, p1_moves, p2_moves, 1, 1, settings={'runs': 2000, 'seed': 5})
+    print(f"Altaria vs Swampert: exact win probability {expected['p1_win_probability']:.3f} "
+          f"over {expected['states_evaluated']} states, sampled {sampled['p1_win_probability']:.3f}")
+    total = expected['p1_win_probability'] + expected['p2_win_probability'] + expected['tie_probability']
+    assert abs(total - 1.0) < 1e-9
+    assert expected['states_evaluated'] > 1
+    assert abs(expected['p1_win_probability'] - sampled['p1_win_probability']) < 0.05
+    assert abs(expected['expected_rating'] - sampled['rating_mean']) < 10
+
+def test_optimal_play_search():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+    p1 = poke_data.get_by_species_id('swampert')
+    p2 = poke_data.get_by_species_id('registeel')
+    p1_moves = poke_data.get_default_moveset('swampert')
+    p2_moves = poke_data.get_default_moveset('registeel')
+
+    optimal = sim.simulate(p1, p2, p1_moves, p2_moves, 1, 1, settings={'mode': 'optimal'})
+    print(f"Swampert vs Registeel optimal rating {optimal['rating']:.1f} "
+          f"({optimal['nodes']} positions searched)")
+    for step in optimal['principal_line']:
+        print(f"  turn {step['turn']}: {step['player']} {step['move']} (shielded: {step['shield_used']})")
+    assert optimal['complete'] and optimal['budget_exhausted'] is None
+    assert optimal['heuristic_positions'] == 0
+    assert optimal['winner'] in ('swampert', 'registeel', 'tie')
+    assert optimal['principal_line']
+
+    # A search that runs out of budget says so, and how much of it was heuristic play
+    cut = sim.simulate(p1, p2, p1_moves, p2_moves, 1, 1, settings={'mode': 'optimal', 'node_budget': 50})
+    assert not cut['complete'] and cut['budget_exhausted'] == 'node_budget'
+    assert cut['nodes'] == 50 and cut['heuristic_positions'] > 0
+
+    # The search keeps its own stack rather than recursing once per searched turn
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(150)
+    try:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            shallow = pool.submit(sim.simulate, p1, p2, p1_moves, p2_moves, 1, 1, {'mode': 'optimal'}).result()
+    finally:
+        sys.setrecursionlimit(limit)
+    assert shallow['rating'] == optimal['rating'] and shallow['nodes'] == optimal['nodes']
+
+    # P1 following the heuristics can only do as well as optimal P1 against the same opponent
+    for strategy in ('never', 'smart_30', 'always'):
+        heuristic = sim.simulate(p1, p2, p1_moves, p2_moves, 1, 1, settings={
+            'mode': 'optimal', 'p1_play': 'heuristic', 'p1_shield_ai': strategy
+        })
+        assert heuristic['complete']
+        assert heuristic['rating'] <= optimal['rating']
+
+    # With both sides on the heuristics the search replays the expected battle
+    settings = {'p1_play': 'heuristic', 'p2_play': 'heuristic'}
+    both = sim.simulate(p1, p2, p1_moves, p2_moves, 1, 1, settings=dict(settings, mode='optimal'))
+    expected = sim.simulate(p1, p2, p1_moves, p2_moves, 1, 1, settings={'mode': 'expected'})
+    assert abs(both['rating'] - expected['expected_rating']) < 1e-9
+
+def test_shared_simulator_is_thread_safe():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+    jobs = []
+    for matchup, shields, strategy, seed in itertools.product(MATCHUPS, (1, 2), ('always', 'never'), range(3)):
+        p1_id, p1_moves, p2_id, p2_moves = matchup
+        jobs.append((poke_data.get_by_species_id(p1_id), poke_data.get_by_species_id(p2_id), p1_moves, p2_moves,
+                     shields, shields, {'seed': seed, 'p1_shield_ai': strategy, 'p2_shield_ai': 'smart_30'}))
+    sequential = [sim.simulate(*job) for job in jobs]
+    # Every battle keeps its own shield AIs and RNG while sharing one simulator
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for _ in range(3):
+            assert list(pool.map(lambda job: sim.simulate(*job), jobs)) == sequential
+
+def test_trace_is_opt_in():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+    for engine in ('turn', 'event'):
+        plain = run_engine(sim, poke_data, MATCHUPS[0], 1, engine)
+        assert 'trace' not in plain
+        traced = sim.simulate(
+            poke_data.get_by_species_id('altaria'), poke_data.get_by_species_id('lanturn'),
+            MATCHUPS[0][1], MATCHUPS[0][3], 1, 1, settings={'engine': engine, 'seed': 42, 'trace': True}
+        )
+        trace = traced.pop('trace')
+        assert traced == plain
+        # One charged_move event per charged move in the timeline, each after its decision
+        throws = [e for e in trace if e['event'] == 'charged_move']
+        charged = [e for e in plain['timeline'] if e['type'] == 'charged']
+        assert [(e['turn'], e['move']) for e in throws] == [(e['turn'], e['move']) for e in charged]
+        decisions = [e for e in trace if e['event'] == 'charged_decision']
+        assert all(e['choice'] is None or e['choice'] in e['available'] for e in decisions)
+        print(f"{engine}: {len(decisions)} decisions, {len(throws)} charged moves, "
+              f"{sum(e['shielded'] for e in throws)} shielded")
+        assert sum(e['shielded'] for e in throws) == 2 - plain['p1_final_shields'] - plain['p2_final_shields']
+
+def test_detail_levels():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+    for matchup, shields, engine in itertools.product(MATCHUPS, (0, 2), ('turn', 'event')):
+        p1_id, p1_moves, p2_id, p2_moves = matchup
+        results = {
+            detail: sim.simulate(
+                poke_data.get_by_species_id(p1_id), poke_data.get_by_species_id(p2_id),
+                p1_moves, p2_moves, shields, shields, settings={'engine': engine, 'seed': 7, 'detail': detail}
+            )
+            for detail in BattleSimulator.DETAIL_LEVELS
+        }
+        full = results['full']
+        charged = [e for e in full['timeline'] if e['type'] == 'charged']
+        assert results['charged']['timeline'] == charged
+        assert 'timeline' not in results['none']
+        # The outcome never depends on what the timeline records
+        for result in results.values():
+            result.pop('timeline', None)
+            assert result == full
+    try:
+        sim.simulate(poke_data.get_by_species_id('altaria'), poke_data.get_by_species_id('lanturn'),
+                     MATCHUPS[0][1], MATCHUPS[0][3], settings={'detail': 'verbose'})
+        assert False, "invalid detail level accepted"
+    except ValueError as e:
+        print(f"Rejected: {e}")
+
+def test_batch_engine_matches_simulate():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+    batch = BatchSimulator(sim)
+    movesets = {p['speciesId']: poke_data.get_default_moveset(p['speciesId']) for p in poke_data.pokemon}
+    species = [sid for sid, moveset in movesets.items() if moveset and 'charged1' in moveset]
+    battles = [(poke_data.get_by_species_id(p1_id), poke_data.get_by_species_id(p2_id),
+                movesets[p1_id], movesets[p2_id], p1_shields, p2_shields)
+               for p1_id in species for p2_id in species for p1_shields in range(3) for p2_shields in range(3)]
+    seeds = [f"seed-{i}" for i in range(len(battles))]
+    for p1_ai, p2_ai in [('smart_30', 'smart_30'), ('never', 'always'), ('conservative', 'aggressive'),
+                         ('balanced', 'smart_20'), ('smart_50', 'balanced')]:
+        settings = {'p1_shield_ai': p1_ai, 'p2_shield_ai': p2_ai}
+        results = batch.simulate_many(battles, settings, seeds=seeds)
+        for battle, seed, result in zip(battles, seeds, results):
+            expected = sim.simulate(*battle, settings=dict(settings, seed=seed, detail='none'))
+            assert result == expected, (battle[0]['speciesId'], battle[1]['speciesId'], battle[4:], p1_ai, p2_ai)
+    print(f"{len(battles)} battles per shield AI pairing match simulate")
+    assert BatchSimulator.supports({'detail': 'none'})
+    assert not BatchSimulator.supports({'detail': 'none', 'trace': True})
+    assert not BatchSimulator.supports({'detail': 'full'})
+    assert not BatchSimulator.supports({'detail': 'none', 'mode': 'expected'})
+
+def test_battle_limits():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+    registeel = poke_data.get_by_species_id('registeel')
+    altaria = poke_data.get_by_species_id('altaria')
+    # Lock-On against a Pokémon without a usable fast move: a long, one-sided battle
+    args = (registeel, altaria, {'fast': 'LOCK_ON'}, {'fast': 'NOT_A_MOVE'}, 0, 0)
+    full = sim.simulate(*args, settings={'detail': 'none'})
+    assert full['winner'] == 'registeel' and full['turns'] > 64 and 'aborted' not in full
+
+    capped = {engine: sim.simulate(*args, settings={'engine': engine, 'max_turns': 30}) for engine in ('turn', 'event')}
+    assert capped['turn'] == capped['event']
+    result = capped['turn']
+    assert result['aborted'] == 'turn_limit' and result['winner'] is None and result['battle_rating'] == 0.5
+    assert result['turns'] == 30 and result['p1_final_hp'] > 0 and result['p2_final_hp'] > 0
+    batch = BatchSimulator(sim).simulate_many([args], {'max_turns': 30})[0]
+    assert batch == sim.simulate(*args, settings={'max_turns': 30, 'detail': 'none'})
+
+    timed_out = sim.simulate(*args, settings={'engine': 'turn', 'time_budget': 1e-9})
+    assert timed_out['aborted'] == 'time_budget' and timed_out['turns'] < full['turns']
+    print(f"Capped at {result['turns']} turns, timed out after {timed_out['turns']}")
+
+    # Exact evaluation and the optimal search's heuristic playouts are held to the same limits
+    assert sim.simulate(*args, settings={'mode': 'expected'})['p1_win_probability'] == 1.0
+    expected = sim.simulate(*args, settings={'mode': 'expected', 'max_turns': 30})
+    assert expected['aborted'] == 'turn_limit' and expected['winner'] is None
+    assert expected['expected_rating'] == 500 and expected['p1_win_probability'] is None
+    optimal = sim.simulate(*args, settings={'mode': 'optimal', 'node_budget': 0, 'max_turns': 30})
+    assert optimal['aborted'] == 'turn_limit' and optimal['winner'] is None
+    assert optimal['rating'] == 500 and not optimal['complete'] and not optimal['principal_line']
+
+    # A caller's deadline bounds every mode, including how many Monte Carlo runs start
+    past = {'deadline': time.monotonic() - 1, 'engine': 'turn'}
+    assert sim.simulate(*args, settings=past)['aborted'] == 'time_budget'
+    assert sim.simulate(*args, settings=dict(past, mode='optimal', node_budget=0))['aborted'] == 'time_budget'
+    azumarill = poke_data.get_by_species_id('azumarill')
+    sampled = sim.simulate(altaria, azumarill, {'fast': 'DRAGON_BREATH', 'charged1': 'MOONBLAST'},
+                           {'fast': 'BUBBLE', 'charged1': 'PLAY_ROUGH'}, 1, 1, settings=dict(past, runs=50, seed=1))
+    assert sampled['runs'] == 1 and sampled['aborted'] == 'time_budget'
+
+    # Neither side has a fast move: rejected before the battle starts, in every mode
+    stuck = (registeel, altaria, {'fast': 'NOT_A_MOVE'}, {'fast': 'NOT_A_MOVE'})
+    for settings in ({}, {'mode': 'expected'}, {'mode': 'optimal'}):
+        try:
+            sim.simulate(*stuck, settings=settings)
+            assert False, "impossible matchup accepted"
+        except ValueError as e:
+            print(f"Rejected: {e}")
+    try:
+        BatchSimulator(sim).simulate_many([stuck + (1, 1)])
+        assert False, "impossible matchup accepted"
+    except ValueError:
+        pass
+
+if __name__ == "__main__":
+    test_event_engine_matches_turn_engine()
+    test_event_engine_skips_waiting_turns()
+    test_seeded_battles_are_reproducible()
+    test_monte_carlo_aggregates_runs()
+    test_expected_mode_is_exact()
+    test_optimal_play_search()
+    test_shared_simulator_is_thread_safe()
+    test_trace_is_opt_in()
+    test_detail_levels()
+    test_batch_engine_matches_simulate()
+    test_battle_limits()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for the all-vs-all matchup matrix engine
+"""
+
+import os
+import tempfile
+
+from battle_matrix import compute_matchup_matrix, SHIELD_SCENARIOS
+from matrix_store import MatrixStore, write_matrix_store
+
+META = ['azumarill', 'altaria', 'lanturn']
+
+def test_matchup_matrix_shape_and_mirrors():
+    matrix = compute_matchup_matrix(cp_cap=1500, species_ids=META, processes=1)
+
+    assert matrix.species_ids == META
+    assert len(matrix.ratings) == len(SHIELD_SCENARIOS)
+    for scenario in matrix.ratings:
+        assert len(scenario) == len(META)
+        assert all(len(row) == len(META) for row in scenario)
+        assert all(0 <= rating <= 1000 for row in scenario for rating in row)
+
+    # Deterministic mirror matches end in a double KO, which is an even 500
+    assert matrix.rating('azumarill', 'azumarill', (1, 1)) == 500
+    print("Rankings:", matrix.rankings())
+
+def test_matchup_matrix_process_pool():
+    matrix = compute_matchup_matrix(cp_cap=1500, species_ids=META, scenarios=[(1, 1)], processes=2)
+    inline = compute_matchup_matrix(cp_cap=1500, species_ids=META, scenarios=[(1, 1)], processes=1)
+    assert matrix.rating('azumarill', 'lanturn') == inline.rating('azumarill', 'lanturn')
+
+def test_batch_engine_matches_event_engine():
+    batch = compute_matchup_matrix(cp_cap=1500, processes=1)
+    event = compute_matchup_matrix(cp_cap=1500, processes=1, engine='event')
+    assert batch.species_ids == event.species_ids
+    assert batch.ratings == event.ratings
+
+def test_matrix_store_round_trip():
+    matrix = compute_matchup_matrix(cp_cap=1500, species_ids=META, processes=1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'matchups-1500.bin')
+        write_matrix_store(matrix, path)
+        store = MatrixStore(path)
+        try:
+            assert store.data_version == matrix.data_version
+            for p1 in META:
+                for p2 in META:
+                    for shields in SHIELD_SCENARIOS:
+                        assert store.rating(p1, p2, shields) == matrix.rating(p1, p2, shields)
+            assert store.rating('azumarill', 'missingno') is None
+        finally:
+            store.close()
+
+if __name__ == "__main__":
+    test_matchup_matrix_shape_and_mirrors()
+    test_matchup_matrix_process_pool()
+    test_batch_engine_matches_event_engine()
+    test_matrix_store_round_trip()
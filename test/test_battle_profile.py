@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Tests for precompiled BattleProfile objects, the profile LRU cache, the
+slotted BattlePokemon state and per-matchup damage tables
+"""
+
+from battle_sim import BUFF_MULTIPLIERS, BattleSimulator, BattlePokemon, DamageMultiplier, ProfileCache
+from poke_data import PokeData
+
+ALTARIA_MOVES = {'fast': 'DRAGON_BREATH', 'charged1': 'SKY_ATTACK', 'charged2': 'DRAGON_PULSE'}
+LANTURN_MOVES = {'fast': 'WATER_GUN', 'charged1': 'THUNDERBOLT', 'charged2': 'SURF'}
+
+def test_profile_cache_reuses_profiles():
+    poke_data = PokeData()
+    cache = ProfileCache()
+    altaria = poke_data.get_by_species_id('altaria')
+
+    first = cache.get(altaria, ALTARIA_MOVES, poke_data)
+    second = cache.get(altaria, ALTARIA_MOVES, poke_data)
+    assert first is second
+
+    # A different moveset is a different profile
+    other = cache.get(altaria, {'fast': 'DRAGON_BREATH', 'charged1': 'SKY_ATTACK'}, poke_data)
+    assert other is not first
+    print(f"Profile for altaria: ATK={first.atk}, DEF={first.defense}, HP={first.max_hp}")
+
+def test_profile_cache_invalidated_on_league_change():
+    cache = ProfileCache()
+    great = PokeData(cp_cap=1500)
+    ultra = PokeData(cp_cap=2500)
+    altaria = great.get_by_species_id('altaria')
+
+    great_profile = cache.get(altaria, ALTARIA_MOVES, great)
+    ultra_profile = cache.get(altaria, ALTARIA_MOVES, ultra)
+    assert ultra_profile is not great_profile
+    assert cache.data_version == ultra.data_version
+
+def test_battle_state_is_copied_from_profile():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+    altaria = poke_data.get_by_species_id('altaria')
+    lanturn = poke_data.get_by_species_id('lanturn')
+
+    profile = sim.profiles.get(altaria, ALTARIA_MOVES, poke_data)
+    p1 = BattlePokemon(altaria, ALTARIA_MOVES, 1, profile=profile)
+    p1.take_damage(10)
+    assert p1.hp == profile.max_hp - 10
+
+    # Battles must not mutate the shared profile
+    sim.simulate(altaria, lanturn, ALTARIA_MOVES, LANTURN_MOVES, 1, 1)
+    assert sim.profiles.get(altaria, ALTARIA_MOVES, poke_data) is profile
+    assert profile.max_hp == p1.max_hp
+
+def test_effective_stats_follow_buff_stages():
+    poke_data = PokeData()
+    medicham = poke_data.get_by_species_id('medicham')
+    moves = {'fast': 'COUNTER', 'charged1': 'POWER_UP_PUNCH', 'charged2': 'ICE_PUNCH'}
+    p1 = BattlePokemon(medicham, moves, 1, poke_data=poke_data)
+    # Battle state is slotted; species data stays on the shared profile
+    assert not hasattr(p1, '__dict__')
+    assert p1.charged_moves is p1.profile.charged_moves
+    base_atk = p1.profile.atk * p1.profile.shadow_atk_mult
+    base_def = p1.profile.defense * p1.profile.shadow_def_mult
+    assert p1.effective_atk == base_atk and p1.effective_def == base_def
+
+    p1.apply_buff(1, 0)
+    assert p1.atk_buffs == 1 and p1.effective_atk == base_atk * 1.5
+    p1.apply_buff(10, -10)
+    assert (p1.atk_buffs, p1.def_buffs) == (4, -4)
+    assert p1.effective_atk == base_atk * 3 and p1.effective_def == base_def / 3
+    # Restoring a snapshot assigns the stages directly, which refreshes the cache too
+    p1.atk_buffs, p1.def_buffs = 0, -1
+    assert p1.get_effective_atk() == base_atk and p1.get_effective_def() == base_def * (2 / 3)
+    print(f"Medicham ATK {base_atk:.1f} -> {p1.effective_atk:.1f}, DEF {base_def:.1f} -> {p1.effective_def:.1f}")
+
+def test_damage_tables_match_formula():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+    medicham = sim.profiles.get(poke_data.get_by_species_id('medicham'),
+                                {'fast': 'COUNTER', 'charged1': 'POWER_UP_PUNCH', 'charged2': 'ICE_PUNCH'}, poke_data)
+    altaria = sim.profiles.get(poke_data.get_by_species_id('altaria'), ALTARIA_MOVES, poke_data)
+    tables = medicham.damage_table(altaria)
+    assert medicham.damage_table(altaria) is tables
+    effectiveness = medicham.get_effectiveness(altaria.typing)
+    for move in [medicham.fast_move, *medicham.charged_moves]:
+        table = tables[move['moveId']]
+        assert len(table) == 81
+        for a, atk_mult in enumerate(BUFF_MULTIPLIERS):
+            for d, def_mult in enumerate(BUFF_MULTIPLIERS):
+                atk = medicham.atk * medicham.shadow_atk_mult * atk_mult
+                defense = altaria.defense * altaria.shadow_def_mult * def_mult
+                raw = (move['power'] * medicham.stab[move['moveId']] * (atk / defense)
+                       * effectiveness[move['moveId']] * 0.5 * DamageMultiplier.BONUS)
+                assert table[a * 9 + d] == max(1, int(raw // 1) + 1)
+
+def test_decision_tables_match_heuristic():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+    medicham_moves = {'fast': 'COUNTER', 'charged1': 'POWER_UP_PUNCH', 'charged2': 'ICE_PUNCH'}
+    for attacker_id, attacker_moves, defender_id, defender_moves in [
+        ('medicham', medicham_moves, 'altaria', ALTARIA_MOVES),
+        ('altaria', ALTARIA_MOVES, 'lanturn', LANTURN_MOVES),
+        ('lanturn', LANTURN_MOVES, 'medicham', medicham_moves),
+    ]:
+        attacker = BattlePokemon(poke_data.get_by_species_id(attacker_id), attacker_moves, poke_data=poke_data)
+        defender = BattlePokemon(poke_data.get_by_species_id(defender_id), defender_moves, poke_data=poke_data)
+        attacker.face(defender)
+        assert attacker.profile.decision_table(defender.profile) is attacker.decisions
+        assert len(attacker.decisions) == (attacker.max_energy + 1) * 4
+        for energy in range(attacker.max_energy + 1):
+            for defender_hp in (defender.max_hp, defender.max_hp // 4):
+                for attacker_hp in (attacker.max_hp, attacker.max_hp // 4):
+                    attacker.energy, attacker.hp, defender.hp = energy, attacker_hp, defender_hp
+                    # A decision dict runs the heuristic in full instead of looking it up
+                    decision = {}
+                    move = sim._choose_charged_move(attacker, defender, decision)
+                    assert sim._choose_charged_move(attacker, defender) is move
+                    assert decision.get('choice') == (move['name'] if move else None)
+        first_throw = next(i for i, k in enumerate(attacker.decisions) if k >= 0) // 4
+        print(f"{attacker_id} vs {defender_id}: first throw at {first_throw} energy")
+
+def test_damage_readout():
+    poke_data = PokeData()
+    sim = BattleSimulator(poke_data)
+    readout = sim.damage_readout(poke_data.get_by_species_id('altaria'), poke_data.get_by_species_id('lanturn'),
+                                 ALTARIA_MOVES, LANTURN_MOVES)
+    assert readout['stages'] == list(range(-4, 5))
+    assert [m['move_id'] for m in readout['p2']] == ['WATER_GUN', 'THUNDERBOLT', 'SURF']
+    for move in readout['p1'] + readout['p2']:
+        assert move['by_atk_stage'][4] == move['by_def_stage'][4] == move['damage']
+        assert move['by_atk_stage'] == sorted(move['by_atk_stage'])
+        assert move['by_def_stage'] == sorted(move['by_def_stage'], reverse=True)
+        for stage in move['breakpoints']:
+            assert move['by_atk_stage'][stage + 4] > move['by_atk_stage'][stage + 3]
+        print(f"{move['move']}: {move['damage']} damage, breakpoints at {move['breakpoints']}, "
+              f"bulkpoints at {move['bulkpoints']}")
+
+if __name__ == "__main__":
+    test_profile_cache_reuses_profiles()
+    test_profile_cache_invalidated_on_league_change()
+    test_battle_state_is_copied_from_profile()
+    test_effective_stats_follow_buff_stages()
+    test_damage_tables_match_formula()
+    test_decision_tables_match_heuristic()
+    test_damage_readout()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tests for the parsed-data snapshot cache
+"""
+
+import json
+import os
+import tempfile
+
+from data_snapshot import load_cached, snapshot_path
+from poke_data import GAMEMASTER_PATH, PokeData
+
+def test_snapshot_reuse_and_invalidation():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'data.json')
+        with open(source, 'w') as f:
+            json.dump([1, 2, 3], f)
+        calls = []
+        def build(path):
+            calls.append(path)
+            with open(path) as f:
+                return json.load(f)
+        cache_dir = os.path.join(tmp, 'cache')
+        assert load_cached('list', source, build, cache_dir) == [1, 2, 3]
+        assert load_cached('list', source, build, cache_dir) == [1, 2, 3]
+        assert len(calls) == 1
+        assert os.path.exists(snapshot_path('list', source, cache_dir))
+
+        # A touched but identical file is matched by hash, not reparsed
+        st = os.stat(source)
+        os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        assert load_cached('list', source, build, cache_dir) == [1, 2, 3]
+        assert len(calls) == 1
+
+        # Changed content is reparsed, and other views of the file get their own snapshot
+        with open(source, 'w') as f:
+            json.dump([4, 5, 6], f)
+        assert load_cached('list', source, build, cache_dir) == [4, 5, 6]
+        assert load_cached('other', source, lambda path: 'other', cache_dir) == 'other'
+        assert len(calls) == 2
+
+        # A corrupt snapshot falls back to parsing
+        with open(snapshot_path('list', source, cache_dir), 'wb') as f:
+            f.write(b'garbage')
+        assert load_cached('list', source, build, cache_dir) == [4, 5, 6]
+        assert len(calls) == 3
+
+def test_poke_data_from_snapshot_matches_json():
+    with tempfile.TemporaryDirectory() as tmp:
+        parsed = PokeData(snapshot_dir=None)
+        cold = PokeData(snapshot_dir=tmp)
+        warm = PokeData(snapshot_dir=tmp)
+        print(f"Snapshots: {sorted(os.listdir(tmp))}")
+        assert os.path.exists(snapshot_path('pokemon', GAMEMASTER_PATH, tmp))
+        for data in (cold, warm):
+            assert data.pokemon == parsed.pokemon
+            assert data.moves == parsed.moves
+            assert data.rank1_stats == parsed.rank1_stats
+            assert data.data_version == parsed.data_version
+        assert warm.get_by_species_id('azumarill')['types'] == ['water', 'fairy']
+
+if __name__ == "__main__":
+    test_snapshot_reuse_and_invalidation()
+    test_poke_data_from_snapshot_matches_json()
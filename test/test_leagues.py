@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for the resident per-league data and per-request league selection
+"""
+
+from poke_data import PokeData
+
+def test_league_views_share_base_data():
+    base = PokeData(cp_cap=1500)
+    ultra = base.for_league(2500)
+    print(f"Great League version: {base.data_version}, Ultra League version: {ultra.data_version}")
+    assert ultra.cp_cap == 2500 and base.cp_cap == 1500
+    assert ultra.pokemon is base.pokemon
+    assert ultra.moves_by_id is base.moves_by_id
+    assert ultra.get_by_species_id('azumarill') is base.get_by_species_id('azumarill')
+    assert ultra.data_version != base.data_version
+    fresh = PokeData(cp_cap=2500)
+    assert ultra.data_version == fresh.data_version
+    assert ultra.rank1_stats == fresh.rank1_stats
+    assert ultra.rank1_ivs == fresh.rank1_ivs
+
+def test_per_request_league():
+    import app
+    client = app.app.test_client()
+    assert set(app.leagues) == {0, 500, 1500, 2500}
+    great = app.leagues[1500]
+    assert all(league.poke_data.pokemon is great.poke_data.pokemon for league in app.leagues.values())
+
+    battle = {
+        'p1_id': 'azumarill', 'p2_id': 'registeel',
+        'p1_moves': {'fast': 'BUBBLE', 'charged1': 'ICE_BEAM'},
+        'p2_moves': {'fast': 'LOCK_ON', 'charged1': 'FLASH_CANNON'},
+    }
+    for cp_cap in (500, 1500, 2500, 0):
+        response = client.post('/api/battle', json=dict(battle, cp_cap=cp_cap))
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()['cp_cap'] == cp_cap
+    assert client.post('/api/battle', json=dict(battle, cp_cap=1234)).status_code == 400
+    assert client.get('/api/search/azu?cp_cap=abc').status_code == 400
+    assert client.get('/api/pokemon/azumarill/moves?cp_cap=2500').status_code == 200
+
+    # Switching league only changes this session's default
+    other = app.app.test_client()
+    assert client.post('/api/league/2500').get_json()['cp_cap'] == 2500
+    assert client.post('/api/battle', json=battle).get_json()['cp_cap'] == 2500
+    assert other.post('/api/battle', json=battle).get_json()['cp_cap'] == 1500
+    assert client.post('/api/league/42').status_code == 400
+
+if __name__ == "__main__":
+    test_league_views_share_base_data()
+    test_per_request_league()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Tests for the PokeData lookup indexes against plain scans of the gamemaster
+"""
+
+from poke_data import PokeData
+
+def test_id_and_name_lookups():
+    poke_data = PokeData()
+    for p in poke_data.pokemon:
+        assert poke_data.get_by_species_id(p['speciesId'].upper())['speciesId'] == p['speciesId']
+        assert poke_data.get_by_name(p['speciesName'].lower())['speciesName'] == p['speciesName']
+    assert poke_data.get_by_species_id('missingno') is None
+    assert poke_data.get_by_name('MissingNo.') is None
+
+def test_type_and_move_indexes():
+    poke_data = PokeData()
+    types = sorted({t for p in poke_data.pokemon for t in p.get('types', [])})
+    moves = sorted({m for p in poke_data.pokemon for m in p.get('fastMoves', []) + p.get('chargedMoves', [])})
+    assert poke_data.get_all_types() == types
+    assert poke_data.get_all_moves() == moves
+    for type_name in types:
+        expected = [p for p in poke_data.pokemon if type_name.lower() in [t.lower() for t in p.get('types', [])]]
+        assert poke_data.get_by_type(type_name.upper()) == expected
+    for move_id in moves:
+        expected = [p for p in poke_data.pokemon if move_id in p.get('fastMoves', []) + p.get('chargedMoves', [])]
+        assert poke_data.get_by_move(move_id.lower()) == expected
+    print(f"Indexed {len(types)} types and {len(moves)} moves")
+
+if __name__ == "__main__":
+    test_id_and_name_lookups()
+    test_type_and_move_indexes()
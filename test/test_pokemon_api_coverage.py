@@ -1,7 +1,10 @@
 import json
+import os
 import requests
 
-POKEMON_JSON = 'pvpoke/src/data/gamemaster/pokemon.json'
+from poke_data import PVPOKE_DIR
+
+POKEMON_JSON = os.path.join(PVPOKE_DIR, 'src', 'data', 'gamemaster', 'pokemon.json')
 API_URL = 'http://localhost:5000/api/pokemon/'
 
 
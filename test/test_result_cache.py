@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests for the cross-process battle result cache
+"""
+
+import os
+import sqlite3
+import tempfile
+
+from result_cache import SIMULATOR_VERSION, BattleResultCache, battle_key
+
+AZUMARILL_MOVES = {'fast': 'BUBBLE', 'charged1': 'ICE_BEAM', 'charged2': 'PLAY_ROUGH'}
+REGISTEEL_MOVES = {'fast': 'LOCK_ON', 'charged1': 'FLASH_CANNON'}
+
+def key(**overrides):
+    args = dict(cp_cap=1500, data_version='v1', p1_id='azumarill', p2_id='registeel',
+                p1_moves=AZUMARILL_MOVES, p2_moves=REGISTEEL_MOVES, p1_shields=1, p2_shields=1,
+                settings={'seed': 7})
+    args.update(overrides)
+    return battle_key(**args)
+
+def test_battle_key_is_canonical():
+    reordered = {'charged2': 'PLAY_ROUGH', 'charged1': 'ICE_BEAM', 'fast': 'BUBBLE'}
+    assert key(p1_moves=reordered) == key()
+    # Default shield AIs and settings that don't change the result hash the same
+    assert key(settings={'seed': 7, 'p1_shield_ai': 'smart_30', 'engine': 'turn'}) == key()
+    for changed in (key(data_version='v2'), key(cp_cap=2500), key(p2_shields=2),
+                    key(settings={'seed': 8}), key(settings={'seed': 7, 'p2_shield_ai': 'never'}),
+                    key(settings={'seed': 7, 'mode': 'expected'})):
+        assert changed != key()
+
+def test_cache_layers_and_invalidation():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'battles.sqlite3')
+        cache = BattleResultCache(path)
+        assert cache.get(1500, 'v1', key()) is None
+        cache.put(1500, 'v1', key(), {'winner': 'azumarill', 'turns': 12})
+        result = cache.get(1500, 'v1', key())
+        assert result == {'winner': 'azumarill', 'turns': 12}
+        # Callers get their own copy
+        result['p1_name'] = 'Azumarill'
+        assert cache.get(1500, 'v1', key()) == {'winner': 'azumarill', 'turns': 12}
+
+        # Another process (a fresh instance) reads the row from disk, then from memory
+        other = BattleResultCache(path)
+        assert other.get(1500, 'v1', key())['turns'] == 12
+        assert other.get(1500, 'v1', key())['turns'] == 12
+        stats = other.stats()
+        print(f"Stats: {stats}")
+        assert (stats['disk_hits'], stats['memory_hits'], stats['misses']) == (1, 1, 0)
+        assert stats['disk_entries'] == 1
+
+        # Seeing a league at a new data version drops its old rows, not other leagues'
+        cache.put(2500, 'u1', key(cp_cap=2500, data_version='u1'), {'winner': 'registeel'})
+        restarted = BattleResultCache(path)
+        assert restarted.get(1500, 'v2', key(data_version='v2')) is None
+        assert restarted.stats()['disk_entries'] == 1
+        assert BattleResultCache(path).get(1500, 'v1', key()) is None
+        assert restarted.get(2500, 'u1', key(cp_cap=2500, data_version='u1')) == {'winner': 'registeel'}
+
+        # Without a path only the in-process layer is used
+        memory_only = BattleResultCache('')
+        memory_only.put(1500, 'v1', key(), {'winner': 'tie'})
+        assert memory_only.get(1500, 'v1', key()) == {'winner': 'tie'}
+        assert memory_only.stats()['disk_entries'] is None
+
+def test_cache_dropped_when_simulator_changes():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'battles.sqlite3')
+        BattleResultCache(path).put(1500, 'v1', key(), {'winner': 'azumarill'})
+        assert BattleResultCache(path).get(1500, 'v1', key()) == {'winner': 'azumarill'}
+        # Rows written by other simulator code, as after a deploy
+        conn = sqlite3.connect(path)
+        conn.execute(f'PRAGMA user_version={SIMULATOR_VERSION + 1}')
+        conn.close()
+        assert BattleResultCache(path).get(1500, 'v1', key()) is None
+
+def test_battle_endpoint_uses_cache():
+    import app
+    with tempfile.TemporaryDirectory() as tmp:
+        original = app.battle_cache
+        app.battle_cache = BattleResultCache(os.path.join(tmp, 'battles.sqlite3'))
+        try:
+            client = app.app.test_client()
+            battle = {'p1_id': 'azumarill', 'p2_id': 'registeel', 'cp_cap': 1500,
+                      'p1_moves': AZUMARILL_MOVES, 'p2_moves': REGISTEEL_MOVES, 'settings': {'seed': 3}}
+            first = client.post('/api/battle', json=battle).get_json()
+            second = client.post('/api/battle', json=battle).get_json()
+            assert first == second
+            stats = client.get('/api/battle/cache').get_json()
+            assert (stats['misses'], stats['stores'], stats['memory_hits']) == (1, 1, 1)
+
+            batch = {'team': [{'id': 'azumarill', 'moves': AZUMARILL_MOVES}],
+                     'opponents': [{'id': 'registeel', 'moves': REGISTEEL_MOVES}],
+                     'shield_scenarios': [[0, 0], [2, 2]], 'settings': {'seed': 3}, 'cp_cap': 1500}
+            results = client.post('/api/battle/batch', json=batch).get_json()['results']
+            # The 2-2 battle is the one /api/battle already ran
+            assert {k: results[1][k] for k in ('winner', 'turns', 'p1_final_hp')} == \
+                   {k: first[k] for k in ('winner', 'turns', 'p1_final_hp')}
+            assert client.get('/api/battle/cache').get_json()['memory_hits'] == 2
+        finally:
+            app.battle_cache = original
+
+if __name__ == "__main__":
+    test_battle_key_is_canonical()
+    test_cache_layers_and_invalidation()
+    test_cache_dropped_when_simulator_changes()
+    test_battle_endpoint_uses_cache()
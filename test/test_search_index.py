@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the autocomplete search index
+"""
+
+from poke_data import PokeData
+import itertools
+import random
+
+from search_index import BKTree, SearchIndex, levenshtein, normalize
+
+def brute_force_matches(pokemon, query):
+    normalized = normalize(query)
+    return {p['speciesId'] for p in pokemon
+            if normalized in normalize(p['speciesName']) or normalized in normalize(p['speciesId'])}
+
+def test_matches_agree_with_substring_scan():
+    poke_data = PokeData()
+    index = SearchIndex(poke_data.pokemon, {})
+    for query in ['a', 'az', 'azu', 'mari', 'ria', 'Alt aria', 'me-di', '_sha', 'altaria_shadow', 'zzz']:
+        results = [r['name'] for r in index.search(query, limit=1000)]
+        assert len(results) == len(set(results))
+        assert set(results) == brute_force_matches(poke_data.pokemon, query), query
+
+def test_ranking_and_cache():
+    poke_data = PokeData()
+    rankings = {'marill': {'score': 90}, 'azumarill': {'score': 80}, 'azurill': {'score': '85'}}
+    index = SearchIndex(poke_data.pokemon, rankings, cache_size=2)
+    # Prefix matches come first, each group ordered by PvPoke score
+    results = [r['name'] for r in index.search('mari')]
+    print(f"'mari' -> {results}")
+    assert results == ['marill', 'azumarill']
+    assert [r['name'] for r in index.search('azu')] == ['azurill', 'azumarill']
+    assert len(index.search('a', limit=3)) == 3
+    # Repeated queries are served from the LRU, which stays bounded
+    assert index.search('mari') == index.search('MARI')
+    assert len(index._cache) <= 2
+
+def dp_levenshtein(a, b):
+    row = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        prev, row[0] = row[0], i
+        for j, cb in enumerate(b, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (ca != cb))
+    return row[-1]
+
+def test_edit_distance_and_bk_tree():
+    rng = random.Random(7)
+    words = [''.join(rng.choice('abcde') for _ in range(rng.randint(1, 9))) for _ in range(300)]
+    for a, b in itertools.islice(itertools.product(words, repeat=2), 0, 90000, 37):
+        assert levenshtein(a, b) == dp_levenshtein(a, b), (a, b)
+    tree = BKTree(words)
+    assert tree.size == len(set(words))
+    for query in words[:40] + ['abcdeabcde', 'eeee']:
+        for k in range(3):
+            expected = {(dp_levenshtein(query, w), w) for w in set(words) if dp_levenshtein(query, w) <= k}
+            assert set(tree.search(query, k)) == expected
+
+def test_typo_fallback():
+    poke_data = PokeData()
+    index = SearchIndex(poke_data.pokemon, {})
+    for query, expected in [('azumaril', 'azumarill'), ('medichamp', 'medicham'), ('registel', 'registeel'),
+                            ('swamprt', 'swampert'), ('lantrun', 'lanturn')]:
+        results = [r['name'] for r in index.search(query)]
+        print(f"'{query}' -> {results}")
+        assert results and results[0] == expected
+    # Closest names win, and nothing comes back for queries far from every name
+    assert [r['name'] for r in index.search('marll')][0] == 'marill'
+    assert index.search('qwxyz') == []
+
+if __name__ == "__main__":
+    test_matches_agree_with_substring_scan()
+    test_ranking_and_cache()
+    test_edit_distance_and_bk_tree()
+    test_typo_fallback()
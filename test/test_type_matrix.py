@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared type effectiveness matrices in TypeChart
+"""
+
+import itertools
+
+from battle_sim import DamageMultiplier, TypeChart
+
+def test_matrix_shapes():
+    assert TypeChart.MATRIX.shape == (18, 18)
+    assert str(TypeChart.MATRIX.dtype) == 'float32'
+    # 18 single types + 153 dual types, plus the neutral column for unknown typings
+    assert len(TypeChart.TYPINGS) == 171
+    assert TypeChart.TYPING_MATRIX.shape == (18, 172)
+    assert (TypeChart.TYPING_MATRIX[:, TypeChart.UNKNOWN_TYPING] == 1.0).all()
+
+def test_known_matchups():
+    azumarill = ['water', 'fairy']
+    print(f"Poison vs Azumarill: {TypeChart.get_effectiveness('poison', azumarill)}x")
+    assert TypeChart.get_effectiveness('poison', azumarill) == DamageMultiplier.SUPER_EFFECTIVE
+    assert TypeChart.get_effectiveness('dragon', azumarill) == DamageMultiplier.DOUBLE_RESISTED
+    # Typing order, case and 'none' placeholders don't matter
+    assert TypeChart.typing_id(['Fairy', 'water']) == TypeChart.typing_id(azumarill)
+    assert TypeChart.typing_id(['water', 'none']) == TypeChart.typing_id(['water'])
+    assert TypeChart.get_effectiveness('ground', ['flying']) == DamageMultiplier.DOUBLE_RESISTED
+    assert TypeChart.get_effectiveness('ground', ['electric', 'flying']) == DamageMultiplier.SUPER_EFFECTIVE * DamageMultiplier.DOUBLE_RESISTED
+    assert TypeChart.get_effectiveness('shadow', ['water']) == 1.0
+
+def test_vectorized_helpers_match_scalar_lookups():
+    typings = [[t] for t in TypeChart.TYPES] + [list(pair) for pair in itertools.combinations(TypeChart.TYPES, 2)]
+    ids = TypeChart.typing_ids(typings)
+    grid = TypeChart.effectiveness_grid(list(TypeChart.TYPES), ids)
+    for a, move_type in enumerate(TypeChart.TYPES):
+        column = TypeChart.effectiveness_against(move_type, ids)
+        for d, types in enumerate(typings):
+            expected = TypeChart.get_effectiveness(move_type, types)
+            assert column[d] == expected
+            assert grid[a, d] == expected
+    profile = TypeChart.defense_profile(['steel', 'flying'])
+    assert list(profile) == [TypeChart.get_effectiveness(t, ['steel', 'flying']) for t in TypeChart.TYPES]
+
+if __name__ == "__main__":
+    test_matrix_shapes()
+    test_known_matchups()
+    test_vectorized_helpers_match_scalar_lookups()